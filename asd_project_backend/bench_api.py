@@ -0,0 +1,321 @@
+# bench_api.py — end-to-end screening load test for the API
+#
+#   python bench_api.py run [--mode inproc|uvicorn|both] [--concurrency 1 4 16]
+#                           [--screenings 40] [--workers 1] [--url http://host:port] [--out FILE]
+#   python bench_api.py compare BASE.json NEW.json [--threshold 15]
+#
+# Every simulated user runs a complete screening: /start_session → the 8
+# demographic answers → category answers with realistic skip patterns (a "no"
+# to a category's first question skips it) → /predict_final →
+# /generate-report-session. `concurrency` users run at once until
+# `screenings` screenings have finished.
+#
+#   inproc   httpx against the ASGI app in this process (no network, no server)
+#   uvicorn  httpx against a local `uvicorn main:app` (or --url)
+#
+# Results (throughput, p50/p95/p99 per endpoint) are printed and saved as JSON
+# under bench_results/; `compare` diffs two such files and exits with status 1
+# when a latency or throughput regression exceeds --threshold percent.
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import httpx
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+
+# share of users, P(category present), P(yes) for the rest of a present category
+PERSONAS = (
+    ("typical", 0.60, 0.15, 0.30),
+    ("mixed", 0.25, 0.50, 0.50),
+    ("high", 0.15, 0.90, 0.80),
+)
+NAMES = ("alex", "sam", "maria", "li", "omar", "priya")
+GENDERS = ("m", "f", "male", "female")
+COUNTRIES = ("india", "united states", "united kingdom", "jordan", "new zealand", "austria")
+ETHNICITIES = ("asian", "white-european", "middle eastern", "black", "others", "?")
+RELATIONS = ("self", "parent", "relative", "health care professional")
+
+# latency noise floor for `compare` (ms)
+MIN_DELTA_MS = 0.5
+
+
+# -----------------------------
+# SIMULATED USER
+# -----------------------------
+def question_index():
+    from main import QUESTIONS
+    return {text: i for questions in QUESTIONS.values() for i, text in enumerate(questions)}
+
+
+def demographic_answers(rng):
+    return [
+        rng.choice(NAMES), str(rng.randint(4, 64)), rng.choice(GENDERS), rng.choice(COUNTRIES),
+        rng.choice(ETHNICITIES), rng.choice(RELATIONS), rng.choice(("yes", "no")), rng.choice(("yes", "no")),
+    ]
+
+
+async def screening(client, rng, index, timings, errors):
+    async def call(name, path, body):
+        t0 = time.perf_counter()
+        response = await client.post(path, json=body)
+        timings.setdefault(name, []).append((time.perf_counter() - t0) * 1000)
+        if response.status_code != 200:
+            errors[name] = errors.get(name, 0) + 1
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        return response
+
+    _, _, p_present, p_yes = rng.choices(PERSONAS, weights=[p[1] for p in PERSONAS])[0]
+
+    r = (await call("/start_session", "/start_session", {})).json()
+    sid = r["session_id"]
+
+    for answer in demographic_answers(rng):
+        r = (await call("/answer", "/answer", {"session_id": sid, "answer": answer})).json()
+
+    requests = 10
+    while not r.get("final"):
+        position = index.get(r.get("next_question"))
+        if position == 0:
+            answer = "yes" if rng.random() < p_present else "no"
+        else:
+            answer = "yes" if rng.random() < p_yes else "no"
+        r = (await call("/answer", "/answer", {"session_id": sid, "answer": answer})).json()
+        requests += 1
+
+    await call("/predict_final", "/predict_final", {"session_id": sid})
+    await call("/generate-report-session", "/generate-report-session", {"session_id": sid})
+    return requests + 1
+
+
+async def run_level(client, concurrency, screenings, seed):
+    index = question_index()
+    timings, errors = {}, {}
+    queue = list(range(screenings))
+    completed = requests = 0
+
+    async def user():
+        nonlocal completed, requests
+        while queue:
+            n = queue.pop()
+            try:
+                requests += await screening(client, random.Random(seed * 1_000_003 + n), index, timings, errors)
+                completed += 1
+            except RuntimeError:
+                pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "screenings": completed,
+        "failed": screenings - completed,
+        "seconds": seconds,
+        "screenings_per_s": completed / seconds,
+        "requests_per_s": requests / seconds,
+        "errors": errors,
+        "endpoints": {
+            name: {
+                "count": len(ms),
+                "mean_ms": float(np.mean(ms)),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+            }
+            for name, ms in sorted(timings.items())
+        },
+    }
+
+
+# -----------------------------
+# TARGETS
+# -----------------------------
+async def bench_inproc(args):
+    from main import app
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            await run_level(client, 1, 2, seed=-1)  # warm-up
+            for c in args.concurrency:
+                results.append(await run_level(client, c, args.screenings, args.seed))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def bench_http(args):
+    server = None
+    url = args.url
+    tmp = tempfile.TemporaryDirectory()
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ)
+        if args.workers > 1:
+            env.update(SESSION_BACKEND="sqlite", SESSION_DB_PATH=os.path.join(tmp.name, "sessions.db"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+            cwd=HERE, env=env,
+        )
+
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+            await wait_ready(client)
+            await run_level(client, 1, 2, seed=-1)  # warm-up
+            return [await run_level(client, c, args.screenings, args.seed) for c in args.concurrency]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        tmp.cleanup()
+
+
+# -----------------------------
+# OUTPUT
+# -----------------------------
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(mode, level):
+    print(f"\n[{mode}] concurrency {level['concurrency']}: {level['screenings']} screenings in "
+          f"{level['seconds']:.2f} s → {level['screenings_per_s']:.1f} screenings/s, "
+          f"{level['requests_per_s']:.0f} req/s" + (f", {level['failed']} failed" if level["failed"] else ""))
+    print(f"  {'endpoint':<26} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, e in level["endpoints"].items():
+        print(f"  {name:<26} {e['count']:>6} {e['p50_ms']:>8.2f} {e['p95_ms']:>8.2f} {e['p99_ms']:>8.2f}")
+
+
+def cmd_run(args):
+    modes = ("inproc", "uvicorn") if args.mode == "both" else (args.mode,)
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "screenings": args.screenings,
+        "seed": args.seed,
+        "workers": args.workers,
+        "modes": {},
+    }
+
+    for mode in modes:
+        levels = asyncio.run(bench_inproc(args) if mode == "inproc" else bench_http(args))
+        report["modes"][mode] = levels
+        for level in levels:
+            print_level(mode, level)
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"api-{report['revision'] or 'local'}-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+    return 0
+
+
+def pct(old, new):
+    return (new / old - 1) * 100 if old else 0.0
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base {base.get('revision')} ({base.get('created_at')}) → new {new.get('revision')} ({new.get('created_at')})")
+    regressions = 0
+    for mode, levels in new["modes"].items():
+        old_levels = {lv["concurrency"]: lv for lv in base["modes"].get(mode, [])}
+        for level in levels:
+            old = old_levels.get(level["concurrency"])
+            if old is None:
+                continue
+            change = pct(old["screenings_per_s"], level["screenings_per_s"])
+            flag = change < -args.threshold
+            regressions += flag
+            print(f"\n[{mode}] concurrency {level['concurrency']}: throughput "
+                  f"{old['screenings_per_s']:.1f} → {level['screenings_per_s']:.1f} screenings/s "
+                  f"({change:+.1f}%){'  REGRESSION' if flag else ''}")
+            for name, e in level["endpoints"].items():
+                o = old["endpoints"].get(name)
+                if o is None:
+                    continue
+                marks = []
+                for key in ("p50_ms", "p99_ms"):
+                    if pct(o[key], e[key]) > args.threshold and e[key] - o[key] > MIN_DELTA_MS:
+                        marks.append(key[:3])
+                regressions += bool(marks)
+                print(f"  {name:<26} p50 {o['p50_ms']:7.2f} → {e['p50_ms']:7.2f} ({pct(o['p50_ms'], e['p50_ms']):+6.1f}%)"
+                      f"  p99 {o['p99_ms']:7.2f} → {e['p99_ms']:7.2f} ({pct(o['p99_ms'], e['p99_ms']):+6.1f}%)"
+                      f"{'  REGRESSION ' + '/'.join(marks) if marks else ''}")
+
+    print(f"\n{regressions} regression(s) over {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end screening benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run")
+    run.add_argument("--mode", choices=("inproc", "uvicorn", "both"), default="both")
+    run.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    run.add_argument("--screenings", type=int, default=40, help="screenings per concurrency level")
+    run.add_argument("--workers", type=int, default=1, help="uvicorn workers (>1 uses the sqlite backend)")
+    run.add_argument("--url", help="benchmark a running server instead of starting uvicorn")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--out", help="JSON results file (default bench_results/api-<revision>-<time>.json)")
+
+    compare = sub.add_parser("compare")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=15.0, help="allowed change in percent")
+
+    args = parser.parse_args(argv)
+    return cmd_run(args) if args.command == "run" else cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
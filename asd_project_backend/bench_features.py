@@ -0,0 +1,54 @@
+# bench_features.py — throughput of utils.build_feature_matrix vs batch size
+#
+#   python bench_features.py
+import time
+import random
+
+from utils import load_artifacts, build_feature_matrix
+
+GENDERS = ["m", "f", "male", "Female"]
+COUNTRIES = ["India", "Austria", "united states", "Jordan", None]
+ETHNICITIES = ["Asian", "white-european", "others", "?"]
+RELATIONS = ["Self", "parent", "Relative"]
+YES_NO = ["yes", "no", "1", "0"]
+
+
+def make_rows(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        rows.append({
+            "social": rnd.randint(0, 1),
+            "communication": rnd.randint(0, 1),
+            "hyperactivity": rnd.randint(0, 1),
+            "repetitive": rnd.randint(0, 1),
+            "sensory": rnd.randint(0, 1),
+            "learning": rnd.randint(0, 1),
+            "age": rnd.randint(2, 70),
+            "gender": rnd.choice(GENDERS),
+            "country": rnd.choice(COUNTRIES),
+            "ethnicity": rnd.choice(ETHNICITIES),
+            "jaundice": rnd.choice(YES_NO),
+            "relation": rnd.choice(RELATIONS),
+            "used_app_before": rnd.choice(YES_NO),
+        })
+    return rows
+
+
+def main():
+    artifacts = load_artifacts()
+
+    for n in (1, 100, 10_000, 100_000, 300_000):
+        rows = make_rows(n)
+        build_feature_matrix(rows[:10], artifacts)
+
+        t0 = time.perf_counter()
+        X = build_feature_matrix(rows, artifacts)
+        dt = time.perf_counter() - t0
+
+        print(f"{n:>8} rows: {dt * 1000:9.2f} ms  {dt / n * 1e6:7.2f} µs/row  "
+              f"{X.dtype} {X.shape} C-contiguous={X.flags['C_CONTIGUOUS']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_forest.py — FlatForest vs sklearn predict_proba: exactness and speed
+#
+#   python bench_forest.py [path/to/model.pkl]
+#
+# Without a pickle the served recipe (optionB) is trained on the committed
+# train.csv, so the sklearn side is always a model of the installed version
+# (an old pickle can load but predict differently). "flat" is the NumPy
+# evaluator alone; "served" is FlatForest.predict_proba, which hands batches
+# of FOREST_SKLEARN_MIN_ROWS or more to an sklearn forest rebuilt from the
+# flat arrays.
+import sys
+import time
+import pickle
+
+import numpy as np
+
+from forest_engine import FlatForest
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def load_model(argv):
+    if argv:
+        with open(argv[0], "rb") as f:
+            return argv[0], pickle.load(f)
+
+    from train_pipeline import DEFAULT_CACHE_DIR, DEFAULT_DATA, fit_model, load_or_preprocess
+
+    arrays, _, _ = load_or_preprocess(DEFAULT_DATA, "optionB", DEFAULT_CACHE_DIR)
+    model, _ = fit_model(arrays, "optionB", n_jobs=-1)
+    return f"optionB trained on {DEFAULT_DATA}", model
+
+
+def main():
+    path, model = load_model(sys.argv[1:])
+
+    t0 = time.perf_counter()
+    forest = FlatForest.from_sklearn(model)
+    export_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"model:   {path}")
+    print(f"forest:  {forest.n_trees} trees, {forest.n_nodes} nodes, depth {forest.max_depth}, "
+          f"{forest.nbytes / 1024:.0f} KiB (export {export_ms:.0f} ms)")
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(scale=2.0, size=(20_000, model.n_features_in_))
+    X[:5000] = np.round(X[:5000])  # values sitting exactly on integer-ish thresholds
+
+    expected = model.predict_proba(X)
+    exact = np.array_equal(expected, forest._predict_flat(np.ascontiguousarray(X, dtype=np.float32)))
+    print(f"exact match with sklearn on {len(X)} rows: {exact}")
+
+    row = X[:1]
+    sk = timed(lambda: model.predict_proba(row), 200)
+    ff = timed(lambda: forest.predict_proba(row), 2000)
+    print(f"single row  sklearn p50 {sk[0]:8.3f} ms  p99 {sk[1]:8.3f} ms")
+    print(f"single row  flat    p50 {ff[0]:8.3f} ms  p99 {ff[1]:8.3f} ms  ({sk[0] / ff[0]:.0f}x)")
+
+    flat32 = np.ascontiguousarray(X, dtype=np.float32)
+    served = np.array_equal(expected, forest.predict_proba(X))  # also builds the sklearn path
+    print(f"large batches (>= {forest.sklearn_min_rows} rows) served by sklearn: {bool(forest._sklearn[1])}, "
+          f"exact: {served}")
+    for n in (100, 1000, 20_000):
+        sk = timed(lambda: model.predict_proba(X[:n]), 5)[0]
+        ff = timed(lambda: forest._predict_flat(flat32[:n]), 5)[0]
+        sv = timed(lambda: forest.predict_proba(X[:n]), 5)[0]
+        print(f"batch {n:>6} sklearn {sk:8.2f} ms  flat {ff:8.2f} ms ({sk / ff:.1f}x)  "
+              f"served {sv:8.2f} ms ({sk / sv:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bench_journal.py — session journal cost on the request path and recovery time
+#
+#   python bench_journal.py [--sessions 100000] [--snapshot-at 0.9] [--appends 20000]
+#
+# 1. append: what journaling adds to one /answer mutation (encode +
+#    buffer), with the flusher fsyncing in the background; SYNC mode also
+#    waits for the group commit, measured with 8 concurrent writer threads.
+# 2. recovery: builds --sessions screenings through the real transition table
+#    (random answers, some finished), snapshots after --snapshot-at of them,
+#    then times startup recovery in a fresh interpreter — once from the
+#    snapshot + tail and once from the journal alone.
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+os.environ.pop("SESSION_JOURNAL_DIR", None)  # main must not journal by itself here
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# fresh interpreter: recover the journal directory into an empty memory backend
+RECOVER_PROBE = """
+import sys, time
+import main
+from session_journal import SessionJournal
+from session_store import MemorySessionBackend, SessionRecord
+
+backend = MemorySessionBackend(max_entries=10**7)
+journal = SessionJournal(sys.argv[1])
+started = time.perf_counter()
+info = journal.recover(backend, lambda: SessionRecord(len(main.CATEGORIES)), main.replay_answers, 3600)
+print("RECOVER", time.perf_counter() - started, len(backend), info["events_replayed"])
+"""
+
+DEMOGRAPHICS = ["alex", "30", "m", "india", "asian", "self", "no", "no"]
+
+
+def screening_answers(rng):
+    p_yes = rng.choice((0.2, 0.5, 0.8))
+    answers = DEMOGRAPHICS + ["yes" if rng.random() < p_yes else "no" for _ in range(30)]
+    # 70% are still in progress at the "crash"
+    return answers if rng.random() < 0.3 else answers[:rng.randint(1, len(answers) - 1)]
+
+
+# same as main.journal_answers, for a journal that is not main.JOURNAL
+def journal_answers(journal, session_id, sess, state, answers):
+    seq = journal.answers(session_id, sess, state, answers)
+    if sess.complete:
+        seq = journal.finalize(session_id, sess)
+    return seq
+
+
+def bench_append(main, n, sync, threads=1):
+    from session_journal import SessionJournal
+    from session_store import MemorySessionBackend, SessionRecord
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = MemorySessionBackend()
+        journal = SessionJournal(tmp, sync=sync)
+        journal.start(backend)
+        rng = random.Random(0)
+        timings = [[] for _ in range(threads)]
+
+        def writer(out):
+            for _ in range(n // threads):
+                sid = main.uuid.uuid4().hex
+                sess = SessionRecord(len(main.CATEGORIES))
+                journal.commit(journal.start_session(sid, sess))
+                for ans in screening_answers(rng)[:10]:
+                    t0 = time.perf_counter()
+                    with backend.locked(sid):
+                        state = sess.cursor
+                        main.apply_answer(sess, sid, ans)
+                        seq = journal_answers(journal, sid, sess, state, [ans])
+                    journal.commit(seq)
+                    out.append(time.perf_counter() - t0)
+
+        workers = [threading.Thread(target=writer, args=(t,)) for t in timings]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        stats = journal.stats()
+        journal.stop(snapshot=False)
+
+    us = np.concatenate([np.asarray(t) for t in timings]) * 1e6
+    return np.percentile(us, 50), np.percentile(us, 99), stats["events_per_flush"]
+
+
+def bench_plain(main, n):
+    from session_store import SessionRecord
+
+    rng = random.Random(0)
+    timings = []
+    for _ in range(n):
+        sess = SessionRecord(len(main.CATEGORIES))
+        for ans in screening_answers(rng)[:10]:
+            t0 = time.perf_counter()
+            main.apply_answer(sess, None, ans)
+            timings.append(time.perf_counter() - t0)
+    us = np.asarray(timings) * 1e6
+    return np.percentile(us, 50), np.percentile(us, 99)
+
+
+def build_journal(main, directory, sessions, snapshot_at):
+    from session_journal import SessionJournal
+    from session_store import MemorySessionBackend, SessionRecord
+
+    backend = MemorySessionBackend(max_entries=10**7)
+    journal = SessionJournal(directory, snapshot_seconds=10**9, snapshot_bytes=1 << 62)
+    journal.start(backend)
+    rng = random.Random(1)
+    snapshot_after = int(sessions * snapshot_at) if snapshot_at else None
+    snapshot = None
+
+    for i in range(sessions):
+        sid = main.uuid.uuid4().hex
+        sess = SessionRecord(len(main.CATEGORIES))
+        backend.put(sid, sess)
+        journal.start_session(sid, sess)
+        for ans in screening_answers(rng):
+            if sess.complete:
+                break
+            state = sess.cursor
+            main.apply_answer(sess, sid, ans)
+            journal_answers(journal, sid, sess, state, [ans])
+        if i + 1 == snapshot_after:
+            snapshot = journal.snapshot()
+
+    journal.stop(snapshot=False)
+    sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)}
+    return journal.events, snapshot, sizes
+
+
+def recover_in_subprocess(directory):
+    out = subprocess.run(
+        [sys.executable, "-c", RECOVER_PROBE, directory],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    ).stdout
+    seconds, n, replayed = out.rsplit("RECOVER", 1)[1].split()
+    return float(seconds), int(n), int(replayed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--snapshot-at", type=float, default=0.9, help="fraction of sessions before the snapshot")
+    parser.add_argument("--appends", type=int, default=2000, help="sessions for the append benchmark")
+    args = parser.parse_args()
+
+    import main as app_main
+
+    print("per-answer mutation cost (µs)")
+    p50, p99 = bench_plain(app_main, args.appends)
+    print(f"  {'no journal':<28} p50 {p50:7.1f}  p99 {p99:7.1f}")
+    for label, sync, threads in (("journal, async flush", False, 1), ("journal, SYNC (8 threads)", True, 8)):
+        p50, p99, per_flush = bench_append(app_main, args.appends, sync, threads)
+        print(f"  {label:<28} p50 {p50:7.1f}  p99 {p99:7.1f}  ({per_flush:.1f} events per fsync)")
+
+    print(f"\nrecovery of {args.sessions} sessions")
+    for label, snapshot_at in (("snapshot + tail", args.snapshot_at), ("journal only", 0)):
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            events, snapshot, sizes = build_journal(app_main, tmp, args.sessions, snapshot_at)
+            build = time.perf_counter() - t0
+            seconds, n, replayed = recover_in_subprocess(tmp)
+            files = ", ".join(f"{k} {v / 1e6:.1f} MB" for k, v in sorted(sizes.items()))
+            print(f"  {label:<16} {seconds:6.2f} s  ({n} sessions, {replayed} events replayed; "
+                  f"built {events} events in {build:.0f} s; {files})")
+
+
+if __name__ == "__main__":
+    main()
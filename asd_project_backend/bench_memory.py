@@ -0,0 +1,171 @@
+# bench_memory.py — PSS and unique memory per server process (Linux /proc)
+#
+#   python bench_memory.py [n_workers]      compare `uvicorn --workers` with serve.py
+#   python bench_memory.py --pid <pid>      measure a running server and its workers
+#
+# PSS charges each shared page 1/n to each of the n processes mapping it, so
+# summing PSS over the workers gives the real footprint. "model" columns
+# only count mappings of the model bundle files.
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+import http.client
+
+from utils import MODEL_BUNDLE
+from bench_features import make_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# -----------------------------
+# /proc READERS
+# -----------------------------
+def descendants(pid):
+    out = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children = [int(c) for c in f.read().split()]
+        except FileNotFoundError:
+            continue
+        for child in children:
+            out.append(child)
+            out.extend(descendants(child))
+    return out
+
+
+def process_name(pid):
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode(errors="replace").strip()[:60]
+
+
+# returns kB: rss, pss, unique (private clean + dirty), model_pss, model_unique
+def memory_of(pid, model_dir):
+    model_dir = os.path.realpath(model_dir)
+    totals = dict.fromkeys(("rss", "pss", "unique", "model_pss", "model_unique"), 0)
+    in_model = False
+
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if " " in key or "-" in key:  # mapping header: "addr perms offset dev inode [path]"
+                parts = line.split(None, 5)
+                path = parts[5].strip() if len(parts) > 5 else ""
+                in_model = path.startswith(model_dir)
+                continue
+            if key not in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                continue
+            kb = int(rest.split()[0])
+            if key == "Rss":
+                totals["rss"] += kb
+            elif key == "Pss":
+                totals["pss"] += kb
+                if in_model:
+                    totals["model_pss"] += kb
+            else:
+                totals["unique"] += kb
+                if in_model:
+                    totals["model_unique"] += kb
+    return totals
+
+
+def report(title, master_pid, model_dir):
+    pids = [master_pid] + descendants(master_pid)
+    print(f"\n{title}")
+    print(f"{'pid':>7} {'rss':>9} {'pss':>9} {'unique':>9} {'model pss':>10} {'model uniq':>10}  process")
+    summary = dict.fromkeys(("rss", "pss", "unique", "model_pss", "model_unique"), 0)
+    for pid in pids:
+        try:
+            m = memory_of(pid, model_dir)
+            name = process_name(pid)
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        for k in summary:
+            summary[k] += m[k]
+        print(f"{pid:>7} {m['rss'] / 1024:7.1f}MB {m['pss'] / 1024:7.1f}MB {m['unique'] / 1024:7.1f}MB "
+              f"{m['model_pss'] / 1024:8.2f}MB {m['model_unique'] / 1024:8.2f}MB  {name}")
+    print(f"{'total':>7} {summary['rss'] / 1024:7.1f}MB {summary['pss'] / 1024:7.1f}MB "
+          f"{summary['unique'] / 1024:7.1f}MB {summary['model_pss'] / 1024:8.2f}MB "
+          f"{summary['model_unique'] / 1024:8.2f}MB")
+    return summary
+
+
+# -----------------------------
+# LAUNCH + WARM UP
+# -----------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+# fresh connections spread the requests over the workers, so every worker
+# runs the model (and faults in the bundle pages) at least once
+def warm_up(port, n_requests):
+    body = json.dumps({"rows": make_rows(64)})
+    for _ in range(n_requests):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("POST", "/predict_risk_batch", body, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        conn.close()
+
+
+def measure_launch(title, cmd, n_workers, db_dir):
+    port = free_port()
+    env = dict(os.environ, SESSION_BACKEND="sqlite",
+               SESSION_DB_PATH=os.path.join(db_dir, f"{port}.db"))
+    proc = subprocess.Popen(cmd + ["--port", str(port)], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        # workers come up one by one; give the last ones time to import
+        time.sleep(2 + n_workers)
+        warm_up(port, 10 * n_workers)
+        return report(title, proc.pid, MODEL_BUNDLE)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--pid":
+        report(f"process tree of {sys.argv[2]}", int(sys.argv[2]), MODEL_BUNDLE)
+        return
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    with tempfile.TemporaryDirectory() as db_dir:
+        spawned = measure_launch(
+            f"uvicorn --workers {n} (each worker imports main.py)",
+            [sys.executable, "-m", "uvicorn", "main:app", "--log-level", "warning", "--workers", str(n)],
+            n, db_dir,
+        )
+        forked = measure_launch(
+            f"serve.py --workers {n} (loaded once, forked)",
+            [sys.executable, "serve.py", "--log-level", "warning", "--workers", str(n)],
+            n, db_dir,
+        )
+
+    print(f"\ntotal PSS: {spawned['pss'] / 1024:.1f} MB → {forked['pss'] / 1024:.1f} MB, "
+          f"unique: {spawned['unique'] / 1024:.1f} MB → {forked['unique'] / 1024:.1f} MB, "
+          f"model unique: {spawned['model_unique'] / 1024:.2f} MB → {forked['model_unique'] / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
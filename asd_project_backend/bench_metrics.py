@@ -0,0 +1,106 @@
+# bench_metrics.py — per-request cost of the metrics middleware
+#
+#   python bench_metrics.py [--requests 20000] [--rounds 7]
+#
+# Calls the ASGI stacks directly (no HTTP client, no sockets) so the
+# difference is the middleware itself:
+#   bare     a no-op ASGI app with and without MetricsMiddleware
+#   app      main.app's real middleware stack with and without it, GET /
+# Rounds alternate between the two variants; the median round is reported.
+# The budget is 50 µs per request.
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+from metrics import MetricsMiddleware, RequestMetrics
+
+BUDGET_US = 50.0
+
+
+class FakeRoute:
+    path = "/bench"
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_scope(path, route=None):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 80),
+    }
+    if route is not None:
+        scope["route"] = route
+    return scope
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def per_request_us(app, path, n, route=None):
+    started = time.perf_counter()
+    for _ in range(n):
+        await app(make_scope(path, route), receive, send)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def compare(plain, instrumented, path, n, rounds, route=None):
+    await per_request_us(plain, path, n // 10, route)  # warm-up
+    await per_request_us(instrumented, path, n // 10, route)
+    off, on = [], []
+    for _ in range(rounds):
+        off.append(await per_request_us(plain, path, n, route))
+        on.append(await per_request_us(instrumented, path, n, route))
+    off, on = statistics.median(off), statistics.median(on)
+    return off, on, on - off
+
+
+def app_stacks():
+    from main import app
+
+    instrumented = app.build_middleware_stack()
+    saved = app.user_middleware
+    app.user_middleware = [m for m in saved if m.cls is not MetricsMiddleware]
+    try:
+        plain = app.build_middleware_stack()
+    finally:
+        app.user_middleware = saved
+    return plain, instrumented
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000, help="requests per round")
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [
+        ("bare ASGI app", *asyncio.run(compare(
+            noop_app, MetricsMiddleware(noop_app, RequestMetrics()), "/bench",
+            args.requests, args.rounds, FakeRoute(),
+        ))),
+        ("main.app GET /", *asyncio.run(compare(*app_stacks(), "/", args.requests // 4, args.rounds))),
+    ]
+
+    print(f"{'':<16} {'without µs':>11} {'with µs':>9} {'overhead µs':>12}")
+    for label, off, on, overhead in results:
+        print(f"{label:<16} {off:>11.2f} {on:>9.2f} {overhead:>12.2f}")
+
+    worst = max(r[3] for r in results)
+    print(f"\nbudget {BUDGET_US:.0f} µs/request: {'OK' if worst < BUDGET_US else 'EXCEEDED'}")
+    return 0 if worst < BUDGET_US else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
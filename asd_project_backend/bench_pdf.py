@@ -0,0 +1,87 @@
+# bench_pdf.py — per-report latency and allocations of make_pdf_bytes
+#
+#   python bench_pdf.py [n_reports]
+import sys
+import time
+import statistics
+import tracemalloc
+
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph
+
+import pdf_utils
+
+USER = {"name": "alex", "age": 9, "gender": "m"}
+EXTRA = {
+    "scores": {"social": 4, "communication": 2, "hyperactivity": 0,
+               "repetitive": 3, "sensory": 1, "learning": 0},
+    "per_category_labels": {"social": "High", "communication": "Mild", "hyperactivity": "Normal",
+                            "repetitive": "Moderate", "sensory": "Normal", "learning": "Normal"},
+    "total_yes": 10,
+    "guidance": "High signs — screening recommended soon",
+    "demographics": {
+        "What is your name?": "alex",
+        "How old are you?": "9",
+        "What is your gender?": "m",
+        "Which country/locality are you from?": "india",
+        "What is your ethnicity?": "asian",
+        "What is your relation to the child? (Self/Parent/Guardian)": "parent",
+        "Did you have jaundice during childhood? (yes/no)": "no",
+        "Have you used an ASD screening app before? (yes/no)": "no",
+    },
+}
+
+
+def render():
+    return pdf_utils.make_pdf_bytes(USER, "Probable ASD", 0.0, extra=EXTRA)
+
+
+# count layout objects built per report
+def count_constructions():
+    counts = {"ParagraphStyle": 0, "Paragraph": 0}
+    originals = (ParagraphStyle.__init__, Paragraph.__init__)
+
+    def style_init(self, *a, **k):
+        counts["ParagraphStyle"] += 1
+        originals[0](self, *a, **k)
+
+    def para_init(self, *a, **k):
+        counts["Paragraph"] += 1
+        originals[1](self, *a, **k)
+
+    ParagraphStyle.__init__, Paragraph.__init__ = style_init, para_init
+    try:
+        render()
+    finally:
+        ParagraphStyle.__init__, Paragraph.__init__ = originals
+    return counts
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    render()  # warm-up (fonts, lazy template)
+
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        render()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+
+    tracemalloc.start()
+    render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"reports:           {n}")
+    print(f"mean latency:      {statistics.mean(times):.2f} ms")
+    print(f"p50 latency:       {times[len(times) // 2]:.2f} ms")
+    print(f"p99 latency:       {times[int(len(times) * 0.99) - 1]:.2f} ms")
+    print(f"peak traced alloc: {peak / 1024:.1f} KiB per report")
+    for name, count in count_constructions().items():
+        print(f"{name + ' built:':<19}{count} per report")
+
+
+if __name__ == "__main__":
+    main()
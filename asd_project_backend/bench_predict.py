@@ -0,0 +1,47 @@
+# bench_predict.py — single-row and batch latency of utils.predict_risk
+#
+#   MODEL_BUNDLE=path/to/bundle python bench_predict.py [n_calls]
+import sys
+import time
+
+import numpy as np
+
+from utils import load_artifacts, model_available, predict_risk
+from bench_features import make_rows
+
+BUDGET_MS = 3.0
+
+
+def percentiles(times_ms):
+    return np.percentile(times_ms, 50), np.percentile(times_ms, 99)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    artifacts = load_artifacts()
+    if not model_available(artifacts):
+        sys.exit("No usable model in MODEL_BUNDLE (train one first)")
+
+    rows = make_rows(n)
+    predict_risk(rows[:1], artifacts)  # warm-up
+
+    times = []
+    for row in rows:
+        t0 = time.perf_counter()
+        predict_risk([row], artifacts)
+        times.append((time.perf_counter() - t0) * 1000)
+
+    p50, p99 = percentiles(times)
+    verdict = "OK" if p99 <= BUDGET_MS else "OVER BUDGET"
+    print(f"single row: p50 {p50:.3f} ms  p99 {p99:.3f} ms  (budget {BUDGET_MS} ms: {verdict})")
+
+    for batch in (64, 1024, 10_000):
+        batch_rows = make_rows(batch, seed=1)
+        t0 = time.perf_counter()
+        predict_risk(batch_rows, artifacts)
+        dt = time.perf_counter() - t0
+        print(f"batch {batch:>6}: {dt * 1000:8.2f} ms  {dt / batch * 1e6:8.2f} µs/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_stream_train.py — peak memory of streaming training vs dataset size
+#
+#   python bench_stream_train.py [rows ...] [--chunk-rows 50000] [--n-estimators 20]
+#
+# Builds synthetic screening logs by resampling train.csv rows (ages jittered
+# so the numeric column keeps many distinct values), then runs
+# `train_pipeline.py optionB --stream` on each file in a fresh process and
+# reports its peak RSS. With a fixed chunk size the peak should stay flat as
+# the row count grows.
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# runs the CLI in-process and prints ru_maxrss (kB) at exit
+PEAK_PROBE = """
+import sys, resource
+from train_pipeline import main
+main(sys.argv[1:])
+print("PEAK_KB", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_synthetic(path, n_rows, seed=0, block=100_000):
+    base = pd.read_csv(os.path.join(HERE, "train.csv"))
+    rng = np.random.default_rng(seed)
+    written = 0
+    while written < n_rows:
+        n = min(block, n_rows - written)
+        part = base.iloc[rng.integers(0, len(base), n)].copy()
+        part["age"] = part["age"] + rng.normal(0, 0.5, n)
+        part.to_csv(path, mode="a", header=written == 0, index=False)
+        written += n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="*", type=int, default=[100_000, 400_000])
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--n-estimators", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"chunk rows: {args.chunk_rows}, trees: {args.n_estimators}\n")
+    print(f"{'rows':>10} {'csv MB':>8} {'seconds':>8} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.rows:
+            data = os.path.join(tmp, f"logs-{n_rows}.csv")
+            write_synthetic(data, n_rows)
+
+            t0 = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-c", PEAK_PROBE, "optionB", "--stream", "--data", data,
+                 "--chunk-rows", str(args.chunk_rows), "--n-estimators", str(args.n_estimators),
+                 "--out", os.path.join(tmp, "versions")],
+                cwd=HERE, capture_output=True, text=True, check=True,
+            )
+            seconds = time.perf_counter() - t0
+            peak_kb = int(out.stdout.rsplit("PEAK_KB", 1)[1])
+            print(f"{n_rows:>10} {os.path.getsize(data) / 1e6:>8.1f} {seconds:>8.1f} {peak_kb / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# bench_ws.py — per-answer latency and server CPU: HTTP /answer vs /ws/screening
+#
+#   python bench_ws.py [--screenings 60] [--concurrency 1 8] [--seed 0]
+#
+# Starts `uvicorn main:app` (one worker) and runs the same simulated
+# screenings (demographics, then yes/no with the category skip patterns of
+# bench_api.py) three ways:
+#
+#   http-new        a new connection for every POST /answer (no keep-alive)
+#   http-keepalive  POST /answer over one kept-alive connection per user
+#   websocket       one /ws/screening connection per screening
+#
+# Latency is measured per answer (send → next question received). Server
+# CPU is user+system time of the uvicorn process (Linux /proc) divided by
+# the answers sent, so it includes starting the session and connections.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+
+import httpx
+import numpy as np
+from websockets.sync.client import connect
+
+from bench_api import PERSONAS, demographic_answers, free_port, question_index
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def process_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime, stime
+
+
+# answers for one simulated user, chosen as the questions arrive
+class Persona:
+    def __init__(self, rng, index):
+        _, _, self.p_present, self.p_yes = rng.choices(PERSONAS, weights=[p[1] for p in PERSONAS])[0]
+        self.rng = rng
+        self.index = index
+        self.demographics = demographic_answers(rng)
+
+    def answer(self, question):
+        if self.demographics:
+            return self.demographics.pop(0)
+        if self.index.get(question) == 0:
+            return "yes" if self.rng.random() < self.p_present else "no"
+        return "yes" if self.rng.random() < self.p_yes else "no"
+
+
+# -----------------------------
+# FLOWS (one screening each)
+# -----------------------------
+def http_screening(client, persona, timings):
+    r = client.post("/start_session").json()
+    sid = r["session_id"]
+    while not r.get("final"):
+        body = {"session_id": sid, "answer": persona.answer(r["next_question"])}
+        t0 = time.perf_counter()
+        response = client.post("/answer", json=body)
+        timings.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        r = response.json()
+
+
+def ws_screening(url, persona, timings):
+    with connect(f"{url}/ws/screening") as ws:
+        r = json.loads(ws.recv())
+        while r["type"] != "final":
+            message = {"type": "answer", "answer": persona.answer(r["next_question"]), "answered": r["answered"]}
+            t0 = time.perf_counter()
+            ws.send(json.dumps(message))
+            r = json.loads(ws.recv())
+            while r["type"] == "ping":
+                r = json.loads(ws.recv())
+            timings.append(time.perf_counter() - t0)
+            if r["type"] == "error":
+                raise RuntimeError(r["detail"])
+
+
+def run_flow(flow, base_url, pid, screenings, concurrency, seed):
+    index = question_index()
+    queue = list(range(screenings))
+    timings = [[] for _ in range(concurrency)]
+    lock = threading.Lock()
+
+    def user(out):
+        client = None
+        if flow == "http-new":
+            client = httpx.Client(base_url=base_url, timeout=60, limits=httpx.Limits(max_keepalive_connections=0))
+        elif flow == "http-keepalive":
+            client = httpx.Client(base_url=base_url, timeout=60)
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    n = queue.pop()
+                persona = Persona(random.Random(seed * 1_000_003 + n), index)
+                if client is None:
+                    ws_screening(base_url.replace("http", "ws", 1), persona, out)
+                else:
+                    http_screening(client, persona, out)
+        finally:
+            if client is not None:
+                client.close()
+
+    cpu0 = process_cpu_seconds(pid)
+    started = time.perf_counter()
+    users = [threading.Thread(target=user, args=(t,)) for t in timings]
+    for u in users:
+        u.start()
+    for u in users:
+        u.join()
+    seconds = time.perf_counter() - started
+    cpu = process_cpu_seconds(pid) - cpu0
+
+    ms = np.concatenate([np.asarray(t) for t in timings]) * 1000
+    return {
+        "answers": len(ms),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "answers_per_s": len(ms) / seconds,
+        "server_cpu_us": cpu / len(ms) * 1e6,
+    }
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--screenings", type=int, default=60, help="screenings per flow and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, SESSION_MAX_ENTRIES=str(10**6))
+    env.pop("SESSION_JOURNAL_DIR", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=HERE, env=env,
+    )
+    try:
+        wait_ready(url)
+        for flow in ("http-new", "http-keepalive", "websocket"):  # warm-up
+            run_flow(flow, url, server.pid, 2, 1, seed=-1)
+
+        print(f"{'flow':<16} {'users':>5} {'answers':>8} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'answers/s':>10} {'server CPU µs/answer':>21}")
+        for c in args.concurrency:
+            for flow in ("http-new", "http-keepalive", "websocket"):
+                r = run_flow(flow, url, server.pid, args.screenings, c, args.seed)
+                print(f"{flow:<16} {c:>5} {r['answers']:>8} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                      f"{r['answers_per_s']:>10.0f} {r['server_cpu_us']:>21.0f}")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
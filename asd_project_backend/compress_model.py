@@ -0,0 +1,241 @@
+# compress_model.py — Shrink a forest while holding validation accuracy
+#
+#   python compress_model.py [--recipe classical] [--tolerance 0.01]
+#                            [--dtype float32|float16|float64] [--min-trees 10] [--activate]
+#
+# The recipe's data is split (stratified) into train / validation / test.
+# The forest is fitted on the training split, then:
+#   1. depth cap   — the smallest max_depth whose validation accuracy stays
+#                    within --tolerance of the full forest
+#   2. tree drop   — greedily remove the tree whose removal hurts validation
+#                    accuracy least (ties: lowest Brier score) while the
+#                    accuracy stays within the same budget
+#   3. quantize    — thresholds and leaf probabilities stored as --dtype
+#                    (float16 falls back to float32 if it breaks the budget)
+# The result is written as a bundle to saved_models/versions/, and the test
+# accuracy, size, resident memory and latency of the original and compressed
+# bundles are reported side by side. The test split is never used by the
+# greedy steps, so its scores are not biased by the selection.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from forest_engine import FlatForest
+from model_bundle import save_bundle
+from model_selection import measure_latency
+from train_pipeline import (
+    ACTIVE_BUNDLE, DEFAULT_CACHE_DIR, DEFAULT_DATA, DEFAULT_OUT_DIR, RANDOM_STATE, RECIPES,
+    bundle_args, load_or_preprocess,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# loads a bundle in a fresh interpreter, touches every forest page, prints the RSS growth in kB
+RSS_PROBE = """
+import sys
+from model_bundle import load_bundle
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+before = rss_kb()
+bundle = load_bundle(sys.argv[1])
+for arr in bundle["forest"].to_arrays().values():
+    arr.sum()
+print(rss_kb() - before)
+"""
+
+
+# -----------------------------
+# VALIDATION SCORING
+# -----------------------------
+# P[t, n] = tree t's positive-class probability for validation row n
+def per_tree_positive(forest, X):
+    positive = list(forest.classes).index(1)
+    leaves = forest.apply(np.ascontiguousarray(X, dtype=np.float32))
+    return forest.proba[leaves.T, positive].astype(np.float64)
+
+
+def accuracy(forest, X, y):
+    return float(np.mean((per_tree_positive(forest, X).mean(axis=0) > 0.5) == y))
+
+
+def choose_depth(forest, X, y, floor):
+    for depth in range(1, forest.max_depth):
+        capped = forest.prune(max_depth=depth)
+        if accuracy(capped, X, y) >= floor:
+            return capped
+    return forest
+
+
+def drop_trees(forest, X, y, floor, min_trees):
+    P = per_tree_positive(forest, X)
+    keep = list(range(forest.n_trees))
+    total = P.sum(axis=0)
+
+    while len(keep) > min_trees:
+        # every single-tree removal scored at once: (K, N) ensemble probabilities
+        candidates = (total - P[keep]) / (len(keep) - 1)
+        acc = np.mean((candidates > 0.5) == y, axis=1)
+        brier = np.mean((candidates - y) ** 2, axis=1)
+        best = np.lexsort((brier, -acc))[0]
+        if acc[best] < floor:
+            break
+        total -= P[keep[best]]
+        keep.pop(best)
+
+    return forest.prune(trees=keep)
+
+
+# -----------------------------
+# REPORT
+# -----------------------------
+def forest_bytes_on_disk(bundle_dir):
+    return sum(
+        os.path.getsize(os.path.join(bundle_dir, name))
+        for name in os.listdir(bundle_dir)
+        if name.startswith("forest.")
+    )
+
+
+def resident_kb(bundle_dir):
+    out = subprocess.run(
+        [sys.executable, "-c", RSS_PROBE, bundle_dir],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    )
+    return int(out.stdout.strip())
+
+
+def describe(label, forest, bundle_dir, X_test, y_test, X_all):
+    positive = list(forest.classes).index(1)
+    proba = forest.predict_proba(X_test)[:, positive]
+    p50, p99, batch_us = measure_latency(forest, X_all)
+    return {
+        "label": label,
+        "trees": forest.n_trees,
+        "max_depth": forest.max_depth,
+        "nodes": forest.n_nodes,
+        "dtype": str(forest.threshold.dtype),
+        "accuracy": float(np.mean((proba > 0.5) == y_test)),
+        "roc_auc": float(roc_auc_score(y_test, proba)),
+        "disk_kb": forest_bytes_on_disk(bundle_dir) / 1024,
+        "rss_kb": resident_kb(bundle_dir),
+        "latency_p50_ms": p50,
+        "latency_p99_ms": p99,
+        "batch_us_per_row": batch_us,
+    }
+
+
+def print_report(before, after):
+    rows = [
+        ("trees", "trees", "{:.0f}"), ("max depth", "max_depth", "{:.0f}"), ("nodes", "nodes", "{:.0f}"),
+        ("test accuracy", "accuracy", "{:.4f}"), ("test ROC-AUC", "roc_auc", "{:.4f}"),
+        ("forest on disk (KB)", "disk_kb", "{:.1f}"), ("resident (KB)", "rss_kb", "{:.0f}"),
+        ("1-row p50 (ms)", "latency_p50_ms", "{:.3f}"), ("1-row p99 (ms)", "latency_p99_ms", "{:.3f}"),
+        ("batch (µs/row)", "batch_us_per_row", "{:.1f}"),
+    ]
+    print(f"\n{'':<20} {before['label'] + ' (' + before['dtype'] + ')':>20} "
+          f"{after['label'] + ' (' + after['dtype'] + ')':>22} {'change':>9}")
+    for title, key, fmt in rows:
+        change = (after[key] / before[key] - 1) * 100 if before[key] else 0.0
+        print(f"{title:<20} {fmt.format(before[key]):>20} {fmt.format(after[key]):>22} {change:>+8.1f}%")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Compress a forest under a validation-accuracy budget")
+    parser.add_argument("--recipe", default="classical", choices=sorted(RECIPES))
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed validation accuracy drop")
+    parser.add_argument("--dtype", default="float32", choices=("float64", "float32", "float16"))
+    parser.add_argument("--min-trees", type=int, default=10)
+    parser.add_argument("--validation", type=float, default=0.2, help="validation fraction (selection)")
+    parser.add_argument("--test", type=float, default=0.2, help="test fraction (report only)")
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--activate", action="store_true", help=f"also publish to {ACTIVE_BUNDLE}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    recipe = RECIPES[args.recipe]
+
+    arrays, key, _ = load_or_preprocess(args.data, args.recipe, args.cache_dir)
+    X, y = arrays["X"], arrays["y"]
+    X_rest, X_test, y_rest, y_test = train_test_split(
+        X, y, test_size=args.test, stratify=y, random_state=RANDOM_STATE
+    )
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_rest, y_rest, test_size=args.validation / (1 - args.test), stratify=y_rest,
+        random_state=RANDOM_STATE,
+    )
+
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=-1, **recipe["model"])
+    model.fit(X_train, y_train)
+    original = FlatForest.from_sklearn(model)
+    y_val, y_test = y_val == 1, y_test == 1
+
+    baseline = accuracy(original, X_val, y_val)
+    floor = baseline - args.tolerance
+    print(f"{args.recipe}: {original.n_trees} trees, depth {original.max_depth}, "
+          f"validation accuracy {baseline:.4f} (floor {floor:.4f})")
+
+    t0 = time.perf_counter()
+    compressed = choose_depth(original, X_val, y_val, floor)
+    print(f"depth cap:   {original.max_depth} → {compressed.max_depth}")
+    compressed = drop_trees(compressed, X_val, y_val, floor, args.min_trees)
+    print(f"tree drop:   {original.n_trees} → {compressed.n_trees}")
+
+    dtype = args.dtype
+    quantized = compressed.quantize(dtype)
+    if dtype == "float16" and accuracy(quantized, X_val, y_val) < floor:
+        print("float16 breaks the accuracy budget, using float32")
+        dtype = "float32"
+        quantized = compressed.quantize(dtype)
+    compressed = quantized
+    print(f"quantize:    {dtype} ({time.perf_counter() - t0:.1f} s total)")
+
+    version = f"{args.recipe}-compressed-{time.strftime('%Y%m%dT%H%M%S')}-{key[:8]}"
+    metadata = {
+        "recipe": args.recipe,
+        "data_fingerprint": key,
+        "compressed_from": {"trees": original.n_trees, "max_depth": original.max_depth},
+        "tolerance": args.tolerance,
+        "dtype": dtype,
+        "validation_accuracy": accuracy(compressed, X_val, y_val),
+        "baseline_validation_accuracy": baseline,
+        "params": recipe["model"],
+    }
+    out = os.path.join(args.out, version)
+    save_bundle(out, version=version, metadata=metadata, **bundle_args(arrays, compressed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_bundle(tmp, **bundle_args(arrays, original))
+        before = describe("original", original, tmp, X_test, y_test, X)
+    after = describe("compressed", compressed, out, X_test, y_test, X)
+    print_report(before, after)
+
+    with open(os.path.join(out, "compression_report.json"), "w") as f:
+        json.dump({"before": before, "after": after, "metadata": metadata}, f, indent=2)
+
+    if args.activate:
+        save_bundle(ACTIVE_BUNDLE, version=version, metadata=metadata, **bundle_args(arrays, compressed))
+        print(f"\nactivated:   {ACTIVE_BUNDLE}")
+    print(f"\nbundle:      {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+# forest_engine.py — Random forest flattened into contiguous NumPy node arrays
+import os
+import threading
+
+import numpy as np
+
+LEAF = -1
+CHUNK_ROWS = 4096
+SKLEARN_MIN_ROWS = int(os.getenv("FOREST_SKLEARN_MIN_ROWS", "1000"))
+
+
+# -----------------------------
+# FLAT FOREST
+# -----------------------------
+# All trees live in one set of node arrays:
+#   feature[n]      split feature (0 for leaves)
+#   threshold[n]    go left when x[feature] <= threshold
+#   left[n]         left child global node id; leaves point to themselves
+#   right_delta[n]  right child id - left child id (0 for leaves)
+#   is_leaf[n]      leaf flag
+#   proba[n, c]     class probabilities of the node (value / its sum)
+#   roots[t]        root node id of tree t
+# Nothing is derived at load time, so every array can be memory-mapped.
+# All (row, tree) pairs descend one level per step as whole-array NumPy
+# operations; pairs that reached a leaf drop out of the active set, so the
+# work is proportional to the real path lengths rather than max_depth.
+#
+# That wins for small batches (no per-call overhead) but a gather per level
+# cannot keep up with sklearn's compiled loop on large ones, so batches of
+# sklearn_min_rows or more are handed to an sklearn forest rebuilt from the
+# same arrays (see to_sklearn) — no pickle, so no version skew.
+class FlatForest:
+    def __init__(self, feature, threshold, left, right_delta, is_leaf, proba, roots,
+                 max_depth, classes, sklearn_min_rows=SKLEARN_MIN_ROWS):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right_delta = right_delta
+        self.is_leaf = is_leaf
+        self.proba = proba
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes = classes
+        self.sklearn_min_rows = sklearn_min_rows
+        self._sklearn = None  # (n_features, model); model False when unusable
+        self._sklearn_lock = threading.Lock()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.to_arrays().values())
+
+    # -----------------------------
+    # EXPORT FROM SKLEARN
+    # -----------------------------
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, leaf_flags, probas, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == LEAF
+            own = np.arange(n)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, own, left) + offset)
+            rights.append(np.where(is_leaf, own, right) + offset)
+            leaf_flags.append(is_leaf)
+
+            # same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :est.n_classes_].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(value / normalizer)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        left = np.concatenate(lefts).astype(np.int32)
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=left,
+            right_delta=(np.concatenate(rights) - left).astype(np.int32),
+            is_leaf=np.concatenate(leaf_flags),
+            proba=np.ascontiguousarray(np.concatenate(probas)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+        )
+
+    def to_arrays(self):
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right_delta": self.right_delta,
+            "is_leaf": self.is_leaf,
+            "proba": self.proba,
+            "roots": self.roots,
+            "max_depth": np.asarray(self.max_depth),
+            "classes": self.classes,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right_delta=arrays["right_delta"],
+            is_leaf=arrays["is_leaf"],
+            proba=arrays["proba"],
+            roots=arrays["roots"],
+            max_depth=int(arrays["max_depth"]),
+            classes=arrays["classes"],
+        )
+
+    def save(self, path):
+        np.savez(path, **self.to_arrays())
+
+    def _replace(self, **arrays):
+        fields = {k: v for k, v in self.to_arrays().items() if k not in ("max_depth",)}
+        fields["max_depth"] = self.max_depth
+        fields.update(arrays)
+        return FlatForest(**fields)
+
+    # -----------------------------
+    # COMPRESSION
+    # -----------------------------
+    # Keep only `trees` (ids in order) and/or turn every node at depth
+    # max_depth into a leaf — internal nodes already carry their own class
+    # probabilities — then drop the unreachable nodes. Nodes are renumbered
+    # breadth-first within each tree.
+    def prune(self, trees=None, max_depth=None):
+        trees = range(self.n_trees) if trees is None else trees
+        left = self.left.tolist()
+        right = (self.left + self.right_delta).tolist()
+        is_leaf = self.is_leaf.tolist()
+        old_roots = self.roots.tolist()
+
+        order, depth, kids, roots = [], [], [], []
+        for t in trees:
+            i = len(order)
+            roots.append(i)
+            order.append(old_roots[t])
+            depth.append(0)
+            while i < len(order):
+                old = order[i]
+                if is_leaf[old] or (max_depth is not None and depth[i] >= max_depth):
+                    kids.append((i, i))
+                else:
+                    kids.append((len(order), len(order) + 1))
+                    order += (left[old], right[old])
+                    depth += (depth[i] + 1, depth[i] + 1)
+                i += 1
+
+        order = np.asarray(order, dtype=np.int64)
+        kids = np.asarray(kids, dtype=np.int32).reshape(-1, 2)
+        leaf = kids[:, 0] == np.arange(len(kids), dtype=np.int32)
+        return self._replace(
+            feature=np.where(leaf, 0, self.feature[order]).astype(np.int32),
+            threshold=np.ascontiguousarray(self.threshold[order]),
+            left=np.ascontiguousarray(kids[:, 0]),
+            right_delta=np.ascontiguousarray(kids[:, 1] - kids[:, 0]),
+            is_leaf=leaf,
+            proba=np.ascontiguousarray(self.proba[order]),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(depth, default=0),
+        )
+
+    # Thresholds are rounded *down* to the smaller float type: rows are
+    # compared as float32, and for a float32 x, x <= t64 exactly when
+    # x <= the largest float32 not above t64 — so float32 is lossless.
+    # float16 (and the leaf probabilities) are lossy; check the accuracy.
+    def quantize(self, dtype):
+        dtype = np.dtype(dtype)
+        threshold = self.threshold.astype(dtype)
+        too_high = threshold.astype(np.float64) > self.threshold
+        threshold[too_high] = np.nextafter(threshold[too_high], dtype.type(-np.inf))
+        return self._replace(threshold=threshold, proba=self.proba.astype(dtype))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls.from_arrays({k: data[k] for k in data.files})
+
+    # -----------------------------
+    # SKLEARN (large batches)
+    # -----------------------------
+    # The same trees as sklearn DecisionTreeClassifiers, built from the node
+    # arrays with the installed sklearn's own node layout. Trees must be
+    # contiguous (roots ascending), as from_sklearn and prune write them.
+    def to_sklearn(self, n_features):
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.tree import DecisionTreeClassifier
+        from sklearn.tree._tree import NODE_DTYPE, TREE_LEAF, TREE_UNDEFINED, Tree
+
+        n_classes = self.proba.shape[1]
+        ends = list(self.roots[1:]) + [self.n_nodes]
+        estimators = []
+        for start, end in zip(self.roots.tolist(), ends):
+            n = end - start
+            leaf = np.asarray(self.is_leaf[start:end])
+            left = np.asarray(self.left[start:end], dtype=np.intp) - start
+            right = left + self.right_delta[start:end]
+
+            nodes = np.zeros(n, dtype=NODE_DTYPE)
+            nodes["left_child"] = np.where(leaf, TREE_LEAF, left)
+            nodes["right_child"] = np.where(leaf, TREE_LEAF, right)
+            nodes["feature"] = np.where(leaf, TREE_UNDEFINED, self.feature[start:end])
+            nodes["threshold"] = np.where(leaf, TREE_UNDEFINED, self.threshold[start:end])
+            nodes["n_node_samples"] = 1
+            nodes["weighted_n_node_samples"] = 1.0
+
+            tree = Tree(n_features, np.array([n_classes], dtype=np.intp), 1)
+            tree.__setstate__({
+                "max_depth": self.max_depth,
+                "node_count": n,
+                "nodes": nodes,
+                "values": np.ascontiguousarray(self.proba[start:end], dtype=np.float64).reshape(n, 1, n_classes),
+            })
+
+            est = DecisionTreeClassifier()
+            est.tree_ = tree
+            est.n_features_in_ = n_features
+            est.n_outputs_ = 1
+            est.classes_ = self.classes
+            est.n_classes_ = n_classes
+            estimators.append(est)
+
+        model = RandomForestClassifier(n_estimators=len(estimators))
+        model.estimators_ = estimators
+        model.n_features_in_ = n_features
+        model.n_outputs_ = 1
+        model.classes_ = self.classes
+        model.n_classes_ = n_classes
+        return model
+
+    # built on the first large batch and checked against the flat evaluator;
+    # any mismatch or failure keeps everything on the flat path
+    def _sklearn_model(self, X):
+        n_features = X.shape[1]
+        cached = self._sklearn
+        if cached is not None and cached[0] == n_features:
+            return cached[1]
+
+        with self._sklearn_lock:
+            if self._sklearn is None or self._sklearn[0] != n_features:
+                probe = X[:256]
+                try:
+                    model = self.to_sklearn(n_features)
+                    if not np.allclose(model.predict_proba(probe), self._predict_flat(probe), rtol=0, atol=1e-9):
+                        raise ValueError("predictions differ from the flat forest")
+                except Exception as e:
+                    print(f"FlatForest: sklearn path disabled ({e})")
+                    model = False
+                self._sklearn = (n_features, model)
+            return self._sklearn[1]
+
+    # -----------------------------
+    # INFERENCE
+    # -----------------------------
+    def apply(self, X):
+        # X: (N, F) → leaf node ids (N, T)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        take = np.take
+
+        # tree-major order keeps consecutive lookups inside one tree's nodes
+        leaves = np.repeat(self.roots, n_rows)
+        current = leaves.copy()
+        row_base = np.tile(np.arange(n_rows, dtype=np.int32) * n_features, self.n_trees)
+        active = np.arange(leaves.size, dtype=np.int32)
+
+        # single-node trees are already done
+        done = take(self.is_leaf, current)
+        if done.any():
+            keep = ~done
+            active, current, row_base = active[keep], current[keep], row_base[keep]
+
+        for _ in range(self.max_depth):
+            if active.size == 0:
+                break
+
+            values = take(flat_X, row_base + take(self.feature, current))
+            go_right = values > take(self.threshold, current)
+            current = take(self.left, current) + go_right * take(self.right_delta, current)
+
+            done = take(self.is_leaf, current)
+            if done.any():
+                leaves[active[done]] = current[done]
+                keep = ~done
+                active, current, row_base = active[keep], current[keep], row_base[keep]
+
+        return leaves.reshape(self.n_trees, n_rows).T
+
+    def predict_proba(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        if self.sklearn_min_rows and X.shape[0] >= self.sklearn_min_rows:
+            model = self._sklearn_model(X)
+            if model:
+                return model.predict_proba(X)
+        return self._predict_flat(X)
+
+    def _predict_flat(self, X):
+        out = np.empty((X.shape[0], self.proba.shape[1]), dtype=np.float64)
+
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            stop = start + CHUNK_ROWS
+            leaves = self.apply(X[start:stop])
+            # sum trees in order (axis 0 of a (T, N, C) array) like sklearn's accumulation
+            per_tree = self.proba[leaves.T]
+            out[start:stop] = np.add.reduce(per_tree, axis=0, dtype=np.float64) / self.n_trees
+
+        return out
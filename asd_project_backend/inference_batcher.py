@@ -0,0 +1,114 @@
+# inference_batcher.py — Coalesce concurrent prediction requests into batches
+import os
+import time
+import asyncio
+
+from metrics import Histogram
+
+DEFAULT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "32"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "2"))
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_WAIT_MS_BOUNDS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+# -----------------------------
+# MICRO-BATCHER
+# -----------------------------
+# submit(row) parks the caller on a future. A single background task takes
+# the first waiting row, keeps collecting until max_batch rows or max_wait_ms
+# have passed, runs predict_fn(rows) once in a worker thread (imputer →
+# scaler → predict_proba on the whole batch) and resolves every future with
+# its row's entry of the result.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = None
+        self._task = None
+
+        self.batch_size = Histogram(BATCH_SIZE_BOUNDS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BOUNDS)
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, row):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+            self.batch_size.observe(len(batch))
+            self.batches += 1
+            self.rows += len(batch)
+
+            rows = [row for row, _, _ in batch]
+            try:
+                result = await loop.run_in_executor(None, self.predict_fn, rows)
+            except Exception as e:
+                self.errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for i, (_, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(result[i])
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
@@ -1,19 +1,60 @@
 # main.py — ASD Adaptive Screening Backend (Final, Optimized, Category Skip PERFECT)
+import os
+import hmac
+import json
+import math
+import time
 import uuid
+import asyncio
+import threading
 import traceback
-from typing import Dict, Any
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Union
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-from utils import load_artifacts
+from utils import load_artifacts, model_available, predict_risk, smoke_test
+from model_bundle import BundleError
 from pdf_utils import make_pdf_bytes
+from session_store import MemorySessionBackend, SessionRecord, SqliteSessionBackend, create_session_backend
+from session_journal import DEFAULT_JOURNAL_DIR as SESSION_JOURNAL_DIR, SessionJournal
+from report_jobs import DEFAULT_JOBS_DIR as REPORT_JOBS_DIR, QueueFull, ReportJobQueue
+from report_cache import ReportCache, report_key
+from report_export import iter_zip, render_in_order
+from inference_batcher import MicroBatcher
+from metrics import Histogram, MetricsMiddleware, PrometheusText, RequestMetrics
+from profiling import (
+    DEFAULT_SAMPLE_RATE as PROFILE_SAMPLE_RATE, ProfileStore, ProfilingMiddleware, instrument_routes
+)
+from questionnaire import (
+    FINAL_STATE, START_STATE, answer_class, compile_questionnaire, load_questionnaire
+)
 
 # ================================
 # FASTAPI INIT
 # ================================
-app = FastAPI(title="NeuroMate – ASD Adaptive Screening API (Final Logic)")
+@asynccontextmanager
+async def lifespan(app):
+    PREDICT_BATCHER.start()
+    if JOURNAL is not None:
+        await run_in_threadpool(recover_sessions)
+        JOURNAL.start(SESSIONS)
+    watcher = asyncio.create_task(watch_model_bundle()) if MODEL_WATCH_SECONDS > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await PREDICT_BATCHER.stop()
+    if JOURNAL is not None:
+        await run_in_threadpool(JOURNAL.stop)  # final snapshot: the next start replays nothing
+    REPORT_JOBS.shutdown()
+
+
+app = FastAPI(title="NeuroMate – ASD Adaptive Screening API (Final Logic)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,7 +66,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-artifacts = load_artifacts() or {}
+# per-route request counts / errors / latency, exported at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+REQUEST_METRICS = RequestMetrics()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=REQUEST_METRICS)
+
+# fails loudly (BundleError) when the model bundle is missing or inconsistent
+_load_started = time.perf_counter()
+artifacts = load_artifacts()
+ARTIFACTS_LOAD_SECONDS = time.perf_counter() - _load_started
 
 # ================================
 # QUESTIONS
@@ -86,8 +136,73 @@ QUESTIONS = {
     ],
 }
 
-CATEGORIES = list(QUESTIONS.keys())
-SESSIONS: Dict[str, Dict[str, Any]] = {}
+DEMOGRAPHIC_KEYS = ["name", "age", "gender", "country", "ethnicity", "relation", "jaundice", "used_app_before"]
+
+# ================================
+# COMPILED QUESTIONNAIRE (built once at startup)
+# ================================
+# QUESTIONNAIRE_PATH may point to a JSON questionnaire (see questionnaire.py)
+QUESTIONNAIRE_PATH = os.getenv("QUESTIONNAIRE_PATH")
+
+if QUESTIONNAIRE_PATH:
+    QUESTIONNAIRE = load_questionnaire(QUESTIONNAIRE_PATH)
+else:
+    QUESTIONNAIRE = compile_questionnaire(
+        [(k, q, "int" if k == "age" else "str") for k, q in zip(DEMOGRAPHIC_KEYS, DEMOGRAPHIC_QUESTIONS)],
+        QUESTIONS,
+    )
+
+CATEGORIES = list(QUESTIONNAIRE.categories)
+
+
+# every model input must be something a screening session collects
+def check_model_features(model):
+    uncollected = set(model["feature_order"]) - set(CATEGORIES) - set(QUESTIONNAIRE.demo_keys)
+    if uncollected:
+        raise BundleError(
+            f"{model['path']}: model expects features the questionnaire never asks: {sorted(uncollected)}"
+        )
+
+
+check_model_features(artifacts)
+
+
+# Each batch runs on the model that is active when it starts, so batches in
+# flight during a reload finish on the old version.
+def predict_batch(rows):
+    model = artifacts
+    proba = predict_risk(rows, model)
+    if proba is None:
+        return [(None, None)] * len(rows)
+    return [(float(p), model["version"]) for p in proba]
+
+
+SESSIONS = create_session_backend()
+
+# Workers sharing the sqlite sessions must also share report jobs, or a poll
+# that lands on another worker gets a 404.
+if REPORT_JOBS_DIR is None and isinstance(SESSIONS, SqliteSessionBackend):
+    REPORT_JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(SESSIONS.path)), "report_jobs")
+REPORT_JOBS = ReportJobQueue(directory=REPORT_JOBS_DIR)
+REPORT_CACHE = ReportCache()
+PREDICT_BATCHER = MicroBatcher(predict_batch)
+
+
+def session_scores(sess):
+    return dict(zip(CATEGORIES, sess.scores))
+
+
+def session_demographics(sess):
+    texts = QUESTIONNAIRE.texts
+    return {texts[s]: a for s, a in sess.answers if QUESTIONNAIRE.demo_keys[s] is not None}
+
+
+def session_answers(sess):
+    q = QUESTIONNAIRE
+    return [
+        {"category": CATEGORIES[q.category[s]], "question": q.texts[s], "answer": a}
+        for s, a in sess.answers if q.category[s] >= 0
+    ]
 
 # ================================
 # CATEGORY SEVERITY LABELING
@@ -133,25 +248,24 @@ def compute_final_diagnosis(scores):
 def root():
     return {"message": "NeuroMate ASD Screening API Running"}
 
+# ================================
+# SESSION STORE STATS
+# ================================
+@app.get("/session_stats")
+def session_stats():
+    return SESSIONS.stats()
+
 # ================================
 # START SESSION
 # ================================
 @app.post("/start_session")
 def start_session():
     session_id = str(uuid.uuid4())
-    SESSIONS[session_id] = {
-        "phase": 0,
-        "demo_index": 0,
-        "demo_answers": {},
-        "user": {},
-        "category_index": 0,
-        "question_index": 0,
-        "scores": {c: 0 for c in CATEGORIES},
-        "answers": [],
-        "complete": False,
-        "final": None,
-    }
-    return {"session_id": session_id, "next_question": DEMOGRAPHIC_QUESTIONS[0]}
+    sess = SessionRecord(len(CATEGORIES))
+    SESSIONS.put(session_id, sess)
+    if JOURNAL is not None:
+        JOURNAL.commit(JOURNAL.start_session(session_id, sess))
+    return {"session_id": session_id, "next_question": QUESTIONNAIRE.texts[START_STATE]}
 
 # ================================
 # ANSWER HANDLER (CATEGORY SKIP PERFECT)
@@ -160,101 +274,353 @@ def start_session():
 def answer(data: Dict[str, Any]):
     try:
         session_id = data.get("session_id")
-        ans_raw = str(data.get("answer", "")).strip().lower()
-        yes_words = {"yes", "y", "true", "often", "always", "frequently"}
 
-        if not session_id or session_id not in SESSIONS:
+        sess, result, _ = record_answers(session_id, [data.get("answer", "")])
+        if sess is None:
             raise HTTPException(400, "Invalid session id")
+        return result
 
-        sess = SESSIONS[session_id]
+    except HTTPException:
+        raise
+    except InvalidAnswer as e:
+        raise HTTPException(422, str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(500, f"Internal error: {str(e)}")
 
-        # ---------------------------
-        # DEMOGRAPHIC QUESTIONS
-        # ---------------------------
-        if sess["phase"] == 0:
-            idx = sess["demo_index"]
-            question = DEMOGRAPHIC_QUESTIONS[idx]
 
-            sess["demo_answers"][question] = ans_raw
-            keys = ["name", "age", "gender", "country", "ethnicity", "relation", "jaundice", "used_app_before"]
+# ================================
+# BATCH ANSWERS (one round trip for many answers)
+# ================================
+@app.post("/answer_batch")
+def answer_batch(data: Dict[str, Any]):
+    try:
+        session_id = data.get("session_id")
+        answers = data.get("answers")
 
-            key = keys[idx]
-            sess["user"][key] = int(ans_raw) if key == "age" else ans_raw
+        if not isinstance(answers, list):
+            raise HTTPException(400, "answers must be a list")
 
-            sess["demo_index"] += 1
-            if sess["demo_index"] >= len(DEMOGRAPHIC_QUESTIONS):
-                sess["phase"] = 1
-                return {"next_question": QUESTIONS[CATEGORIES[0]][0]}
+        sess, result, applied = record_answers(session_id, answers)
+        if sess is None:
+            raise HTTPException(400, "Invalid session id")
+        return {"applied": applied, **result}
 
-            return {"next_question": DEMOGRAPHIC_QUESTIONS[sess["demo_index"]]}
+    except HTTPException:
+        raise
+    except InvalidAnswer as e:
+        raise HTTPException(422, str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(500, f"Internal error: {str(e)}")
 
-        # ---------------------------
-        # CATEGORY QUESTIONS
-        # ---------------------------
-        cat_i = sess["category_index"]
-        q_i = sess["question_index"]
-        category = CATEGORIES[cat_i]
-        q_text = QUESTIONS[category][q_i]
 
-        # Save response
-        sess["answers"].append({
-            "category": category,
-            "question": q_text,
-            "answer": ans_raw
-        })
+# Shared by /answer, /answer_batch and the WebSocket. Concurrent answers to
+# one session apply one after the other (get → apply → journal → save under
+# the session's lock). With `position` (answers the client saw acknowledged)
+# nothing is applied unless the session is exactly there, so an answer resent
+# after a reconnect is not counted twice.
+# Raises InvalidAnswer, before anything is applied, if any answer cannot be parsed.
+# Returns (record, response, answers applied); record is None for an unknown session.
+def record_answers(session_id, answers, position=None):
+    result = None
+    applied = []
+    with SESSIONS.locked(session_id):
+        sess = SESSIONS.get(session_id)
+        if sess is None:
+            return None, None, 0
 
-        # FIRST QUESTION = NO → SKIP ENTIRE CATEGORY
-        if q_i == 0 and ans_raw not in yes_words:
-            cat_i += 1
-            q_i = 0
+        seq = 0
+        was_complete = sess.complete
+        if position is None or position == len(sess.answers):
+            state = sess.cursor
+            # A batch is applied to a copy and taken over only when every answer
+            # went through, so a failure leaves the session as it was on both
+            # backends (sqlite also rolls back). One answer is parsed before
+            # apply_answer changes anything, so it needs no copy.
+            checked = check_answers(sess, answers)
+            work = sess.copy() if len(checked) > 1 else sess
+            for ans_raw in checked:
+                result = apply_answer(work, session_id, ans_raw)
+                applied.append(ans_raw)
+            if work is not sess:
+                sess.update_from(work)
+            seq = journal_answers(session_id, sess, state, applied, was_complete)
+        SESSIONS.save(session_id, sess)
+    commit_journal(seq)
 
-            if cat_i >= len(CATEGORIES):
-                return finalize(sess, session_id)
+    if sess.complete and not was_complete:
+        store_probability(session_id, sess)
 
-            sess["category_index"] = cat_i
-            sess["question_index"] = q_i
-            return {"next_question": QUESTIONS[CATEGORIES[cat_i]][0]}
+    if result is None:
+        result = {"final": True, **sess.final} if sess.complete else {"next_question": current_question(sess)}
+    return sess, result, len(applied)
 
-        # If YES → count score
-        if ans_raw in yes_words:
-            sess["scores"][category] += 1
 
-        # Move inside the same category
-        q_i += 1
+# Longer answers are rejected (422); no question needs more
+MAX_ANSWER_CHARS = int(os.getenv("MAX_ANSWER_CHARS", "200"))
 
-        # End of category → next category
-        if q_i >= len(QUESTIONS[category]):
-            cat_i += 1
-            q_i = 0
 
-        # End of all categories → FINALIZE
-        if cat_i >= len(CATEGORIES):
-            return finalize(sess, session_id)
+class InvalidAnswer(ValueError):
+    pass
 
-        sess["category_index"] = cat_i
-        sess["question_index"] = q_i
-        return {"next_question": QUESTIONS[CATEGORIES[cat_i]][q_i]}
 
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(500, f"Internal error: {str(e)}")
+def parse_demographic(state, ans_raw):
+    parse = QUESTIONNAIRE.parsers[state]
+    if parse is None:
+        return ans_raw
+    try:
+        return parse(ans_raw)
+    except ValueError:
+        raise InvalidAnswer(f"{ans_raw!r} is not a valid answer to {QUESTIONNAIRE.texts[state]!r}") from None
+
+
+# Normalizes the answers and walks them through the transition table without
+# touching the session, so a bad answer rejects the whole batch up front.
+# Answers after the end of the questionnaire are dropped.
+def check_answers(sess, answers):
+    q = QUESTIONNAIRE
+    state = sess.cursor
+    checked = []
+    for raw in answers:
+        if state == FINAL_STATE:
+            break
+        ans_raw = str(raw).strip().lower()
+        if len(ans_raw) > MAX_ANSWER_CHARS:
+            raise InvalidAnswer(f"answers are limited to {MAX_ANSWER_CHARS} characters")
+        if q.demo_keys[state] is not None:
+            parse_demographic(state, ans_raw)
+        checked.append(ans_raw)
+        state = q.next_state[2 * state + answer_class(ans_raw)]
+    return checked
+
+
+def current_question(sess):
+    if sess.cursor == FINAL_STATE:
+        return None
+    return QUESTIONNAIRE.texts[sess.cursor]
+
+
+def apply_answer(sess, session_id, ans_raw):
+    q = QUESTIONNAIRE
+    state = sess.cursor
+
+    # already finished → answers do not change anything
+    if state == FINAL_STATE:
+        return {"final": True, **sess.final}
+
+    # DEMOGRAPHIC QUESTIONS → store typed value
+    key = q.demo_keys[state]
+    if key is not None:
+        sess.user[key] = parse_demographic(state, ans_raw)
+
+    # ONE TABLE LOOKUP: next state + score (first-question NO skips its category)
+    t = 2 * state + answer_class(ans_raw)
+    delta = q.score_delta[t]
+    if delta:
+        sess.scores[q.category[state]] += delta
+
+    sess.answers.append((state, ans_raw))
+    sess.cursor = q.next_state[t]
+
+    if sess.cursor == FINAL_STATE:
+        return finalize(sess, session_id)
+
+    return {"next_question": q.texts[sess.cursor]}
 
 
 # ================================
 # FINALIZATION
 # ================================
+# `complete` is set last: readers that do not take the session lock
+# (/predict_final, reports) never see a completed session without its result
 def finalize(sess, session_id):
-    sess["complete"] = True
-    final_label, guidance, per_cat_labels, total_yes = compute_final_diagnosis(sess["scores"])
+    sess.completed_at = time.time()
+    final_label, guidance, per_cat_labels, total_yes = compute_final_diagnosis(session_scores(sess))
 
-    sess["final"] = {
+    sess.final = {
         "ASD_result": final_label,
         "guidance": guidance,
         "total_yes": total_yes,
         "per_category_labels": per_cat_labels,
     }
+    sess.complete = True
 
-    return {"final": True, **sess["final"]}
+    return {"final": True, **sess.final}
+
+# ================================
+# SESSION JOURNAL (crash recovery for the memory backend)
+# ================================
+# With SESSION_JOURNAL_DIR set, session mutations are journaled (see
+# session_journal.py) and replayed on startup, so a restart or deploy keeps
+# screenings in progress. The sqlite backend is durable on its own.
+JOURNAL = None
+
+if SESSION_JOURNAL_DIR:
+    if not isinstance(SESSIONS, MemorySessionBackend):
+        raise ValueError("SESSION_JOURNAL_DIR is only used with SESSION_BACKEND=memory")
+    JOURNAL = SessionJournal(SESSION_JOURNAL_DIR)
+
+
+# answers already given are replayed from the state they were given at;
+# a record that is past that state already contains them. An answer that no
+# longer parses (older journal, changed questionnaire) skips the event.
+def replay_answers(sess, state, answers):
+    if sess.cursor != state:
+        return False
+    try:
+        checked = check_answers(sess, answers)
+    except InvalidAnswer:
+        return False
+    for ans_raw in checked:
+        apply_answer(sess, None, ans_raw)
+    return True
+
+
+# call with the session's lock held, right after the mutation
+def journal_answers(session_id, sess, state, answers, was_complete):
+    if JOURNAL is None or was_complete:
+        return 0
+    seq = JOURNAL.answers(session_id, sess, state, answers)
+    if sess.complete:
+        seq = JOURNAL.finalize(session_id, sess)
+    return seq
+
+
+def commit_journal(seq):
+    if JOURNAL is not None:
+        JOURNAL.commit(seq)
+
+
+# Runs at startup in the serving process (lifespan), not at import: the
+# serve.py master imports main and forks, and a restarted worker must replay
+# what the worker before it journaled.
+def recover_sessions():
+    recovered = JOURNAL.recover(
+        SESSIONS, lambda: SessionRecord(len(CATEGORIES)), replay_answers, SESSIONS.ttl_seconds
+    )
+    print(f"Session journal: recovered {recovered['sessions']} sessions in {recovered['seconds']} s")
+
+
+@app.get("/journal_stats")
+def journal_stats():
+    return JOURNAL.stats() if JOURNAL is not None else {"enabled": False}
+
+# ================================
+# WEBSOCKET SCREENING (one connection per screening)
+# ================================
+# ws://host/ws/screening[?session_id=<id>] — without session_id a new session
+# is started, with it the session is resumed (e.g. after a dropped connection).
+# JSON text messages:
+#
+#   server → {"type": "session", "session_id", "resumed", "answered", "next_question" | "final": true, ...}
+#   client → {"type": "answer", "answer": "yes", "answered": 12}
+#   server → {"type": "question", "next_question", "answered"}
+#          | {"type": "final", "final": true, "ASD_result", ..., "answered"}
+#          | {"type": "error", "detail", "status": 422 | 500} (answer not applied)
+#   client → {"type": "ping"}  server → {"type": "pong"}
+#
+# "answered" counts the session's answers. A client that sends the count it
+# last saw gets an answer applied only once even if it resends it after a
+# reconnect; the reply always carries the current question. Answers go
+# through record_answers(), the same path (locking, journal) as /answer.
+#
+# The server sends {"type": "ping"} every WS_HEARTBEAT_SECONDS and closes the
+# connection (code 4408) after WS_IDLE_TIMEOUT_SECONDS without a client
+# message; an unknown or expired session closes it with code 4404.
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "120"))
+
+# counters are only touched on the event loop
+WS_STATS = {"open": 0, "opened": 0, "resumed": 0, "answers": 0, "idle_timeouts": 0}
+
+
+def ws_state_message(sess, result, **extra):
+    kind = "final" if result.get("final") else "question"
+    return {"type": kind, **extra, **result, "answered": len(sess.answers)}
+
+
+@app.websocket("/ws/screening")
+async def ws_screening(websocket: WebSocket, session_id: Optional[str] = None):
+    await websocket.accept()
+
+    send_lock = asyncio.Lock()  # the heartbeat task sends too
+    last_seen = time.monotonic()
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_text(json.dumps(message))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            if time.monotonic() - last_seen >= WS_IDLE_TIMEOUT_SECONDS:
+                WS_STATS["idle_timeouts"] += 1
+                async with send_lock:
+                    await websocket.close(4408, "idle timeout")
+                return
+            await send({"type": "ping"})
+
+    resumed = bool(session_id)
+    if not resumed:
+        session_id = (await run_in_threadpool(start_session))["session_id"]
+    sess, result, _ = await run_in_threadpool(record_answers, session_id, [])
+    if sess is None:
+        await send({"type": "error", "detail": "Invalid session id"})
+        await websocket.close(4404, "invalid session id")
+        return
+    WS_STATS["resumed"] += resumed
+    await send(ws_state_message(sess, result, session_id=session_id, resumed=resumed) | {"type": "session"})
+
+    WS_STATS["open"] += 1
+    WS_STATS["opened"] += 1
+    pinger = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                await send({"type": "error", "detail": "messages must be JSON"})
+                continue
+            last_seen = time.monotonic()
+
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "ping":
+                await send({"type": "pong"})
+            elif kind == "pong":
+                pass
+            elif kind == "answer":
+                position = message.get("answered")
+                try:
+                    sess, result, applied = await run_in_threadpool(
+                        record_answers, session_id, [message.get("answer", "")],
+                        position if isinstance(position, int) else None,
+                    )
+                except InvalidAnswer as e:  # nothing was applied; the client may answer again
+                    await send({"type": "error", "detail": str(e), "status": 422})
+                    continue
+                except Exception as e:
+                    traceback.print_exc()
+                    await send({"type": "error", "detail": f"Internal error: {str(e)}", "status": 500})
+                    continue
+                if sess is None:  # expired while the connection was idle
+                    await send({"type": "error", "detail": "Invalid session id"})
+                    await websocket.close(4404, "invalid session id")
+                    return
+                WS_STATS["answers"] += applied
+                await send(ws_state_message(sess, result))
+            else:
+                await send({"type": "error", "detail": f"unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass  # client went away, or the heartbeat closed the connection
+    finally:
+        pinger.cancel()
+        WS_STATS["open"] -= 1
+
+
+@app.get("/ws_stats")
+def ws_stats():
+    return dict(WS_STATS)
 
 # ================================
 # GET FINAL RESULT
@@ -263,46 +629,558 @@ def finalize(sess, session_id):
 def predict_final(data: Dict[str, Any]):
     session_id = data.get("session_id")
 
-    if not session_id or session_id not in SESSIONS:
+    sess = SESSIONS.get(session_id)
+    if sess is None:
         raise HTTPException(400, "Invalid session_id")
 
-    sess = SESSIONS[session_id]
-    if not sess["complete"]:
+    if not sess.complete:
         raise HTTPException(400, "Screening not completed")
 
-    return sess["final"]
+    return sess.final
+
+# ================================
+# MODEL RISK PROBABILITY
+# ================================
+# The option-B model was trained on one binary AQ-10 item per category; a
+# session scores 0–5 per category, so a category counts as present (1) once
+# category_label leaves "Normal".
+CATEGORY_PRESENT_MIN_SCORE = 2
+
+
+def session_features(sess):
+    row = {c: int(v >= CATEGORY_PRESENT_MIN_SCORE) for c, v in session_scores(sess).items()}
+    row.update(sess.user)
+    return row
+
+
+def session_probability(sess):
+    proba = predict_risk([session_features(sess)], artifacts)
+    return None if proba is None else float(proba[0])
+
+
+# Stored once per completed session, so reports never run the model again.
+# The model runs outside the session lock (on sqlite that lock is a write
+# transaction every worker waits on); storing it is a short second write.
+def store_probability(session_id, sess):
+    probability = session_probability(sess)
+    if probability is None:
+        return None
+
+    with SESSIONS.locked(session_id):
+        current = SESSIONS.get(session_id)
+        if current is not None and current.complete and current.probability is None:
+            current.probability = probability
+            SESSIONS.save(session_id, current)
+    sess.probability = probability
+    return probability
+
+
+# concurrent callers are coalesced into one model call by PREDICT_BATCHER
+@app.post("/predict_risk")
+async def predict_risk_session(data: Dict[str, Any]):
+    session_id = data.get("session_id")
+
+    sess = await run_in_threadpool(SESSIONS.get, session_id)
+    if sess is None:
+        raise HTTPException(400, "Invalid session_id")
+
+    if not sess.complete:
+        raise HTTPException(400, "Screening not completed")
+
+    probability, version = await PREDICT_BATCHER.submit(session_features(sess))
+    return {
+        **sess.final,
+        "probability": probability,
+        "model_available": probability is not None,
+        "model_version": version,
+    }
+
+
+@app.get("/predict_batcher_stats")
+def predict_batcher_stats():
+    return PREDICT_BATCHER.stats()
+
+
+# rows are model feature dicts (categories 0/1, as in training); the columns
+# depend on the active bundle, so only their types are checked here
+class RiskBatchRequest(BaseModel):
+    session_ids: Optional[List[str]] = None
+    rows: Optional[List[Dict[str, Union[float, str, None]]]] = None
+
+
+# Body: {"session_ids": [...]} (completed sessions) and/or {"rows": [feature dicts]}
+@app.post("/predict_risk_batch")
+def predict_risk_batch(data: RiskBatchRequest):
+    session_ids = data.session_ids or []
+    rows = data.rows or []
+
+    sessions = []
+    for session_id in session_ids:
+        sess = SESSIONS.get(session_id)
+        if sess is None or not sess.complete:
+            raise HTTPException(400, f"Invalid or incomplete session: {session_id}")
+        sessions.append(sess)
+
+    # one model call for every session and raw row together
+    model = artifacts
+    proba = predict_risk([session_features(s) for s in sessions] + rows, model)
+    if proba is None:
+        proba = [None] * (len(sessions) + len(rows))
+    else:
+        proba = [float(p) for p in proba]
+
+    return {
+        "model_available": model_available(model),
+        "model_version": model["version"],
+        "sessions": [
+            {"session_id": sid, "ASD_result": s.final["ASD_result"], "probability": p}
+            for sid, s, p in zip(session_ids, sessions, proba)
+        ],
+        "rows": proba[len(sessions):],
+    }
+
+
+# ================================
+# MODEL HOT RELOAD
+# ================================
+# A new bundle is loaded and smoke-tested off the event loop, then published
+# with one assignment to the global `artifacts`. Requests that already hold
+# the old dict finish on it; its mapped files stay valid because bundles are
+# written by replacing files, never truncating them. Each worker process
+# reloads on its own: use MODEL_WATCH_SECONDS with several workers.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+MODEL_WATCH_SECONDS = float(os.getenv("MODEL_WATCH_SECONDS", "0"))
+
+SMOKE_DEMOGRAPHICS = {
+    "age": 30, "gender": "m", "country": "india", "ethnicity": "asian",
+    "relation": "self", "jaundice": "no", "used_app_before": "no",
+}
+SMOKE_ROWS = [dict(SMOKE_DEMOGRAPHICS, **{c: flag for c in CATEGORIES}) for flag in (0, 1)] + [{}]
+
+MODEL_RELOAD_LOCK = threading.Lock()
+MODEL_STATS = {
+    "loaded_at": time.time(),
+    "load_seconds": ARTIFACTS_LOAD_SECONDS,
+    "reloads": 0,
+    "reload_failures": 0,
+    "last_error": None,
+}
+
+
+def require_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(403, "Invalid admin token")
+
+
+def manifest_signature(path):
+    try:
+        st = os.stat(os.path.join(path, "manifest.json"))
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def reload_model(path=None):
+    global artifacts
+
+    with MODEL_RELOAD_LOCK:
+        previous = artifacts
+        path = path or previous["path"]
+        started = time.perf_counter()
+        try:
+            model = load_artifacts(path)
+            load_seconds = time.perf_counter() - started
+            check_model_features(model)
+            smoke_test(model, SMOKE_ROWS)  # also faults the forest pages in before traffic
+        except Exception as e:
+            MODEL_STATS["reload_failures"] += 1
+            MODEL_STATS["last_error"] = str(e)
+            raise
+
+        if model["version"] == previous["version"] and path == previous["path"]:
+            return {"reloaded": False, "model_version": model["version"]}
+
+        artifacts = model
+        MODEL_STATS["loaded_at"] = time.time()
+        MODEL_STATS["load_seconds"] = load_seconds
+        MODEL_STATS["reloads"] += 1
+        MODEL_STATS["last_error"] = None
+
+    return {
+        "reloaded": True,
+        "model_version": model["version"],
+        "previous_version": previous["version"],
+        "reload_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+# polls the active bundle's manifest; a failed reload is not retried until it changes again
+async def watch_model_bundle():
+    seen = manifest_signature(artifacts["path"])
+    while True:
+        await asyncio.sleep(MODEL_WATCH_SECONDS)
+        signature = manifest_signature(artifacts["path"])
+        if signature is None or signature == seen:
+            continue
+        seen = signature
+        try:
+            result = await run_in_threadpool(reload_model)
+            if result["reloaded"]:
+                print(f"Model reloaded: {result['previous_version']} → {result['model_version']}")
+        except Exception as e:
+            print(f"Model reload failed, keeping {artifacts['version']}: {e}")
+
+
+@app.get("/model")
+def model_info():
+    model = artifacts
+    return {
+        "model_version": model["version"],
+        "path": model["path"],
+        "created_at": model["manifest"].get("created_at"),
+        "metadata": model["manifest"].get("metadata", {}),
+        "n_trees": model["forest"].n_trees,
+        "watch_seconds": MODEL_WATCH_SECONDS,
+        **MODEL_STATS,
+    }
+
+
+# Body (optional): {"path": "<bundle dir>"} — defaults to the active bundle's directory
+@app.post("/admin/reload-model")
+def admin_reload_model(data: Optional[Dict[str, Any]] = None,
+                       x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    try:
+        return reload_model((data or {}).get("path"))
+    except BundleError as e:
+        raise HTTPException(422, f"Reload rejected, still serving {artifacts['version']}: {e}")
 
 # ================================
 # PDF GENERATION
 # ================================
+# Cacheable: the browser revalidates with If-None-Match and gets a 304 while
+# the session's report is unchanged.
+@app.get("/reports/{session_id}")
+def get_report(session_id: str, if_none_match: Optional[str] = Header(None)):
+    sess = SESSIONS.get(session_id)
+    if sess is None:
+        raise HTTPException(404, "Unknown or expired session id")
+
+    if not sess.complete:
+        raise HTTPException(400, "Screening not complete")
+
+    args = report_args(session_id, sess)
+    etag = f'"{report_key(*args)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    return report_response(session_id, args, headers)
+
+
+# Kept for older clients. A matching If-None-Match on a POST is a failed
+# precondition (RFC 7232), not a 304.
 @app.post("/generate-report-session")
-def generate_pdf(data: Dict[str, Any]):
+def generate_pdf(data: Dict[str, Any], if_none_match: Optional[str] = Header(None)):
     session_id = data.get("session_id")
 
-    if not session_id or session_id not in SESSIONS:
+    sess = SESSIONS.get(session_id)
+    if sess is None:
         raise HTTPException(400, "Invalid session id")
 
-    sess = SESSIONS[session_id]
-
-    if not sess["complete"]:
+    if not sess.complete:
         raise HTTPException(400, "Screening not complete")
 
-    pdf = make_pdf_bytes(
-        sess["user"],
-        sess["final"]["ASD_result"],
-        0.0,
-        extra={
-            "scores": sess["scores"],
-            "per_category_labels": sess["final"]["per_category_labels"],
-            "total_yes": sess["final"]["total_yes"],
-            "guidance": sess["final"]["guidance"],
-            "demographics": sess["demo_answers"],
-            "answers": sess["answers"],
-        }
-    )
+    args = report_args(session_id, sess)
+    etag = f'"{report_key(*args)}"'
+
+    if etag_matches(if_none_match, etag):
+        raise HTTPException(412, "Report unchanged", headers={"ETag": etag})
+
+    return report_response(session_id, args, {"ETag": etag})
+
+
+# completed sessions are immutable → same data, same PDF, same ETag
+def report_response(session_id, args, headers):
+    key = report_key(*args)
+    pdf = REPORT_CACHE.get(key)
+    if pdf is None:
+        started = time.perf_counter()
+        pdf = make_pdf_bytes(*args)
+        PDF_RENDER_SECONDS.observe(time.perf_counter() - started)
+        REPORT_CACHE.put(key, pdf)
 
     return StreamingResponse(
         iter([pdf]),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=NeuroMate_Report_{session_id}.pdf"}
+        headers={
+            "Content-Disposition": f"attachment; filename=NeuroMate_Report_{session_id}.pdf",
+            **headers,
+        }
     )
+
+
+# cache misses rendered in the request thread (report jobs / exports render elsewhere)
+PDF_RENDER_SECONDS = Histogram((0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+    return etag in candidates
+
+
+@app.get("/report_cache_stats")
+def report_cache_stats():
+    return REPORT_CACHE.stats()
+
+
+# Only stored session data: no model call per report
+def report_args(session_id, sess):
+    probability = sess.probability
+    if probability is None:
+        # no model, recovered from the journal, or completed before probabilities were stored
+        probability = store_probability(session_id, sess)
+    return (
+        sess.user,
+        sess.final["ASD_result"],
+        0.0 if probability is None else probability,
+        {
+            "scores": session_scores(sess),
+            "per_category_labels": sess.final["per_category_labels"],
+            "total_yes": sess.final["total_yes"],
+            "guidance": sess.final["guidance"],
+            "demographics": session_demographics(sess),
+            "answers": session_answers(sess),
+        },
+    )
+
+# ================================
+# BACKGROUND PDF JOBS
+# ================================
+# Renders run in the worker that accepted the job; with REPORT_JOBS_DIR (the
+# default for the sqlite backend) any worker can report its status and PDF.
+@app.post("/report-jobs")
+def submit_report_job(data: Dict[str, Any]):
+    session_id = data.get("session_id")
+
+    sess = SESSIONS.get(session_id)
+    if sess is None:
+        raise HTTPException(400, "Invalid session id")
+
+    if not sess.complete:
+        raise HTTPException(400, "Screening not complete")
+
+    try:
+        job = REPORT_JOBS.submit(session_id, *report_args(session_id, sess))
+    except QueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "2"})
+
+    return JSONResponse({"job_id": job.job_id, "status": job.status}, status_code=202)
+
+
+def get_report_job(job_id):
+    job = REPORT_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown or expired job id")
+    return job
+
+
+@app.get("/report-jobs/{job_id}")
+def report_job_status(job_id: str):
+    job = get_report_job(job_id)
+    return {"job_id": job.job_id, "session_id": job.session_id, "status": job.status, "error": job.error}
+
+
+@app.get("/report-jobs/{job_id}/pdf")
+def report_job_pdf(job_id: str):
+    job = get_report_job(job_id)
+    status = job.status
+
+    if status == "failed":
+        raise HTTPException(500, f"Report rendering failed: {job.error}")
+    if status != "done":
+        return JSONResponse({"job_id": job.job_id, "status": status}, status_code=202)
+
+    try:
+        pdf = job.pdf()
+    except FileNotFoundError:  # expired between the status read and now
+        raise HTTPException(404, "Unknown or expired job id")
+
+    return Response(
+        pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=NeuroMate_Report_{job.session_id}.pdf"}
+    )
+
+
+@app.get("/report_jobs_stats")
+def report_jobs_stats():
+    return REPORT_JOBS.stats()
+
+# ================================
+# BULK EXPORT (streamed ZIP of many reports)
+# ================================
+# Body: {"session_ids": [...]} or {"completed_since": <unix timestamp>}
+# Renders count against REPORT_MAX_PENDING like report jobs: an export
+# reserves up to 2 × REPORT_WORKERS slots for as long as it streams, and is
+# refused with 429 when none is free.
+@app.post("/export-reports")
+def export_reports(data: Dict[str, Any]):
+    session_ids = data.get("session_ids")
+    since = data.get("completed_since")
+
+    if session_ids is None and since is None:
+        raise HTTPException(400, "Provide session_ids or completed_since")
+
+    if session_ids is None:
+        try:
+            since = float(since)
+        except (TypeError, ValueError):
+            since = math.nan
+        if isinstance(data["completed_since"], bool) or not math.isfinite(since):
+            raise HTTPException(422, "completed_since must be a unix timestamp")
+        session_ids = SESSIONS.completed_since(since)
+    elif not isinstance(session_ids, list):
+        raise HTTPException(400, "session_ids must be a list")
+
+    try:
+        window = REPORT_JOBS.reserve(2 * REPORT_JOBS.workers)
+    except QueueFull as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "2"})
+
+    def items():
+        for session_id in session_ids:
+            name = f"NeuroMate_Report_{session_id}"
+            sess = SESSIONS.get(session_id)
+            if sess is None or not sess.complete:
+                yield name, None, None
+                continue
+            args = report_args(session_id, sess)
+            yield name, report_key(*args), args
+
+    def stream():
+        try:
+            yield from iter_zip(render_in_order(items(), REPORT_JOBS.executor(), REPORT_CACHE, window))
+        finally:
+            release()
+
+    # the finalizer also frees the slots if the client leaves before the
+    # stream starts (an unstarted generator never runs its finally)
+    body = stream()
+    release = weakref.finalize(body, REPORT_JOBS.release, window)
+
+    return StreamingResponse(
+        body,
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=NeuroMate_Reports.zip"}
+    )
+
+
+# ================================
+# PROMETHEUS METRICS
+# ================================
+# Values are per worker process; Prometheus should scrape each worker
+# (or run one worker per scrape target).
+@app.get("/metrics")
+def metrics():
+    out = PrometheusText()
+    REQUEST_METRICS.collect(out, "neuromate_http")
+
+    sessions = SESSIONS.stats()
+    out.family("neuromate_sessions_live", "gauge", "Sessions currently held by the session store")
+    out.sample("neuromate_sessions_live", sessions["size"], {"backend": sessions["backend"]})
+    out.family("neuromate_sessions_completed", "gauge", "Live sessions that finished the screening")
+    out.sample("neuromate_sessions_completed", sessions["completed"], {"backend": sessions["backend"]})
+    out.family("neuromate_sessions_created_total", "counter", "Sessions started by this process")
+    out.sample("neuromate_sessions_created_total", sessions["created"])
+
+    out.family("neuromate_ws_connections", "gauge", "Open /ws/screening connections")
+    out.sample("neuromate_ws_connections", WS_STATS["open"])
+    out.family("neuromate_ws_answers_total", "counter", "Answers applied over /ws/screening")
+    out.sample("neuromate_ws_answers_total", WS_STATS["answers"])
+
+    out.family("neuromate_pdf_render_seconds", "histogram", "PDF renders on /generate-report-session cache misses")
+    out.histogram("neuromate_pdf_render_seconds", PDF_RENDER_SECONDS)
+    cache = REPORT_CACHE.stats()
+    out.family("neuromate_report_cache_hits_total", "counter", "Report cache hits")
+    out.sample("neuromate_report_cache_hits_total", cache["hits"])
+    out.family("neuromate_report_cache_misses_total", "counter", "Report cache misses")
+    out.sample("neuromate_report_cache_misses_total", cache["misses"])
+
+    model = artifacts
+    out.family("neuromate_model_info", "gauge", "Active model bundle version")
+    out.sample("neuromate_model_info", 1, {"version": model["version"]})
+    out.family("neuromate_model_load_seconds", "gauge", "Time to load the active model bundle")
+    out.sample("neuromate_model_load_seconds", MODEL_STATS["load_seconds"])
+    out.family("neuromate_model_reloads_total", "counter", "Successful model reloads")
+    out.sample("neuromate_model_reloads_total", MODEL_STATS["reloads"])
+    out.family("neuromate_model_reload_failures_total", "counter", "Rejected model reloads")
+    out.sample("neuromate_model_reload_failures_total", MODEL_STATS["reload_failures"])
+
+    out.family("neuromate_predict_batch_size", "histogram", "Rows per coalesced /predict_risk model call")
+    out.histogram("neuromate_predict_batch_size", PREDICT_BATCHER.batch_size)
+    out.family("neuromate_predict_queue_wait_ms", "histogram", "Time a /predict_risk row waited for its batch")
+    out.histogram("neuromate_predict_queue_wait_ms", PREDICT_BATCHER.queue_wait_ms)
+
+    return Response(out.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ================================
+# REQUEST PROFILING (opt-in, see profiling.py)
+# ================================
+# PROFILING=1 lets admins profile single requests (headers X-Profile:
+# cprofile|sample and X-Admin-Token); PROFILE_SAMPLE_RATE > 0 also profiles
+# that share of all requests. Otherwise nothing is installed.
+PROFILING_ENABLED = os.getenv("PROFILING", "0") == "1" or PROFILE_SAMPLE_RATE > 0
+PROFILES = ProfileStore()
+
+
+@app.get("/admin/profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {
+        "enabled": PROFILING_ENABLED,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "directory": PROFILES.directory,
+        "keep": PROFILES.keep,
+        "profiles": PROFILES.list(),
+    }
+
+
+# format: text (pstats summary) | pstats (raw .prof) | folded (collapsed stacks)
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "text", x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+
+    if format == "text":
+        text = PROFILES.pstats_text(profile_id)
+        if text is not None:
+            return Response(text, media_type="text/plain; charset=utf-8")
+        format = "folded"
+
+    ext = {"pstats": "prof", "folded": "folded"}.get(format)
+    if ext is None:
+        raise HTTPException(400, "format must be text, pstats or folded")
+
+    path = PROFILES.path(profile_id, ext)
+    if path is None:
+        raise HTTPException(404, f"No {format} profile {profile_id}")
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if ext == "folded":
+        return Response(data, media_type="text/plain; charset=utf-8")
+    return Response(data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.prof"})
+
+
+if PROFILING_ENABLED:
+    instrument_routes(app)
+    app.add_middleware(ProfilingMiddleware, store=PROFILES, admin_token=ADMIN_TOKEN)
@@ -0,0 +1,159 @@
+# metrics.py — Lightweight in-process metric types
+import bisect
+import threading
+import time
+
+
+# -----------------------------
+# HISTOGRAM (fixed upper bounds, Prometheus-style "le" buckets)
+# -----------------------------
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, c in zip(self.bounds + ("+Inf",), self.counts):
+                running += c
+                cumulative[str(bound)] = running
+            return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+    def prometheus(self, name, labels=None):
+        snap = self.snapshot()
+        lines = [
+            f"{name}_bucket{format_labels(labels, le=le)} {count}"
+            for le, count in snap["buckets"].items()
+        ]
+        lines.append(f"{name}_sum{format_labels(labels)} {snap['sum']!r}")
+        lines.append(f"{name}_count{format_labels(labels)} {snap['count']}")
+        return lines
+
+
+# -----------------------------
+# PROMETHEUS TEXT FORMAT
+# -----------------------------
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels=None, **extra):
+    items = {**(labels or {}), **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in items.items()) + "}"
+
+
+# Builds one exposition document: header once per family, then its samples
+class PrometheusText:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, labels=None):
+        self.lines.append(f"{name}{format_labels(labels)} {value!r}")
+
+    def histogram(self, name, hist, labels=None):
+        self.lines.extend(hist.prometheus(name, labels))
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+# -----------------------------
+# PER-ROUTE REQUEST METRICS (pure ASGI middleware)
+# -----------------------------
+# Seconds, Prometheus convention
+LATENCY_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RouteStats:
+    __slots__ = ("statuses", "errors", "latency")
+
+    def __init__(self):
+        self.statuses = {}
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BOUNDS)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.routes = {}  # (method, route template) → RouteStats
+
+    def observe(self, method, route, status, seconds):
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes.setdefault(key, RouteStats())
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if status >= 500:
+            stats.errors += 1
+        stats.latency.observe(seconds)
+
+    def collect(self, out, prefix):
+        routes = sorted(self.routes.items())
+
+        out.family(f"{prefix}_requests_total", "counter", "HTTP requests by route and status")
+        for (method, route), stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                out.sample(f"{prefix}_requests_total", count,
+                           {"method": method, "route": route, "status": status})
+
+        out.family(f"{prefix}_request_errors_total", "counter",
+                   "HTTP requests that failed with a 5xx status or an unhandled exception")
+        for (method, route), stats in routes:
+            out.sample(f"{prefix}_request_errors_total", stats.errors, {"method": method, "route": route})
+
+        out.family(f"{prefix}_request_duration_seconds", "histogram",
+                   "Time from request start until the response body was sent")
+        for (method, route), stats in routes:
+            out.histogram(f"{prefix}_request_duration_seconds", stats.latency,
+                          {"method": method, "route": route})
+
+
+# Labels requests with the matched route's path template ("/report-jobs/{job_id}"),
+# so label values stay bounded; unmatched paths share one label.
+class MetricsMiddleware:
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            self.metrics.observe(
+                scope["method"],
+                getattr(scope.get("route"), "path", "unmatched"),
+                status,
+                time.perf_counter() - started,
+            )
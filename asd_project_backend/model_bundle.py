@@ -0,0 +1,300 @@
+# model_bundle.py — One versioned, memory-mappable model bundle
+#
+# Layout of a bundle directory:
+#   manifest.json           format, schema, version, feature order, array index
+#   preprocess.*.npy        imputer statistics, scaler mean / scale
+#   encoder.<column>.npy    encoder vocabulary (code = position)
+#   forest.*.npy            FlatForest node arrays
+#
+# Every array is a plain .npy file loaded with mmap_mode="r": startup only
+# maps the files, and workers forked after loading share the same pages.
+# Loading checks every array against the manifest's sha256 (one pass over
+# ~2 MB), so a partly copied or edited bundle is rejected before it serves.
+#
+# Export the pickles written by a training script into a bundle:
+#   python model_bundle.py saved_models saved_models/bundle [best_model.pkl]
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+
+import numpy as np
+
+from forest_engine import FlatForest
+
+BUNDLE_FORMAT = "neuromate-model-bundle"
+BUNDLE_SCHEMA = 1
+MANIFEST = "manifest.json"
+
+FOREST_ARRAYS = ("feature", "threshold", "left", "right_delta", "is_leaf", "proba", "roots", "classes")
+
+
+class BundleError(Exception):
+    pass
+
+
+# Covers the feature order and every array (name and contents, sorted by name)
+def bundle_digest(feature_order, arrays):
+    digest = hashlib.sha256(json.dumps(list(feature_order)).encode())
+    for name, arr in sorted(arrays.items()):
+        digest.update(name.encode())
+        digest.update(arr.tobytes())
+    return digest
+
+
+# -----------------------------
+# WRITE
+# -----------------------------
+def _write_atomic(path, write):
+    # readers may still have the old file mapped: replace the inode, never truncate it
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_bundle(path, feature_order, encoders, forest,
+                imputer_statistics=None, scaler_mean=None, scaler_scale=None,
+                version=None, metadata=None):
+    os.makedirs(path, exist_ok=True)
+
+    arrays = {}
+    if imputer_statistics is not None:
+        arrays["preprocess.imputer_statistics"] = np.asarray(imputer_statistics, dtype=np.float64)
+    if scaler_mean is not None:
+        arrays["preprocess.scaler_mean"] = np.asarray(scaler_mean, dtype=np.float64)
+    if scaler_scale is not None:
+        arrays["preprocess.scaler_scale"] = np.asarray(scaler_scale, dtype=np.float64)
+    for col, classes in encoders.items():
+        arrays[f"encoder.{col}"] = np.asarray([str(c) for c in classes], dtype=str)
+    for name in FOREST_ARRAYS:
+        arrays[f"forest.{name}"] = np.ascontiguousarray(getattr(forest, name))
+
+    digest = bundle_digest(feature_order, arrays)
+    index = {}
+    for name, arr in sorted(arrays.items()):
+        index[name] = {"file": f"{name}.npy", "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        _write_atomic(os.path.join(path, f"{name}.npy"), lambda f, a=arr: np.save(f, a))
+
+    if version is None:
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{digest.hexdigest()[:8]}"
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "schema": BUNDLE_SCHEMA,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sha256": digest.hexdigest(),
+        "feature_order": list(feature_order),
+        "encoders": list(encoders),
+        "forest": {
+            "n_trees": forest.n_trees,
+            "n_nodes": forest.n_nodes,
+            "max_depth": forest.max_depth,
+        },
+        "arrays": index,
+        "metadata": metadata or {},
+    }
+
+    # the manifest goes last: a bundle without one is never loaded
+    _write_atomic(
+        os.path.join(path, MANIFEST),
+        lambda f: f.write(json.dumps(manifest, indent=2).encode()),
+    )
+    return manifest
+
+
+def export_bundle(path, model, feature_order, encoders, imputer=None, scaler=None,
+                  version=None, metadata=None):
+    # sklearn objects from a training run → bundle
+    if not hasattr(model, "estimators_"):
+        raise BundleError(f"only random forests can be bundled, got {type(model).__name__}")
+
+    return save_bundle(
+        path,
+        feature_order=feature_order,
+        encoders={col: enc.classes_ for col, enc in encoders.items()},
+        forest=FlatForest.from_sklearn(model),
+        imputer_statistics=None if imputer is None else imputer.statistics_,
+        scaler_mean=scaler.mean_ if scaler is not None and scaler.with_mean else None,
+        scaler_scale=scaler.scale_ if scaler is not None and scaler.with_std else None,
+        version=version,
+        metadata=metadata,
+    )
+
+
+# -----------------------------
+# LOAD + VALIDATE
+# -----------------------------
+def _read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"no model bundle at {path} ({MANIFEST} missing)") from None
+    except ValueError as e:
+        raise BundleError(f"{manifest_path}: invalid JSON ({e})") from None
+
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{manifest_path}: not a model bundle")
+    if manifest.get("schema") != BUNDLE_SCHEMA:
+        raise BundleError(
+            f"{manifest_path}: schema {manifest.get('schema')} is not supported "
+            f"(expected {BUNDLE_SCHEMA})"
+        )
+
+    # fields load_bundle reads directly: an older or partial manifest fails here, not with a KeyError
+    forest = manifest.get("forest")
+    arrays = manifest.get("arrays")
+    _check(isinstance(manifest.get("version"), str), f"{manifest_path}: version missing")
+    _check(
+        isinstance(forest, dict) and isinstance(forest.get("max_depth"), int),
+        f"{manifest_path}: forest.max_depth missing",
+    )
+    _check(
+        isinstance(arrays, dict) and all(
+            isinstance(e, dict) and {"file", "dtype", "shape"} <= e.keys() for e in arrays.values()
+        ),
+        f"{manifest_path}: every array entry needs file, dtype and shape",
+    )
+    return manifest
+
+
+def _load_array(path, name, entry, mmap):
+    file_path = os.path.join(path, entry["file"])
+    try:
+        arr = np.load(file_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"{file_path}: {e}") from None
+
+    if arr.dtype.str != entry["dtype"] or list(arr.shape) != entry["shape"]:
+        raise BundleError(
+            f"{file_path}: expected {entry['dtype']} {entry['shape']}, "
+            f"found {arr.dtype.str} {list(arr.shape)}"
+        )
+    # plain ndarray view of the mapping: no np.memmap overhead on every np.take
+    return np.asarray(arr)
+
+
+def _check(condition, message):
+    if not condition:
+        raise BundleError(message)
+
+
+def load_bundle(path, mmap=True, verify=True):
+    manifest = _read_manifest(path)
+    index = manifest["arrays"]
+    arrays = {name: _load_array(path, name, entry, mmap) for name, entry in index.items()}
+
+    feature_order = manifest.get("feature_order")
+    _check(
+        isinstance(feature_order, list) and feature_order
+        and all(isinstance(c, str) for c in feature_order)
+        and len(set(feature_order)) == len(feature_order),
+        f"{path}: feature_order must be a non-empty list of unique names",
+    )
+    n_features = len(feature_order)
+
+    if verify:
+        found = bundle_digest(feature_order, arrays).hexdigest()
+        _check(
+            found == manifest.get("sha256"),
+            f"{path}: contents do not match the manifest (sha256 {found[:12]}, "
+            f"manifest {str(manifest.get('sha256'))[:12]})",
+        )
+
+    for name in ("imputer_statistics", "scaler_mean", "scaler_scale"):
+        arr = arrays.get(f"preprocess.{name}")
+        _check(
+            arr is None or arr.shape == (n_features,),
+            f"{path}: {name} has shape {None if arr is None else arr.shape}, "
+            f"feature_order has {n_features} columns",
+        )
+
+    encoder_tables = {}
+    for col in manifest.get("encoders", []):
+        _check(col in feature_order, f"{path}: encoder for unknown feature {col!r}")
+        classes = arrays.get(f"encoder.{col}")
+        _check(classes is not None, f"{path}: vocabulary for encoder {col!r} missing")
+        encoder_tables[col] = [str(c) for c in classes]
+
+    missing = [n for n in FOREST_ARRAYS if f"forest.{n}" not in arrays]
+    _check(not missing, f"{path}: forest arrays missing: {missing}")
+    forest = FlatForest.from_arrays({
+        **{n: arrays[f"forest.{n}"] for n in FOREST_ARRAYS},
+        "max_depth": manifest["forest"]["max_depth"],
+    })
+
+    n_nodes = forest.n_nodes
+    _check(
+        all(len(getattr(forest, n)) == n_nodes
+            for n in ("threshold", "left", "right_delta", "is_leaf", "proba")),
+        f"{path}: forest node arrays have different lengths",
+    )
+    _check(forest.proba.shape[1] == len(forest.classes), f"{path}: proba / classes mismatch")
+    _check(1 in list(forest.classes), f"{path}: forest has no positive class (1)")
+    _check(
+        forest.feature.min() >= 0 and forest.feature.max() < n_features,
+        f"{path}: forest splits on a feature outside feature_order",
+    )
+    right = forest.left + forest.right_delta
+    _check(
+        forest.left.min() >= 0 and right.max() < n_nodes
+        and forest.roots.min() >= 0 and forest.roots.max() < n_nodes,
+        f"{path}: forest child / root ids out of range",
+    )
+
+    return {
+        "version": manifest["version"],
+        "path": path,
+        "manifest": manifest,
+        "feature_order": feature_order,
+        "encoder_classes": encoder_tables,
+        "imputer_statistics": arrays.get("preprocess.imputer_statistics"),
+        "scaler_mean": arrays.get("preprocess.scaler_mean"),
+        "scaler_scale": arrays.get("preprocess.scaler_scale"),
+        "forest": forest,
+    }
+
+
+# -----------------------------
+# CLI: pickles → bundle
+# -----------------------------
+def main(argv):
+    if len(argv) < 2:
+        print("usage: python model_bundle.py PICKLE_DIR BUNDLE_DIR [MODEL_FILE]")
+        return 2
+
+    pickle_dir, bundle_dir = argv[0], argv[1]
+    model_file = argv[2] if len(argv) > 2 else "best_model.pkl"
+
+    def load(name, required=True):
+        try:
+            with open(os.path.join(pickle_dir, name), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            if required:
+                raise
+            return None
+
+    manifest = export_bundle(
+        bundle_dir,
+        model=load(model_file),
+        feature_order=load("feature_order.pkl"),
+        encoders=load("encoders.pkl", required=False) or {},
+        imputer=load("imputer.pkl", required=False),
+        scaler=load("scaler.pkl", required=False),
+        metadata={"source": model_file},
+    )
+    load_bundle(bundle_dir)
+    print(f"bundle {manifest['version']} written to {bundle_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,210 @@
+# model_selection.py — Cross-validated search over recipes, forest size and depth
+#
+#   python model_selection.py [--recipes optionB adaptive] [--n-estimators 50 100 250]
+#                             [--max-depth 6 12 none] [--folds 5] [--workers N]
+#                             [--search grid|random --n-iter 10] [--json results.json]
+#
+# Each recipe's encoded matrix comes from the train_pipeline cache and its
+# stratified fold indices are computed once; both are handed to the worker
+# processes once (fork initializer), and every (candidate, fold) fit runs
+# as its own task. Inference latency is measured afterwards, one candidate
+# at a time in this process, on the flat forest the API serves, so the
+# numbers are not skewed by the fits running in parallel.
+#
+# Scaling/imputation are fitted on the whole recipe matrix (as in training);
+# the scaler cannot change a forest's splits, and the imputer only fills a
+# handful of missing values, so the fold scores are not meaningfully leaked.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+
+from forest_engine import FlatForest
+from train_pipeline import DEFAULT_CACHE_DIR, DEFAULT_DATA, RANDOM_STATE, RECIPES, load_or_preprocess
+
+LATENCY_CALLS = 300
+LATENCY_BATCH = 256
+
+
+# -----------------------------
+# WORKER SIDE
+# -----------------------------
+_SHARED = {}
+
+
+def _init_worker(shared):
+    global _SHARED
+    _SHARED = shared
+
+
+def _fit_fold(recipe, n_estimators, max_depth, fold, keep_forest):
+    X, y, folds = _SHARED[recipe]
+    train_idx, test_idx = folds[fold]
+
+    started = time.perf_counter()
+    model = RandomForestClassifier(
+        n_estimators=n_estimators, max_depth=max_depth, random_state=RANDOM_STATE, n_jobs=1
+    )
+    model.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - started
+
+    proba = model.predict_proba(X[test_idx])[:, list(model.classes_).index(1)]
+    forest = FlatForest.from_sklearn(model)
+    return {
+        "accuracy": float(model.score(X[test_idx], y[test_idx])),
+        "roc_auc": float(roc_auc_score(y[test_idx], proba)),
+        "fit_seconds": fit_seconds,
+        "n_nodes": forest.n_nodes,
+        "nbytes": forest.nbytes,
+        "forest": forest.to_arrays() if keep_forest else None,
+    }
+
+
+# -----------------------------
+# LATENCY (main process, sequential)
+# -----------------------------
+def measure_latency(forest, X):
+    rows = [X[i % len(X)][np.newaxis, :] for i in range(LATENCY_CALLS)]
+    forest.predict_proba(rows[0])  # warm-up
+
+    times = []
+    for row in rows:
+        t0 = time.perf_counter()
+        forest.predict_proba(row)
+        times.append((time.perf_counter() - t0) * 1000)
+
+    batch = X[np.arange(LATENCY_BATCH) % len(X)]
+    t0 = time.perf_counter()
+    forest.predict_proba(batch)
+    batch_us = (time.perf_counter() - t0) / LATENCY_BATCH * 1e6
+
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99)), batch_us
+
+
+# -----------------------------
+# SEARCH
+# -----------------------------
+def candidates(args):
+    grid = list(itertools.product(args.recipes, args.n_estimators, args.max_depth))
+    if args.search == "random" and args.n_iter < len(grid):
+        grid = random.Random(RANDOM_STATE).sample(grid, args.n_iter)
+    return grid
+
+
+# candidates no other candidate beats on both ROC-AUC and single-row p50 latency
+def pareto_front(results):
+    front = set()
+    for i, r in enumerate(results):
+        dominated = any(
+            o["roc_auc"] >= r["roc_auc"] and o["latency_p50_ms"] <= r["latency_p50_ms"]
+            and (o["roc_auc"] > r["roc_auc"] or o["latency_p50_ms"] < r["latency_p50_ms"])
+            for o in results
+        )
+        if not dominated:
+            front.add(i)
+    return front
+
+
+def parse_depth(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Cross-validated forest model selection")
+    parser.add_argument("--recipes", nargs="+", default=["optionB"], choices=sorted(RECIPES))
+    parser.add_argument("--n-estimators", nargs="+", type=int, default=[50, 100, 250])
+    parser.add_argument("--max-depth", nargs="+", type=parse_depth, default=[6, 12, None])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--search", choices=("grid", "random"), default="grid")
+    parser.add_argument("--n-iter", type=int, default=10, help="candidates sampled by --search random")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    grid = candidates(args)
+
+    # encoded matrices + fold indices: computed once per recipe, shared by all tasks
+    shared = {}
+    for recipe in sorted({c[0] for c in grid}):
+        arrays, _, _ = load_or_preprocess(args.data, recipe, args.cache_dir)
+        X, y = arrays["X"], arrays["y"]
+        splitter = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=RANDOM_STATE)
+        shared[recipe] = (X, y, list(splitter.split(X, y)))
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(shared,),
+    ) as pool:
+        futures = {
+            (c, fold): pool.submit(_fit_fold, *c, fold, fold == 0)
+            for c in grid
+            for fold in range(args.folds)
+        }
+        folds = {key: f.result() for key, f in futures.items()}
+    search_seconds = time.perf_counter() - started
+
+    results = []
+    for c in grid:
+        recipe, n_estimators, max_depth = c
+        per_fold = [folds[(c, fold)] for fold in range(args.folds)]
+        forest = FlatForest.from_arrays(per_fold[0]["forest"])
+        p50, p99, batch_us = measure_latency(forest, shared[recipe][0])
+        results.append({
+            "recipe": recipe,
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "accuracy": float(np.mean([f["accuracy"] for f in per_fold])),
+            "accuracy_std": float(np.std([f["accuracy"] for f in per_fold])),
+            "roc_auc": float(np.mean([f["roc_auc"] for f in per_fold])),
+            "roc_auc_std": float(np.std([f["roc_auc"] for f in per_fold])),
+            "n_nodes": int(np.mean([f["n_nodes"] for f in per_fold])),
+            "model_mb": float(np.mean([f["nbytes"] for f in per_fold])) / 1e6,
+            "fit_seconds": float(np.mean([f["fit_seconds"] for f in per_fold])),
+            "latency_p50_ms": p50,
+            "latency_p99_ms": p99,
+            "batch_us_per_row": batch_us,
+        })
+
+    front = pareto_front(results)
+    for i, r in enumerate(results):
+        r["pareto"] = i in front
+    results.sort(key=lambda r: (-r["roc_auc"], r["latency_p50_ms"]))
+
+    print(f"{len(grid)} candidates × {args.folds} folds in {search_seconds:.1f} s ({args.workers} workers)\n")
+    print(f"{'recipe':<10} {'trees':>5} {'depth':>5} {'accuracy':>15} {'roc_auc':>15} "
+          f"{'nodes':>7} {'MB':>6} {'p50 ms':>7} {'p99 ms':>7} {'µs/row':>7}")
+    for r in results:
+        depth = "-" if r["max_depth"] is None else r["max_depth"]
+        print(f"{r['recipe']:<10} {r['n_estimators']:>5} {depth:>5} "
+              f"{r['accuracy']:.4f} ± {r['accuracy_std']:.4f} {r['roc_auc']:.4f} ± {r['roc_auc_std']:.4f} "
+              f"{r['n_nodes']:>7} {r['model_mb']:>6.2f} {r['latency_p50_ms']:>7.3f} "
+              f"{r['latency_p99_ms']:>7.3f} {r['batch_us_per_row']:>7.1f}"
+              f"{'  *' if r['pareto'] else ''}")
+    print("\n* = on the ROC-AUC / latency frontier")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"folds": args.folds, "search_seconds": search_seconds, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
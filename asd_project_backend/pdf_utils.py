@@ -6,11 +6,169 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 import io
+import copy
 import datetime
+import threading
+
+
+# ==============================
+# REPORT TEMPLATE (built once, shared by every report)
+# ==============================
+# Styles, table styling and every paragraph that does not depend on the
+# session are created here. Reports get shallow copies of the static
+# flowables: the parsed text is shared, layout state (wrap/split) is not,
+# so concurrent renders never step on each other.
+class ReportTemplate:
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        # ============ STYLES ===============
+        self.title_style = ParagraphStyle(
+            "Title",
+            parent=styles["Heading1"],
+            fontSize=22,
+            alignment=1,  # center
+            textColor=colors.HexColor("#0F3B75"),
+            spaceAfter=10,
+        )
+
+        self.subtitle_style = ParagraphStyle(
+            "Subtitle",
+            parent=styles["Heading2"],
+            fontSize=13,
+            alignment=1,  # center
+            textColor=colors.HexColor("#475569"),
+            spaceAfter=20,
+        )
+
+        self.header_style = ParagraphStyle(
+            "Header",
+            parent=styles["Heading3"],
+            fontSize=14,
+            textColor=colors.HexColor("#0F3B75"),
+            spaceBefore=16,
+            spaceAfter=10,
+        )
+
+        self.normal_style = ParagraphStyle(
+            "Normal",
+            parent=styles["Normal"],
+            fontSize=11,
+            leading=16,
+            textColor=colors.HexColor("#1E293B")
+        )
+
+        self.bold_style = ParagraphStyle(
+            "Bold",
+            parent=styles["Normal"],
+            fontSize=11,
+            leading=16,
+            textColor=colors.HexColor("#1E293B"),
+            spaceAfter=2,
+        )
+
+        self.table_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#E2E8F0")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#1E293B")),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+            ("FONTSIZE", (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+            ("GRID", (0, 0), (-1, -1), 0.7, colors.HexColor("#CBD5E1")),
+            ("BACKGROUND", (0, 1), (-1, -1), colors.white),
+        ])
+
+        # Clean one-to-one mapping
+        self.demographic_mapping = {
+            "your name": "Name",
+            "how old": "Age",
+            "gender": "Gender",
+            "country": "Country",
+            "ethnicity": "Ethnicity",
+            "relation": "Relation",
+            "jaundice": "Has Jaundice",
+            "asd": "Used ASD Screening Before",  # <— one word catch-all
+        }
+
+        suggestion_map = {
+            "No ASD": [
+                "No significant indicators detected.",
+                "Continue normal social development.",
+                "Re-evaluate if future symptoms appear."
+            ],
+            "At Risk": [
+                "Mild ASD indicators detected.",
+                "Encourage communication-based play.",
+                "Monitor behaviour over 3–6 months."
+            ],
+            "Probable ASD": [
+                "Moderate ASD indicators detected.",
+                "Seek developmental specialist consultation.",
+                "Initiate early intervention activities."
+            ],
+            "Likely ASD": [
+                "Strong ASD indicators detected.",
+                "Immediate professional evaluation recommended.",
+                "Begin structured intervention programs.",
+            ]
+        }
+
+        # ============ STATIC FLOWABLES ===============
+        self.title = [
+            Paragraph("NEUROMATE AUTISM SCREENING REPORT", self.title_style),
+            Paragraph("AI-Assisted Developmental Assessment", self.subtitle_style),
+        ]
+
+        self.headers = {
+            name: Paragraph(name, self.header_style)
+            for name in (
+                "Patient Information",
+                "Screening Summary",
+                "Category-Wise Breakdown",
+                "Recommended Next Steps",
+            )
+        }
+
+        self.no_categories = Paragraph("No category insights available.", self.normal_style)
+
+        self.suggestions = {
+            label: [Paragraph(f"• {bullet}", self.normal_style) for bullet in bullets]
+            for label, bullets in suggestion_map.items()
+        }
+        self.no_suggestions = [Paragraph("• No recommendations available.", self.normal_style)]
+
+        self.footer = [
+            Paragraph(
+                "<i>This document is an automated screening summary and not a medical diagnosis.</i>",
+                self.normal_style,
+            ),
+            Paragraph(
+                "<b>Generated by NeuroMate — Adaptive AI Autism Screening Assistant</b>",
+                self.normal_style,
+            ),
+        ]
+
+    def header(self, name):
+        return copy.copy(self.headers[name])
+
+
+_TEMPLATE = None
+_TEMPLATE_LOCK = threading.Lock()
+
+
+def get_report_template():
+    global _TEMPLATE
+    if _TEMPLATE is None:
+        with _TEMPLATE_LOCK:
+            if _TEMPLATE is None:
+                _TEMPLATE = ReportTemplate()
+    return _TEMPLATE
 
 
 def make_pdf_bytes(user, label, probability, extra=None):
     buffer = io.BytesIO()
+    t = get_report_template()
+    normal_style = t.normal_style
 
     doc = SimpleDocTemplate(
         buffer,
@@ -21,60 +179,12 @@ def make_pdf_bytes(user, label, probability, extra=None):
         bottomMargin=55,
     )
 
-    styles = getSampleStyleSheet()
-
-    # ============ STYLES ===============
-    title_style = ParagraphStyle(
-        "Title",
-        parent=styles["Heading1"],
-        fontSize=22,
-        alignment=1,  # center
-        textColor=colors.HexColor("#0F3B75"),
-        spaceAfter=10,
-    )
-
-    subtitle_style = ParagraphStyle(
-        "Subtitle",
-        parent=styles["Heading2"],
-        fontSize=13,
-        alignment=1,  # center
-        textColor=colors.HexColor("#475569"),
-        spaceAfter=20,
-    )
-
-    header_style = ParagraphStyle(
-        "Header",
-        parent=styles["Heading3"],
-        fontSize=14,
-        textColor=colors.HexColor("#0F3B75"),
-        spaceBefore=16,
-        spaceAfter=10,
-    )
-
-    normal_style = ParagraphStyle(
-        "Normal",
-        parent=styles["Normal"],
-        fontSize=11,
-        leading=16,
-        textColor=colors.HexColor("#1E293B")
-    )
-
-    bold_style = ParagraphStyle(
-        "Bold",
-        parent=styles["Normal"],
-        fontSize=11,
-        leading=16,
-        textColor=colors.HexColor("#1E293B"),
-        spaceAfter=2,
-    )
-
     flow = []
 
     # ==============================
     # HEADER (CENTERED)
     # ==============================
-    flow.append(Paragraph("NEUROMATE AUTISM SCREENING REPORT", title_style))
-    flow.append(Paragraph("AI-Assisted Developmental Assessment", subtitle_style))
+    flow.extend(copy.copy(p) for p in t.title)
 
     flow.append(Paragraph(
         f"Report Generated: {datetime.datetime.now().strftime('%d %B %Y, %I:%M %p')}",
@@ -84,25 +194,13 @@ def make_pdf_bytes(user, label, probability, extra=None):
     # ==============================
     # DEMOGRAPHICS SECTION (FIXED MAPPING — NO DUPLICATES)
     # ==============================
-    flow.append (Paragraph ("Patient Information", header_style))
+    flow.append(t.header("Patient Information"))
 
     demographics = extra.get ("demographics", {}) if extra else {}
 
-    # Clean one-to-one mapping
-    mapping = {
-        "your name": "Name",
-        "how old": "Age",
-        "gender": "Gender",
-        "country": "Country",
-        "ethnicity": "Ethnicity",
-        "relation": "Relation",
-        "jaundice": "Has Jaundice",
-        "asd": "Used ASD Screening Before",  # <— one word catch-all
-    }
-
     used_keys = set ()  # prevent duplicate matches
 
-    for keyword, label_text in mapping.items ():
+    for keyword, label_text in t.demographic_mapping.items ():
         match = next (
             (q for q in demographics
              if keyword in q.lower () and q not in used_keys),
@@ -122,7 +220,7 @@ def make_pdf_bytes(user, label, probability, extra=None):
     # ==============================
     # SCREENING RESULT
     # ==============================
-    flow.append(Paragraph("Screening Summary", header_style))
+    flow.append(t.header("Screening Summary"))
     flow.append(Paragraph(f"<b>Assessment Outcome:</b> {label}", normal_style))
     flow.append(Paragraph(
         f"<b>Total 'Yes' Responses:</b> {extra.get('total_yes', 0)}",
@@ -138,7 +236,7 @@ def make_pdf_bytes(user, label, probability, extra=None):
     # ==============================
     # CATEGORY TABLE (Scores + Severity)
     # ==============================
-    flow.append(Paragraph("Category-Wise Breakdown", header_style))
+    flow.append(t.header("Category-Wise Breakdown"))
 
     scores = extra.get("scores", {})
     severity_labels = extra.get("per_category_labels", {})
@@ -159,67 +257,28 @@ def make_pdf_bytes(user, label, probability, extra=None):
             hAlign="LEFT",
         )
 
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#E2E8F0")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.HexColor("#1E293B")),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-            ("GRID", (0, 0), (-1, -1), 0.7, colors.HexColor("#CBD5E1")),
-            ("BACKGROUND", (0, 1), (-1, -1), colors.white),
-        ]))
+        table.setStyle(t.table_style)
 
         flow.append(table)
     else:
-        flow.append(Paragraph("No category insights available.", normal_style))
+        flow.append(copy.copy(t.no_categories))
 
     flow.append(Spacer(1, 20))
 
     # ==============================
     # RECOMMENDATIONS
     # ==============================
-    flow.append(Paragraph("Recommended Next Steps", header_style))
-
-    suggestion_map = {
-        "No ASD": [
-            "No significant indicators detected.",
-            "Continue normal social development.",
-            "Re-evaluate if future symptoms appear."
-        ],
-        "At Risk": [
-            "Mild ASD indicators detected.",
-            "Encourage communication-based play.",
-            "Monitor behaviour over 3–6 months."
-        ],
-        "Probable ASD": [
-            "Moderate ASD indicators detected.",
-            "Seek developmental specialist consultation.",
-            "Initiate early intervention activities."
-        ],
-        "Likely ASD": [
-            "Strong ASD indicators detected.",
-            "Immediate professional evaluation recommended.",
-            "Begin structured intervention programs.",
-        ]
-    }
+    flow.append(t.header("Recommended Next Steps"))
 
-    for bullet in suggestion_map.get(label, ["No recommendations available."]):
-        flow.append(Paragraph(f"• {bullet}", normal_style))
+    for bullet in t.suggestions.get(label, t.no_suggestions):
+        flow.append(copy.copy(bullet))
 
     flow.append(Spacer(1, 20))
 
     # ==============================
     # FOOTER NOTE
     # ==============================
-    flow.append(Paragraph(
-        "<i>This document is an automated screening summary and not a medical diagnosis.</i>",
-        normal_style,
-    ))
-    flow.append(Paragraph(
-        "<b>Generated by NeuroMate — Adaptive AI Autism Screening Assistant</b>",
-        normal_style,
-    ))
+    flow.extend(copy.copy(p) for p in t.footer)
 
     doc.build(flow)
     return buffer.getvalue()
@@ -0,0 +1,320 @@
+# profiling.py — Opt-in per-request profiling with flamegraph-ready output
+#
+# A request is profiled when it carries "X-Profile: cprofile|sample" together
+# with a valid X-Admin-Token, or when it is picked at PROFILE_SAMPLE_RATE.
+# Only the route handler is profiled, in the thread that runs it:
+#
+#   cprofile  deterministic cProfile      → <id>.prof (pstats, snakeviz / gprof2dot)
+#   sample    stack sampler thread, every → <id>.folded (collapsed stacks,
+#             PROFILE_INTERVAL_MS           flamegraph.pl / speedscope)
+#
+# Each profile also gets <id>.json (route, status, duration, mode). The newest
+# PROFILE_KEEP profiles are kept in PROFILE_DIR; older ones are deleted.
+#
+# With profiling disabled nothing is installed: no middleware, no wrappers.
+# When enabled, a request that is not profiled costs one header scan and one
+# ContextVar lookup. For async handlers the profile covers the event loop
+# thread while the handler runs (other tasks interleave in cprofile mode;
+# the sampler only counts samples where the handler is on the stack).
+import io
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import random
+import pstats
+import asyncio
+import cProfile
+import tempfile
+import threading
+import functools
+import contextvars
+from collections import Counter
+
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "neuromate-profiles"))
+DEFAULT_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+DEFAULT_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+DEFAULT_MODE = os.getenv("PROFILE_MODE", "sample")
+DEFAULT_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
+MODES = ("cprofile", "sample")
+PROFILE_ID = re.compile(r"^[0-9]+-[0-9]+$")
+
+_current = contextvars.ContextVar("profile_request", default=None)
+
+
+class ProfileRequest:
+    __slots__ = ("profile_id", "mode", "trigger", "interval", "profile", "stacks", "other_samples")
+
+    def __init__(self, mode, trigger, interval):
+        self.profile_id = f"{time.time_ns():020d}-{os.getpid()}"
+        self.mode = mode
+        self.trigger = trigger
+        self.interval = interval
+        self.profile = None  # cProfile.Profile
+        self.stacks = None  # Counter: "a;b;c" → samples
+        self.other_samples = 0
+
+
+# -----------------------------
+# STACK SAMPLER
+# -----------------------------
+def frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(";", ",").replace(" ", "_")
+
+
+# The sampler needs the GIL to look at the handler's stack, so while any
+# sampler runs the interpreter switches threads at least every interval
+# (default switch interval is 5 ms).
+_switch_lock = threading.Lock()
+_switch_state = {"active": 0, "saved": None}
+
+
+def _fast_switching(interval):
+    with _switch_lock:
+        if _switch_state["active"] == 0:
+            _switch_state["saved"] = sys.getswitchinterval()
+            sys.setswitchinterval(min(_switch_state["saved"], interval))
+        _switch_state["active"] += 1
+
+
+def _restore_switching():
+    with _switch_lock:
+        _switch_state["active"] -= 1
+        if _switch_state["active"] == 0:
+            sys.setswitchinterval(_switch_state["saved"])
+
+
+# Samples one thread's stack from a helper thread; stacks are cut at `base`
+# (the handler wrapper's frame) so they start at the handler.
+class StackSampler:
+    def __init__(self, thread_id, base, interval):
+        self.thread_id = thread_id
+        self.base = base
+        self.interval = interval
+        self.stacks = Counter()
+        self.other = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        _fast_switching(self.interval)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        _restore_switching()
+        return self.stacks, self.other
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame is not self.base:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if frame is None or not names:
+                self.other += 1  # handler suspended (await) or not on this thread's stack
+                continue
+            self.stacks[";".join(reversed(names))] += 1
+
+
+# -----------------------------
+# HANDLER WRAPPERS
+# -----------------------------
+def _start(request):
+    if request.mode == "cprofile":
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active (Python 3.12+ allows only one)
+            request.mode = "sample"
+        else:
+            request.profile = profile
+            return None
+    return StackSampler(threading.get_ident(), sys._getframe(1), request.interval).start()
+
+
+def _finish(request, sampler):
+    if sampler is None:
+        request.profile.disable()
+    else:
+        request.stacks, request.other_samples = sampler.stop()
+
+
+def wrap_handler(fn):
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def profiled(*args, **kwargs):
+            request = _current.get()
+            if request is None:
+                return await fn(*args, **kwargs)
+            sampler = _start(request)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _finish(request, sampler)
+    else:
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            request = _current.get()
+            if request is None:
+                return fn(*args, **kwargs)
+            sampler = _start(request)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _finish(request, sampler)
+    return profiled
+
+
+# FastAPI calls route.dependant.call for every request; call after all routes are declared
+def instrument_routes(app):
+    from fastapi.routing import APIRoute
+
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.dependant.call is not None:
+            route.dependant.call = wrap_handler(route.dependant.call)
+
+
+# -----------------------------
+# RING BUFFER DIRECTORY
+# -----------------------------
+class ProfileStore:
+    def __init__(self, directory=DEFAULT_PROFILE_DIR, keep=DEFAULT_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def save(self, request, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, request.profile_id)
+        if request.profile is not None:
+            request.profile.dump_stats(base + ".prof")
+            meta["files"] = ["prof"]
+        else:
+            with open(base + ".folded", "w") as f:
+                for stack, count in request.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            meta["files"] = ["folded"]
+            meta["samples"] = sum(request.stacks.values())
+            meta["other_samples"] = request.other_samples
+
+        # meta last: a listed profile always has its data file
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self.prune()
+
+    def ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((n[:-5] for n in names if n.endswith(".json")), reverse=True)
+
+    def prune(self):
+        with self._lock:
+            for profile_id in self.ids()[self.keep:]:
+                for ext in (".json", ".prof", ".folded"):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        metas = []
+        for profile_id in self.ids():
+            try:
+                with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # pruned by another worker meanwhile
+        return metas
+
+    def path(self, profile_id, ext):
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{ext}")
+        return path if os.path.exists(path) else None
+
+    def pstats_text(self, profile_id, sort="cumulative", limit=60):
+        path = self.path(profile_id, "prof")
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+# -----------------------------
+# MIDDLEWARE (decides which requests are profiled)
+# -----------------------------
+class ProfilingMiddleware:
+    def __init__(self, app, store, admin_token=None, sample_rate=DEFAULT_SAMPLE_RATE,
+                 mode=DEFAULT_MODE, interval_ms=DEFAULT_INTERVAL_MS):
+        self.app = app
+        self.store = store
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval_ms / 1000.0
+
+    def _choose(self, scope):
+        if self.admin_token:
+            requested = token = None
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    requested = value.decode("latin-1").strip().lower()
+                elif name == b"x-admin-token":
+                    token = value.decode("latin-1")
+            if requested and token and hmac.compare_digest(token, self.admin_token):
+                return (requested if requested in MODES else self.mode), "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.mode, "sampled"
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode, trigger = self._choose(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        request = ProfileRequest(mode, trigger, self.interval)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message, headers=[
+                    *message.get("headers", []), (b"x-profile-id", request.profile_id.encode())
+                ])
+            await send(message)
+
+        token = _current.set(request)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if request.profile is not None or request.stacks is not None:
+                meta = {
+                    "id": request.profile_id,
+                    "method": scope["method"],
+                    "route": getattr(scope.get("route"), "path", scope["path"]),
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "mode": request.mode,
+                    "trigger": trigger,
+                    "created_at": time.time(),
+                }
+                await run_in_threadpool(self.store.save, request, meta)
@@ -0,0 +1,111 @@
+# questionnaire.py — Questionnaire compiled into a flat state-transition table
+import json
+
+YES_WORDS = frozenset({"yes", "y", "true", "often", "always", "frequently"})
+
+START_STATE = 0
+FINAL_STATE = -1
+
+# answer classes (column of the transition table)
+ANSWER_NO = 0
+ANSWER_YES = 1
+
+PARSERS = {"int": int, "str": None}
+
+
+# -----------------------------
+# COMPILED QUESTIONNAIRE
+# -----------------------------
+# Every question is a state id. Per state:
+#   texts[s], demo_keys[s] (None for category questions), parsers[s],
+#   category[s] (-1 for demographics)
+# Per (state, answer class) at index s * 2 + cls:
+#   next_state[t] (FINAL_STATE at the end), score_delta[t]
+class Questionnaire:
+    def __init__(self, categories, texts, demo_keys, parsers, category, next_state, score_delta):
+        self.categories = tuple(categories)
+        self.texts = tuple(texts)
+        self.demo_keys = tuple(demo_keys)
+        self.parsers = tuple(parsers)
+        self.category = tuple(category)
+        self.next_state = tuple(next_state)
+        self.score_delta = tuple(score_delta)
+        self.n_demographic = sum(1 for k in demo_keys if k is not None)
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def answer_class(ans_raw):
+    return ANSWER_YES if ans_raw in YES_WORDS else ANSWER_NO
+
+
+# -----------------------------
+# COMPILER
+# -----------------------------
+# demographics: [(key, question_text, type)] with type "int" or "str"
+# questions:    {category: [question_text, ...]} in asking order
+def compile_questionnaire(demographics, questions):
+    categories = [c for c, qs in questions.items() if qs]
+
+    texts, demo_keys, parsers, category = [], [], [], []
+
+    for key, text, kind in demographics:
+        texts.append(text)
+        demo_keys.append(key)
+        parsers.append(PARSERS[kind])
+        category.append(-1)
+
+    first_of_category = []
+    for cat_i, cat in enumerate(categories):
+        first_of_category.append(len(texts))
+        for text in questions[cat]:
+            texts.append(text)
+            demo_keys.append(None)
+            parsers.append(None)
+            category.append(cat_i)
+    first_of_category.append(FINAL_STATE)
+
+    next_state = [FINAL_STATE] * (2 * len(texts))
+    score_delta = [0] * (2 * len(texts))
+
+    # demographics: always advance, nothing scored
+    n_demo = len(demographics)
+    for s in range(n_demo):
+        nxt = s + 1 if s + 1 < len(texts) else FINAL_STATE
+        next_state[2 * s + ANSWER_NO] = nxt
+        next_state[2 * s + ANSWER_YES] = nxt
+
+    # categories: YES scores and advances; NO on the first question skips the category
+    for cat_i, cat in enumerate(categories):
+        first = first_of_category[cat_i]
+        after_category = first_of_category[cat_i + 1]
+        n = len(questions[cat])
+
+        for q_i in range(n):
+            s = first + q_i
+            nxt = s + 1 if q_i + 1 < n else after_category
+
+            next_state[2 * s + ANSWER_YES] = nxt
+            score_delta[2 * s + ANSWER_YES] = 1
+            next_state[2 * s + ANSWER_NO] = after_category if q_i == 0 else nxt
+
+    return Questionnaire(categories, texts, demo_keys, parsers, category, next_state, score_delta)
+
+
+# -----------------------------
+# LOAD FROM JSON
+# -----------------------------
+# {
+#   "demographics": [{"key": "age", "question": "How old are you?", "type": "int"}, ...],
+#   "categories": {"social": ["Do you ...?", ...], ...}
+# }
+def load_questionnaire(path):
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+
+    demographics = [
+        (d["key"], d["question"], d.get("type", "str"))
+        for d in spec.get("demographics", [])
+    ]
+    return compile_questionnaire(demographics, spec["categories"])
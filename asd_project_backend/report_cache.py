@@ -0,0 +1,151 @@
+# report_cache.py — Content-addressed LRU cache for rendered PDF reports
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_SPILL_DIR = os.getenv("REPORT_CACHE_SPILL_DIR") or None
+DEFAULT_SPILL_MAX_BYTES = int(os.getenv("REPORT_CACHE_SPILL_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+# -----------------------------
+# CACHE KEY
+# -----------------------------
+# Hash of everything that goes into the PDF (make_pdf_bytes arguments).
+# A completed session never changes, so its key doubles as the ETag.
+def report_key(user, label, probability, extra):
+    payload = json.dumps(
+        [user, label, probability, extra],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# SIZE-BOUNDED LRU (+ optional disk spill)
+# -----------------------------
+# Entries evicted from memory are written to spill_dir (if configured) and
+# promoted back on the next hit. The spill directory is bounded too, oldest
+# files are deleted first.
+class ReportCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=DEFAULT_SPILL_DIR,
+                 spill_max_bytes=DEFAULT_SPILL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._index_spill_dir()
+
+    def _index_spill_dir(self):
+        files = []
+        for name in os.listdir(self.spill_dir):
+            if name.endswith(".pdf"):
+                st = os.stat(os.path.join(self.spill_dir, name))
+                files.append((st.st_mtime, name[:-4], st.st_size))
+
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pdf")
+
+    def _spill(self, key, pdf):
+        if not self.spill_dir or len(pdf) > self.spill_max_bytes:
+            return
+
+        tmp = self._spill_path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, self._spill_path(key))
+
+        self._disk_bytes += len(pdf) - self._disk.pop(key, 0)
+        self._disk[key] = len(pdf)
+
+        while self._disk_bytes > self.spill_max_bytes:
+            old_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._spill_path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def _read_spill(self, key):
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+
+    def _store(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            self._spill(key, pdf)
+            return
+
+        self._mem_bytes += len(pdf) - len(self._mem.pop(key, b""))
+        self._mem[key] = pdf
+
+        while self._mem_bytes > self.max_bytes:
+            old_key, old_pdf = self._mem.popitem(last=False)
+            self._mem_bytes -= len(old_pdf)
+            self.evictions += 1
+            self._spill(old_key, old_pdf)
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._mem.get(key)
+            if pdf is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return pdf
+
+            pdf = self._read_spill(key)
+            if pdf is not None:
+                self.disk_hits += 1
+                self._store(key, pdf)
+                return pdf
+
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._mem or key in self._disk
+
+    def put(self, key, pdf):
+        with self._lock:
+            self._store(key, pdf)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+                "max_bytes": self.max_bytes,
+                "spill_entries": len(self._disk),
+                "spill_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,97 @@
+# report_export.py — Stream many PDF reports as one ZIP without buffering it
+import io
+import json
+import time
+import zipfile
+from collections import deque
+
+from pdf_utils import make_pdf_bytes
+
+
+# -----------------------------
+# WRITE-ONLY ZIP SINK
+# -----------------------------
+# zipfile detects that this stream cannot seek and writes data descriptors
+# after each member instead of patching headers, so every byte written can
+# be handed to the client immediately.
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# -----------------------------
+# PARALLEL RENDER, IN ORDER
+# -----------------------------
+# items: iterable of (name, cache_key, args) — args=None means "skip".
+# At most `window` renders are in flight, so memory is bounded by
+# window × report size no matter how many sessions are exported.
+def render_in_order(items, executor, cache, window):
+    in_flight = deque()
+
+    def next_ready():
+        name, key, pdf_or_future = in_flight.popleft()
+        if isinstance(pdf_or_future, bytes):
+            return name, pdf_or_future, None
+        try:
+            pdf = pdf_or_future.result()
+        except Exception as e:
+            return name, None, str(e)
+        cache.put(key, pdf)
+        return name, pdf, None
+
+    for name, key, args in items:
+        if args is None:
+            yield name, None, "not found or not complete"
+            continue
+
+        pdf = cache.get(key)
+        if pdf is not None:
+            in_flight.append((name, key, pdf))
+        else:
+            in_flight.append((name, key, executor.submit(make_pdf_bytes, *args)))
+
+        while len(in_flight) >= window:
+            yield next_ready()
+
+    while in_flight:
+        yield next_ready()
+
+
+def iter_zip(rendered):
+    sink = _ChunkSink()
+    exported, skipped = [], []
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for name, pdf, error in rendered:
+            if pdf is None:
+                skipped.append({"name": name, "error": error})
+                continue
+
+            info = zipfile.ZipInfo(f"{name}.pdf", date_time=time.localtime()[:6])
+            zf.writestr(info, pdf)
+            exported.append(name)
+            yield sink.drain()
+
+        zf.writestr(
+            "export_manifest.json",
+            json.dumps({"exported": exported, "skipped": skipped}, indent=2),
+        )
+
+    yield sink.drain()
@@ -0,0 +1,260 @@
+# report_jobs.py — Background PDF rendering in a bounded process pool
+import os
+import json
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_utils import make_pdf_bytes
+
+DEFAULT_WORKERS = int(os.getenv("REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_MAX_PENDING = int(os.getenv("REPORT_MAX_PENDING", "32"))
+DEFAULT_RESULT_TTL = float(os.getenv("REPORT_RESULT_TTL_SECONDS", "600"))
+DEFAULT_MAX_RESULTS = int(os.getenv("REPORT_MAX_RESULTS", "256"))
+DEFAULT_JOBS_DIR = os.getenv("REPORT_JOBS_DIR") or None
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ReportJob:
+    __slots__ = ("job_id", "session_id", "future", "submitted", "finished", "error")
+
+    def __init__(self, job_id, session_id, future):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.future = future
+        self.submitted = time.monotonic()
+        self.finished = None
+        self.error = None
+
+    @property
+    def status(self):
+        if self.finished is None:
+            return "running" if self.future.running() else "pending"
+        return "failed" if self.error else "done"
+
+    def pdf(self):
+        return self.future.result()
+
+
+# a job accepted by another worker, read back from the shared directory
+class StoredJob:
+    __slots__ = ("job_id", "session_id", "status", "error", "_path")
+
+    def __init__(self, job_id, session_id, status, error, path):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.status = status
+        self.error = error
+        self._path = path
+
+    def pdf(self):
+        with open(self._path, "rb") as f:
+            return f.read()
+
+
+# -----------------------------
+# JOB QUEUE
+# -----------------------------
+# Layout runs in worker processes, so reportlab never holds the API's GIL.
+# At most max_pending jobs may be unfinished at once; beyond that submit()
+# raises QueueFull and the caller should retry later. Finished results are
+# kept for result_ttl seconds (and at most max_results of them).
+# Bulk exports render through executor() directly; reserve() takes slots
+# from the same max_pending budget for the renders an export keeps in flight.
+#
+# With a directory, every job's state (<job_id>.json) and PDF (<job_id>.pdf)
+# are also written there, so any worker sharing the directory can answer a
+# poll for a job another worker accepted. Files older than result_ttl are
+# deleted, whichever worker wrote them.
+class ReportJobQueue:
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 result_ttl=DEFAULT_RESULT_TTL, max_results=DEFAULT_MAX_RESULTS,
+                 directory=DEFAULT_JOBS_DIR):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.directory = directory
+
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._reserved = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.render_seconds = 0.0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def executor(self):
+        # spawn: never fork the threaded API process
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _prune(self, now):
+        cutoff = now - self.result_ttl
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        overflow = len(finished) - self.max_results
+
+        for job in finished:
+            if job.finished < cutoff or overflow > 0:
+                del self._jobs[job.job_id]
+                self._remove_files(job.job_id)
+                overflow -= 1
+
+    # -----------------------------
+    # SHARED DIRECTORY
+    # -----------------------------
+    def _path(self, job_id, ext):
+        return os.path.join(self.directory, f"{job_id}.{ext}")
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # the PDF is in place before the state says "done"
+    def _write_state(self, job, status, pdf=None):
+        if not self.directory:
+            return
+        if pdf is not None:
+            self._write(self._path(job.job_id, "pdf"), pdf)
+        state = {"session_id": job.session_id, "status": status, "error": job.error}
+        self._write(self._path(job.job_id, "json"), json.dumps(state).encode("utf-8"))
+
+    def _read_state(self, job_id):
+        if not self.directory:
+            return None
+        try:
+            uuid.UUID(job_id)  # never build a path from anything else
+            with open(self._path(job_id, "json"), "rb") as f:
+                state = json.loads(f.read())
+        except (ValueError, OSError):
+            return None
+        return StoredJob(job_id, state["session_id"], state["status"], state["error"], self._path(job_id, "pdf"))
+
+    def _remove_files(self, job_id):
+        if not self.directory:
+            return
+        for ext in ("json", "pdf"):
+            try:
+                os.remove(self._path(job_id, ext))
+            except FileNotFoundError:
+                pass
+
+    # jobs written by every worker, including ones that have exited
+    def _prune_directory(self):
+        if not self.directory:
+            return
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _on_done(self, job, future):
+        pdf = None
+        if not future.cancelled() and future.exception() is None:
+            pdf = future.result()
+
+        with self._lock:
+            job.finished = time.monotonic()
+            self._pending -= 1
+            if future.cancelled():
+                job.error = "cancelled"
+                self.failed += 1
+            elif future.exception() is not None:
+                job.error = str(future.exception())
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.render_seconds += job.finished - job.submitted
+
+        try:
+            self._write_state(job, job.status, pdf)
+        except OSError as e:
+            print(f"report job {job.job_id}: could not write its result: {e}", flush=True)
+
+    def submit(self, session_id, *args, **kwargs):
+        with self._lock:
+            self._prune(time.monotonic())
+            self._prune_directory()
+
+            if self._pending + self._reserved >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending + self._reserved} report renders already pending")
+
+            job_id = str(uuid.uuid4())
+            future = self.executor().submit(make_pdf_bytes, *args, **kwargs)
+            job = ReportJob(job_id, session_id, future)
+            self._jobs[job_id] = job
+            self._pending += 1
+            self.submitted += 1
+            self._write_state(job, "pending")
+
+        future.add_done_callback(lambda f: self._on_done(job, f))
+        return job
+
+    # Grants between 1 and n slots, or raises QueueFull when none is free;
+    # every granted slot must be given back with release().
+    def reserve(self, n):
+        with self._lock:
+            free = self.max_pending - self._pending - self._reserved
+            if free < 1:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending + self._reserved} report renders already pending")
+            n = min(n, free)
+            self._reserved += n
+            return n
+
+    def release(self, n):
+        with self._lock:
+            self._reserved -= n
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._read_state(job_id)
+
+    def stats(self):
+        # "running" = handed to the pool's call queue (may be one ahead of a free worker)
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.finished is None and j.future.running())
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self._pending - running,
+                "running": running,
+                "reserved_by_exports": self._reserved,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_turnaround_seconds": (
+                    self.render_seconds / self.completed if self.completed else 0.0
+                ),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
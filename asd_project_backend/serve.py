@@ -0,0 +1,159 @@
+# serve.py — Pre-fork launcher: load the app (and model) once, fork workers
+#
+#   SESSION_BACKEND=sqlite python serve.py --workers 4 [--host 127.0.0.1] [--port 8000]
+#
+# `uvicorn --workers N` spawns fresh interpreters that each import main.py,
+# so every worker pays for its own copy of numpy, reportlab, the compiled
+# questionnaire and the model objects. Here the master imports main.py once
+# (model bundle mapped, templates and tables built), freezes the GC so
+# collections in the workers never write to inherited objects, and then
+# forks. Workers share all of that copy-on-write and the bundle's read-only
+# mapping. Measure it with bench_memory.py.
+#
+# A worker that dies is restarted after a delay that doubles with each
+# consecutive quick failure (WORKER_RESTART_BACKOFF_SECONDS, at most
+# WORKER_RESTART_MAX_DELAY_SECONDS). A worker that ran for
+# WORKER_STABLE_SECONDS resets the count. After --max-restarts consecutive
+# quick failures the launcher stops the other workers and exits with status 1,
+# so a broken deploy fails instead of fork-looping.
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+import traceback
+
+import uvicorn
+
+RESTART_BACKOFF_SECONDS = float(os.getenv("WORKER_RESTART_BACKOFF_SECONDS", "0.5"))
+RESTART_MAX_DELAY_SECONDS = float(os.getenv("WORKER_RESTART_MAX_DELAY_SECONDS", "30"))
+STABLE_SECONDS = float(os.getenv("WORKER_STABLE_SECONDS", "30"))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Pre-fork NeuroMate API server")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--max-restarts", type=int, default=int(os.getenv("WORKER_MAX_RESTARTS", "5")),
+                        help="consecutive quick worker failures before the launcher gives up")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+# -----------------------------
+# WORKER
+# -----------------------------
+def run_worker(app, sock, log_level):
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    gc.enable()
+
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app, sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, log_level)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+# -----------------------------
+# MASTER
+# -----------------------------
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+
+    if args.workers > 1 and os.getenv("SESSION_BACKEND", "memory") != "sqlite":
+        sys.exit("serve.py: more than one worker needs SESSION_BACKEND=sqlite (sessions must be shared)")
+
+    # nothing allocated while importing the app should be touched by a collection later
+    gc.disable()
+    import main as app_module
+
+    app_module.SESSIONS.close()
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f"serve.py: master {os.getpid()} on http://{args.host}:{args.port}, "
+          f"{args.workers} workers, model {app_module.artifacts['version']}", flush=True)
+
+    workers = {}  # pid → start time
+    stopping = False
+    failures = 0  # consecutive workers that died before STABLE_SECONDS
+    code = 0
+
+    def stop(signum=None, frame=None):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    def start_worker():
+        workers[spawn(app_module.app, sock, args.log_level)] = time.monotonic()
+
+    for _ in range(args.workers):
+        start_worker()
+
+    # reap workers; replace any that die while we are not shutting down
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if stopping or started is None:
+            continue
+
+        failures = failures + 1 if time.monotonic() - started < STABLE_SECONDS else 0
+        if failures > args.max_restarts:
+            print(f"serve.py: worker {pid} exited ({status}); {failures} quick failures in a row, "
+                  f"giving up", flush=True)
+            code = 1
+            stop()
+            continue
+
+        delay = min(RESTART_BACKOFF_SECONDS * 2 ** (failures - 1), RESTART_MAX_DELAY_SECONDS) if failures else 0.0
+        print(f"serve.py: worker {pid} exited ({status}), restarting in {delay:.1f}s", flush=True)
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(max(0.0, min(0.1, deadline - time.monotonic())))
+        if not stopping:
+            start_worker()
+
+    sock.close()
+    if code:
+        sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+# session_journal.py — Append-only journal + snapshots for the in-memory session store
+#
+# Every session mutation is appended as a small binary event:
+#
+#   START   session created
+#   ANSWER  raw answers given at questionnaire state `state` (1 for /answer,
+#           several for /answer_batch); replayed through the same transition
+#           table, so the record is a few dozen bytes
+#   FINAL   wall-clock completion time of a finished session
+#
+# Appends only copy bytes into a buffer. A flusher thread writes the buffer
+# and fsyncs once per batch (group commit), every SESSION_JOURNAL_FLUSH_MS or
+# as soon as the previous fsync returns when SESSION_JOURNAL_SYNC=1 makes
+# callers wait for durability. Without SYNC a crash loses at most the last
+# flush interval.
+#
+# A snapshot (every SESSION_SNAPSHOT_SECONDS, when the journal grows past
+# SESSION_SNAPSHOT_BYTES, and at shutdown) rotates to a new journal segment,
+# writes every live session with the sequence number of its last event, then
+# deletes the older segments. Startup loads the newest snapshot and replays
+# only the segments written after it; events a snapshotted record already
+# contains are skipped by sequence number.
+#
+# On disk (SESSION_JOURNAL_DIR):
+#   journal.<n>.log    frames: u32 length, u32 crc32, payload
+#   snapshot.<n>.bin   same frames; covers every segment below n
+#   journal.lock       flock()ed by the one process that recovers and writes
+#                      the directory; a second one fails with JournalLocked
+# A torn or corrupt frame ends its segment (the tail of a crash).
+import gc
+import os
+import fcntl
+import re
+import time
+import uuid
+import struct
+import zlib
+import threading
+
+DEFAULT_JOURNAL_DIR = os.getenv("SESSION_JOURNAL_DIR")
+DEFAULT_FLUSH_MS = float(os.getenv("SESSION_JOURNAL_FLUSH_MS", "5"))
+DEFAULT_SYNC = os.getenv("SESSION_JOURNAL_SYNC", "0") == "1"
+DEFAULT_SNAPSHOT_SECONDS = float(os.getenv("SESSION_SNAPSHOT_SECONDS", "300"))
+DEFAULT_SNAPSHOT_BYTES = int(os.getenv("SESSION_SNAPSHOT_BYTES", str(64 << 20)))
+
+START, ANSWER, FINAL = 1, 2, 3
+
+FRAME = struct.Struct("<II")  # payload length, crc32
+EVENT = struct.Struct("<BQd16s")  # type, seq, wall time, session uuid
+STATE = struct.Struct("<HH")  # questionnaire state, answer count
+LENGTH = struct.Struct("<H")
+COMPLETED = struct.Struct("<d")
+SNAPSHOT_ENTRY = struct.Struct("<16sQd")  # session uuid, last seq, last activity (wall)
+
+SEGMENT_NAME = re.compile(r"^journal\.(\d+)\.log$")
+SNAPSHOT_NAME = re.compile(r"^snapshot\.(\d+)\.bin$")
+LOCK_NAME = "journal.lock"
+
+
+class JournalLocked(RuntimeError):
+    pass
+
+
+def frame(payload):
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    pos, end = 0, len(data)
+    while pos + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(data, pos)
+        start = pos + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        yield payload
+        pos = start + length
+
+
+def encode_event(kind, seq, wall, session_id, body=b""):
+    return frame(EVENT.pack(kind, seq, wall, uuid.UUID(session_id).bytes) + body)
+
+
+def encode_answers(state, answers):
+    parts = [STATE.pack(state, len(answers))]
+    for raw in answers:
+        data = raw.encode("utf-8")
+        if len(data) > 0xFFFF:  # the API caps answers far below this; cut on a character boundary
+            data = data[:0xFFFF].decode("utf-8", "ignore").encode("utf-8")
+        parts.append(LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_answers(body):
+    state, count = STATE.unpack_from(body, 0)
+    pos, answers = STATE.size, []
+    for _ in range(count):
+        (n,) = LENGTH.unpack_from(body, pos)
+        pos += LENGTH.size
+        answers.append(body[pos:pos + n].decode("utf-8", "replace"))
+        pos += n
+    return state, answers
+
+
+def numbered(directory, pattern):
+    found = []
+    for name in os.listdir(directory):
+        m = pattern.match(name)
+        if m:
+            found.append((int(m.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# -----------------------------
+# JOURNAL
+# -----------------------------
+# The session's lock (backend.locked(session_id)) must be held while it is
+# mutated and its event appended (see main.py); the snapshot takes the same
+# lock per record, so it never serializes a half-applied answer.
+# commit(seq) is called after releasing it: with SESSION_JOURNAL_SYNC=1 it
+# waits for the group fsync, so concurrent requests share one fsync.
+class SessionJournal:
+    def __init__(self, directory=DEFAULT_JOURNAL_DIR, flush_ms=DEFAULT_FLUSH_MS, sync=DEFAULT_SYNC,
+                 snapshot_seconds=DEFAULT_SNAPSHOT_SECONDS, snapshot_bytes=DEFAULT_SNAPSHOT_BYTES):
+        self.directory = directory
+        self.flush_interval = flush_ms / 1000.0
+        self.sync = sync
+        self.snapshot_seconds = snapshot_seconds
+        self.snapshot_bytes = snapshot_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition(threading.Lock())
+        self._io_lock = threading.Lock()  # the segment file: flusher vs snapshot rotation
+        self._buffer = bytearray()
+        self._seq = 0
+        self._durable_seq = 0
+        self._file = None
+        self._segment = 0
+        self._segment_bytes = 0
+        self._flusher = None
+        self._snapshotter = None
+        self._stopping = False
+        self._snapshot_wanted = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        self._backend = None
+        self._lock_file = None
+
+        self.events = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.snapshots = 0
+        self.last_snapshot_seconds = None
+        self.recovered = None
+
+    # -----------------------------
+    # APPEND (request path)
+    # -----------------------------
+    def _append(self, kind, session_id, record, body=b""):
+        self.start()
+        event_time = time.time()
+        with self._cond:
+            self._seq += 1
+            record.journal_seq = self._seq
+            if not self._buffer:
+                self._cond.notify_all()
+            self._buffer += encode_event(kind, self._seq, event_time, session_id, body)
+            self.events += 1
+            return self._seq
+
+    def start_session(self, session_id, record):
+        return self._append(START, session_id, record)
+
+    def answers(self, session_id, record, state, answers):
+        if not answers:
+            return 0
+        return self._append(ANSWER, session_id, record, encode_answers(state, answers))
+
+    def finalize(self, session_id, record):
+        return self._append(FINAL, session_id, record, COMPLETED.pack(record.completed_at))
+
+    def commit(self, seq):
+        if self.sync and seq:
+            with self._cond:
+                while self._durable_seq < seq and self._flusher is not None:
+                    self._cond.wait()
+
+    # -----------------------------
+    # BACKGROUND THREADS
+    # -----------------------------
+    # Idempotent; also called from the first append. Threads are started
+    # lazily so a pre-fork master (serve.py) never forks with them running.
+    def start(self, backend=None):
+        if backend is not None:
+            self._backend = backend
+        if self._flusher is not None:
+            return
+        with self._cond:
+            if self._flusher is not None:
+                return
+            self._lock_directory()
+            self._stopping = False
+            self._open_segment(self._next_segment())
+            self._flusher = threading.Thread(target=self._flush_loop, name="journal-flush", daemon=True)
+            self._flusher.start()
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, name="journal-snapshot", daemon=True)
+            self._snapshotter.start()
+
+    # Two writers would interleave sequence numbers and delete each other's
+    # segments on snapshot. The kernel drops the lock when its process dies,
+    # so a restarted worker can take over (and recover) the directory.
+    def _lock_directory(self):
+        if self._lock_file is not None:
+            return
+        f = open(os.path.join(self.directory, LOCK_NAME), "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            raise JournalLocked(
+                f"{self.directory} is in use by another process "
+                f"(one SESSION_JOURNAL_DIR per process: the memory backend serves a single worker)"
+            ) from None
+        self._lock_file = f
+
+    def _unlock_directory(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _next_segment(self):
+        last = [n for n, _ in numbered(self.directory, SEGMENT_NAME) + numbered(self.directory, SNAPSHOT_NAME)]
+        return max(last, default=0) + 1
+
+    def _open_segment(self, n):
+        self._file = open(os.path.join(self.directory, f"journal.{n}.log"), "ab", buffering=0)
+        self._segment = n
+        self._segment_bytes = 0
+        fsync_dir(self.directory)
+
+    # SYNC: flush as soon as there is data; events arriving during an fsync
+    # form the next batch. Otherwise wait flush_ms so one fsync covers many.
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            if not self.sync:
+                time.sleep(self.flush_interval)
+            try:
+                self._flush()
+            except OSError as e:
+                print(f"Session journal write failed, retrying: {e}")
+                time.sleep(max(self.flush_interval, 0.1))
+
+    def _flush(self):
+        with self._io_lock:
+            with self._cond:
+                data, self._buffer = self._buffer, bytearray()
+                seq, f = self._seq, self._file
+            if not data:
+                return
+
+            started = time.perf_counter()
+            try:
+                f.write(data)
+                os.fsync(f.fileno())
+            except OSError:
+                with self._cond:
+                    self._buffer[:0] = data  # keep order for the retry
+                raise
+            self.flush_seconds += time.perf_counter() - started
+            self.flushes += 1
+
+            with self._cond:
+                self._durable_seq = seq
+                self._segment_bytes += len(data)
+                self._cond.notify_all()
+        if self._segment_bytes >= self.snapshot_bytes:
+            self._snapshot_wanted.set()
+
+    def _snapshot_loop(self):
+        while not self._stopping:
+            self._snapshot_wanted.wait(self.snapshot_seconds)
+            self._snapshot_wanted.clear()
+            if self._stopping:
+                return
+            if self._segment_bytes or self._buffer:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"Session snapshot failed: {e}")
+
+    def stop(self, snapshot=True):
+        if self._flusher is None:
+            self._unlock_directory()
+            return
+        if snapshot:
+            self.snapshot()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._snapshot_wanted.set()
+        self._flusher.join()
+        self._snapshotter.join()
+        self._flush()
+        self._file.close()
+        with self._cond:
+            self._cond.notify_all()
+        self._flusher = self._snapshotter = None
+        self._unlock_directory()
+
+    # -----------------------------
+    # SNAPSHOT
+    # -----------------------------
+    def snapshot(self):
+        if self._backend is None:
+            raise RuntimeError("journal.start(backend) was not called")
+        with self._snapshot_lock:
+            started = time.perf_counter()
+
+            # 1. new events go to segment n from here on
+            # (a mutation racing with this is fine: its event lands on either
+            # side of the cut, and replay skips it if the record already has it)
+            with self._io_lock, self._cond:
+                old = self._file
+                if self._buffer:
+                    old.write(self._buffer)
+                    self._buffer = bytearray()
+                os.fsync(old.fileno())
+                self._durable_seq = self._seq
+                self._cond.notify_all()
+                n = self._next_segment()
+                self._open_segment(n)
+            old.close()
+
+            # 2. every live session as of now, with the seq of its last event
+            entries = []
+            now_wall, now_mono = time.time(), time.monotonic()
+            for session_id, record in self._backend.items():
+                with self._backend.locked(session_id):
+                    data = record.to_bytes()
+                    seq = record.journal_seq
+                last_wall = now_wall - (now_mono - record.last_access)
+                entries.append(frame(SNAPSHOT_ENTRY.pack(uuid.UUID(session_id).bytes, seq, last_wall) + data))
+
+            path = os.path.join(self.directory, f"snapshot.{n}.bin")
+            with open(path + ".tmp", "wb") as f:
+                f.write(b"".join(entries))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            fsync_dir(self.directory)
+
+            # 3. everything before segment n is now covered by the snapshot
+            for m, old_path in numbered(self.directory, SEGMENT_NAME) + numbered(self.directory, SNAPSHOT_NAME):
+                if m < n:
+                    os.remove(old_path)
+
+            self.snapshots += 1
+            self.last_snapshot_seconds = time.perf_counter() - started
+            return {"segment": n, "sessions": len(entries), "seconds": self.last_snapshot_seconds}
+
+    # -----------------------------
+    # RECOVERY (startup, before start())
+    # -----------------------------
+    # Takes the directory lock and keeps it: run it in the process that
+    # will write the journal (after fork under serve.py, never in its master).
+    # new_record() → empty SessionRecord; replay(record, state, answers) applies
+    # journaled answers and returns False when the record is not at `state`.
+    def recover(self, backend, new_record, replay, ttl_seconds):
+        # recovery only allocates (no cycles to free); collections would
+        # rescan the growing session set over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._recover(backend, new_record, replay, ttl_seconds)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _recover(self, backend, new_record, replay, ttl_seconds):
+        started = time.perf_counter()
+        self._lock_directory()
+        self._backend = backend
+        snapshots = numbered(self.directory, SNAPSHOT_NAME)
+        base = snapshots[-1][0] if snapshots else 0
+
+        sessions = {}  # uuid bytes → [record, last wall time]
+        max_seq = 0
+        undecodable = 0  # intact frames that do not parse: skipped, never fatal
+        if snapshots:
+            from session_store import SessionRecord
+
+            for payload in read_frames(snapshots[-1][1]):
+                try:
+                    sid, seq, wall = SNAPSHOT_ENTRY.unpack_from(payload, 0)
+                    record = SessionRecord.from_bytes(payload[SNAPSHOT_ENTRY.size:])
+                except (struct.error, TypeError, ValueError):
+                    undecodable += 1
+                    continue
+                record.journal_seq = seq
+                sessions[sid] = [record, wall]
+                max_seq = max(max_seq, seq)
+
+        replayed = skipped = 0
+        for n, path in numbered(self.directory, SEGMENT_NAME):
+            if n < base:
+                continue
+            for payload in read_frames(path):
+                try:
+                    kind, seq, wall, sid = EVENT.unpack_from(payload, 0)
+                    if kind == ANSWER:
+                        state, answers = decode_answers(payload[EVENT.size:])
+                    elif kind == FINAL:
+                        (completed_at,) = COMPLETED.unpack_from(payload, EVENT.size)
+                except (struct.error, ValueError):
+                    undecodable += 1
+                    continue
+                max_seq = max(max_seq, seq)
+                entry = sessions.get(sid)
+
+                if kind == START:
+                    if entry is None:
+                        record = new_record()
+                        record.journal_seq = seq
+                        sessions[sid] = [record, wall]
+                        replayed += 1
+                    continue
+                if entry is None or seq <= entry[0].journal_seq:
+                    skipped += 1  # expired before the snapshot, or already in it
+                    continue
+
+                record = entry[0]
+                if kind == ANSWER:
+                    if not replay(record, state, answers):
+                        skipped += 1
+                        continue
+                elif kind == FINAL:
+                    record.completed_at = completed_at
+                record.journal_seq = seq
+                entry[1] = wall
+                replayed += 1
+
+        # idle sessions beyond the TTL are dropped; the rest keep their LRU order
+        now_wall, now_mono = time.time(), time.monotonic()
+        live = sorted(
+            ((wall, sid, record) for sid, (record, wall) in sessions.items() if wall >= now_wall - ttl_seconds),
+            key=lambda item: item[0],
+        )
+        for wall, sid, record in live:
+            record.last_access = now_mono - (now_wall - wall)
+            backend.restore(str(uuid.UUID(bytes=sid)), record)
+
+        self._seq = self._durable_seq = max_seq
+        self.recovered = {
+            "sessions": len(live),
+            "expired": len(sessions) - len(live),
+            "snapshot": snapshots[-1][1] if snapshots else None,
+            "events_replayed": replayed,
+            "events_skipped": skipped,
+            "events_undecodable": undecodable,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        return self.recovered
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "sync": self.sync,
+            "flush_ms": self.flush_interval * 1000,
+            "segment": self._segment,
+            "segment_bytes": self._segment_bytes,
+            "events": self.events,
+            "flushes": self.flushes,
+            "avg_flush_ms": self.flush_seconds / self.flushes * 1000 if self.flushes else 0.0,
+            "events_per_flush": self.events / self.flushes if self.flushes else 0.0,
+            "snapshots": self.snapshots,
+            "last_snapshot_seconds": self.last_snapshot_seconds,
+            "recovered": self.recovered,
+        }
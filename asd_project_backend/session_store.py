@@ -0,0 +1,468 @@
+# session_store.py — Pluggable Session Backends (In-Memory TTL/LRU + Shared SQLite)
+import os
+import json
+import time
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from questionnaire import START_STATE
+
+DEFAULT_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+DEFAULT_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+DEFAULT_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "256"))
+DEFAULT_DB_PATH = os.getenv(
+    "SESSION_DB_PATH", os.path.join(os.path.dirname(__file__), "sessions.db")
+)
+
+
+# -----------------------------
+# COMPACT PER-SESSION RECORD
+# -----------------------------
+class SessionRecord:
+    __slots__ = (
+        "cursor",
+        "user",
+        "scores",
+        "answers",
+        "complete",
+        "completed_at",
+        "final",
+        "probability",
+        "last_access",
+        "journal_seq",
+    )
+
+    def __init__(self, n_categories):
+        # state id in the compiled questionnaire (see questionnaire.py)
+        self.cursor = START_STATE
+        self.user = {}
+        # one unsigned byte per category (max 5 questions each)
+        self.scores = array("B", bytes(n_categories))
+        # (state_id, raw_answer) — question text is looked up on demand
+        self.answers = []
+        self.complete = False
+        self.completed_at = None  # wall-clock time, used by bulk export
+        self.final = None
+        self.probability = None  # model risk at completion (None: no model)
+        self.last_access = time.monotonic()
+        self.journal_seq = 0  # sequence number of its last journal event (session_journal.py)
+
+    # Working copy for an all-or-nothing update (see main.record_answers)
+    def copy(self):
+        rec = SessionRecord.__new__(SessionRecord)
+        rec.cursor = self.cursor
+        rec.user = dict(self.user)
+        rec.scores = array("B", self.scores)
+        rec.answers = list(self.answers)
+        rec.complete = self.complete
+        rec.completed_at = self.completed_at
+        rec.final = self.final
+        rec.probability = self.probability
+        rec.last_access = self.last_access
+        rec.journal_seq = self.journal_seq
+        return rec
+
+    # Takes over a working copy's state in place (the memory backend shares
+    # this object); `complete` last, as in main.finalize
+    def update_from(self, other):
+        self.cursor = other.cursor
+        self.user = other.user
+        self.scores = other.scores
+        self.answers = other.answers
+        self.completed_at = other.completed_at
+        self.final = other.final
+        self.probability = other.probability
+        self.complete = other.complete
+
+    # Positional JSON array: no field names on the wire, under 1 KB per finished session
+    def to_bytes(self):
+        return json.dumps(
+            [
+                self.cursor,
+                self.user,
+                list(self.scores),
+                self.answers,
+                self.complete,
+                self.completed_at,
+                self.final,
+                self.probability,
+            ],
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, raw):
+        fields = json.loads(raw)
+        if len(fields) == 7:  # written before probability was stored
+            fields.append(None)
+        rec = cls.__new__(cls)
+        (
+            rec.cursor,
+            rec.user,
+            scores,
+            answers,
+            rec.complete,
+            rec.completed_at,
+            rec.final,
+            rec.probability,
+        ) = fields
+        rec.scores = array("B", scores)
+        rec.answers = [tuple(a) for a in answers]
+        rec.last_access = time.monotonic()
+        rec.journal_seq = 0
+        return rec
+
+
+# -----------------------------
+# PER-SESSION LOCKS (lock striping)
+# -----------------------------
+# A fixed pool of locks; a session always maps to the same one, so its
+# mutations are serialized while other sessions (almost always on other
+# stripes) proceed in parallel. No per-session lock objects to create or
+# clean up when sessions expire.
+class SessionLocks:
+    def __init__(self, stripes=DEFAULT_LOCK_STRIPES):
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def __len__(self):
+        return len(self._locks)
+
+    def __call__(self, session_id):
+        return self._locks[hash(session_id) % len(self._locks)]
+
+
+# -----------------------------
+# BACKEND INTERFACE
+# -----------------------------
+# get()  → record or None (unknown / expired)
+# put()  → store a brand new session
+# save() → persist a record after it was mutated
+# completed_since(t) → ids of sessions completed at or after wall-clock time t
+# close()  → release this thread's handles (called before a pre-fork master forks)
+# locked(session_id) → context manager for read-modify-write of one session:
+#     with SESSIONS.locked(sid):
+#         sess = SESSIONS.get(sid); <mutate>; SESSIONS.save(sid, sess)
+class SessionBackend:
+    lock_for = None  # SessionLocks, set by subclasses
+
+    def locked(self, session_id):
+        return self.lock_for(session_id)
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def put(self, session_id, record):
+        raise NotImplementedError
+
+    def save(self, session_id, record):
+        raise NotImplementedError
+
+    def completed_since(self, since):
+        raise NotImplementedError
+
+    def sweep(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+
+# -----------------------------
+# IN-MEMORY TTL + LRU BACKEND (default, single process)
+# -----------------------------
+# Entries are kept in access order, so expired and least-recently-used
+# sessions always sit at the front and eviction is O(1) amortized.
+class MemorySessionBackend(SessionBackend):
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.lock_for = SessionLocks()
+
+        self.created = 0
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _expire(self, now):
+        cutoff = now - self.ttl_seconds
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if oldest.last_access >= cutoff:
+                break
+            self._data.popitem(last=False)
+            self.evicted_ttl += 1
+
+    def put(self, session_id, record):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            record.last_access = now
+            self._data[session_id] = record
+            self._data.move_to_end(session_id)
+            self.created += 1
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evicted_lru += 1
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            record = self._data.get(session_id)
+            if record is None:
+                return None
+
+            if record.last_access < now - self.ttl_seconds:
+                del self._data[session_id]
+                self.evicted_ttl += 1
+                return None
+
+            record.last_access = now
+            self._data.move_to_end(session_id)
+            return record
+
+    # records are shared objects here, mutations are already visible
+    def save(self, session_id, record):
+        pass
+
+    def completed_since(self, since):
+        with self._lock:
+            return [
+                sid for sid, r in self._data.items()
+                if r.complete and r.completed_at is not None and r.completed_at >= since
+            ]
+
+    # (session_id, record) pairs, least recently used first (journal snapshots)
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    # journal recovery: keeps the record's last_access; call in last_access order
+    def restore(self, session_id, record):
+        with self._lock:
+            self._data[session_id] = record
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evicted_lru += 1
+
+    def sweep(self):
+        with self._lock:
+            self._expire(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            completed = sum(1 for r in self._data.values() if r.complete)
+            return {
+                "backend": "memory",
+                "size": len(self._data),
+                "completed": completed,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "evicted_ttl": self.evicted_ttl,
+                "evicted_lru": self.evicted_lru,
+            }
+
+
+# -----------------------------
+# SQLITE (WAL) BACKEND — shared by all workers on one host
+# -----------------------------
+ACCESS_REFRESH_SECONDS = 1.0
+
+
+# Every uvicorn worker opens the same database file; WAL mode lets readers
+# proceed while one writer commits. last_access is wall-clock time here
+# because it is compared across processes, and it is refreshed on save().
+class SqliteSessionBackend(SessionBackend):
+    def __init__(self, path=DEFAULT_DB_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.lock_for = SessionLocks()
+
+        # counters are per process; size/completed come from the shared table
+        self.created = 0
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " complete INTEGER NOT NULL DEFAULT 0,"
+            " completed_at REAL,"
+            " last_access REAL NOT NULL)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "completed_at" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN completed_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_completed_at ON sessions(completed_at)")
+
+        # row count kept by triggers, so enforcing max_entries on every put()
+        # needs no COUNT(*) scan; shared by all workers like the table itself
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions_size ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " size INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO sessions_size VALUES (0, (SELECT COUNT(*) FROM sessions))")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS sessions_size_insert AFTER INSERT ON sessions"
+                " BEGIN UPDATE sessions_size SET size = size + 1 WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS sessions_size_delete AFTER DELETE ON sessions"
+                " BEGIN UPDATE sessions_size SET size = size - 1 WHERE id = 0; END"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # SQLite connections must not cross fork(); children reconnect lazily
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _expire(self, conn, now):
+        cur = conn.execute(
+            "DELETE FROM sessions WHERE last_access < ?", (now - self.ttl_seconds,)
+        )
+        self.evicted_ttl += cur.rowcount
+
+        (size,) = conn.execute("SELECT size FROM sessions_size WHERE id = 0").fetchone()
+        overflow = size - self.max_entries
+        if overflow > 0:
+            cur = conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                " SELECT id FROM sessions ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self.evicted_lru += cur.rowcount
+
+    def put(self, session_id, record):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO sessions (id, data, complete, last_access) VALUES (?, ?, ?, ?)",
+                (session_id, record.to_bytes(), int(record.complete), now),
+            )
+            self._expire(conn, now)
+        self.created += 1
+
+    # Other workers do not share the in-process stripe locks; BEGIN IMMEDIATE
+    # takes the database write lock, so the get → save of one session cannot
+    # interleave with another process's write either.
+    @contextmanager
+    def locked(self, session_id):
+        with self.lock_for(session_id):
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+
+        row = self._conn().execute(
+            "SELECT data, last_access FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        data, last_access = row
+        now = time.time()
+        if last_access < now - self.ttl_seconds:
+            self._conn().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.evicted_ttl += 1
+            return None
+
+        # reads keep a session alive, as with the memory backend; at most one
+        # write per second per session
+        if now - last_access >= ACCESS_REFRESH_SECONDS:
+            self._conn().execute("UPDATE sessions SET last_access = ? WHERE id = ?", (now, session_id))
+
+        return SessionRecord.from_bytes(data)
+
+    def save(self, session_id, record):
+        self._conn().execute(
+            "UPDATE sessions SET data = ?, complete = ?, completed_at = ?, last_access = ? WHERE id = ?",
+            (record.to_bytes(), int(record.complete), record.completed_at, time.time(), session_id),
+        )
+
+    def completed_since(self, since):
+        rows = self._conn().execute(
+            "SELECT id FROM sessions WHERE completed_at >= ? AND last_access >= ? ORDER BY completed_at",
+            (since, time.time() - self.ttl_seconds),
+        )
+        return [row[0] for row in rows]
+
+    def sweep(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire(conn, time.time())
+
+    def stats(self):
+        size, completed = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(complete), 0) FROM sessions"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "size": size,
+            "completed": completed,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "created": self.created,
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_lru": self.evicted_lru,
+        }
+
+
+# -----------------------------
+# BACKEND SELECTION
+# -----------------------------
+def create_session_backend(name=DEFAULT_BACKEND):
+    if name == "memory":
+        return MemorySessionBackend()
+    if name == "sqlite":
+        return SqliteSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {name!r} (expected 'memory' or 'sqlite')")
@@ -0,0 +1,292 @@
+# stream_training.py — Out-of-core training: chunked ingest, running statistics,
+# forest grown chunk by chunk
+#
+# Used by `python train_pipeline.py <recipe> --stream [--chunk-rows N]`.
+#
+#   pass 1  read every chunk once: encoder vocabularies (value counts), and per
+#           numeric column count / mean / M2 (Chan's parallel merge) plus the
+#           value counts needed for median / most_frequent imputation
+#   pass 2  encode → impute → scale each chunk with the finished statistics and
+#           add its share of trees to a warm_start RandomForestClassifier
+#   pass 3  accuracy of the final forest (holdout rows, or all rows)
+#
+# Only one chunk is in memory at a time; every tree is grown on one chunk.
+# The results match the in-memory pipeline: LabelEncoder codes (sorted
+# vocabulary), SimpleImputer statistics, and a StandardScaler fitted after
+# imputation. Median / most_frequent become approximate (reservoir sample)
+# only for a column with more than MAX_DISTINCT distinct values.
+import itertools
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from utils import preprocess_features
+
+MAX_DISTINCT = 65536
+RESERVOIR_SIZE = 100_000
+
+
+# -----------------------------
+# CHUNKED READERS
+# -----------------------------
+def iter_chunks(path, chunk_rows):
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet needs pyarrow (pip install pyarrow)") from None
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+# -----------------------------
+# RUNNING COLUMN STATISTICS
+# -----------------------------
+class RunningColumn:
+    __slots__ = ("n", "missing", "mean", "m2", "counts", "reservoir", "seen", "_rng")
+
+    def __init__(self, seed=0):
+        self.n = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.counts = {}
+        self.reservoir = np.empty(0)
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    # raw column values of one chunk (NaN = missing)
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(values)
+        self.missing += int(nan.sum())
+        values = values[~nan]
+        if len(values) == 0:
+            return
+
+        uniques, counts = np.unique(values, return_counts=True)
+        self._merge(uniques, counts)
+        if self.counts is not None and len(self.counts) > MAX_DISTINCT:
+            self.counts = None
+        self._sample(values)
+
+    # already aggregated (value, count) pairs, e.g. encoder codes
+    def add_counts(self, values, counts):
+        self._merge(np.asarray(values, dtype=np.float64), np.asarray(counts, dtype=np.float64))
+
+    def _merge(self, values, counts):
+        n_b = counts.sum()
+        mean_b = np.dot(values, counts) / n_b
+        m2_b = np.dot((values - mean_b) ** 2, counts)
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+
+        if self.counts is not None:
+            for v, c in zip(values.tolist(), counts.tolist()):
+                self.counts[v] = self.counts.get(v, 0) + c
+
+    # Algorithm R, one chunk at a time
+    def _sample(self, values):
+        free = RESERVOIR_SIZE - len(self.reservoir)
+        if free > 0:
+            self.reservoir = np.concatenate([self.reservoir, values[:free]])
+            self.seen += min(free, len(values))
+            values = values[free:]
+        if len(values):
+            slots = self._rng.integers(0, np.arange(self.seen + 1, self.seen + len(values) + 1))
+            hit = slots < RESERVOIR_SIZE
+            self.reservoir[slots[hit]] = values[hit]
+            self.seen += len(values)
+
+    def statistic(self, strategy):
+        if self.n == 0:
+            raise ValueError("column has no non-missing values")
+        if strategy == "mean":
+            return self.mean
+
+        if self.counts is not None:
+            values = np.array(sorted(self.counts))
+            counts = np.array([self.counts[v] for v in values])
+        else:
+            values, counts = np.unique(self.reservoir, return_counts=True)
+
+        if strategy == "most_frequent":
+            return float(values[np.argmax(counts)])  # ties → smallest value, like SimpleImputer
+        if strategy == "median":
+            cumulative = np.cumsum(counts)
+            total = cumulative[-1]
+            lo = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+            hi = values[np.searchsorted(cumulative, total // 2 + 1)]
+            return float((lo + hi) / 2)
+        raise ValueError(f"unknown imputer strategy {strategy!r}")
+
+    # StandardScaler fitted after imputation: `missing` copies of `fill` join the column
+    def scaled_moments(self, fill=None):
+        n, mean, m2 = self.n, self.mean, self.m2
+        if fill is not None and self.missing:
+            m = self.missing
+            total = n + m
+            m2 += (mean - fill) ** 2 * n * m / total
+            mean = (n * mean + m * fill) / total
+            n = total
+        return mean, m2 / n
+
+
+class StreamStats:
+    def __init__(self, categorical):
+        self.categorical = categorical
+        self.columns = None
+        self.vocab = {}
+        self.numeric = {}
+        self.rows = 0
+        self.chunks = 0
+        self.classes = set()
+
+    def update(self, X, y):
+        if self.columns is None:
+            self.columns = list(X.columns)
+            if self.categorical is None:
+                self.categorical = list(X.select_dtypes(include=["object", "string"]).columns)
+            self.vocab = {c: {} for c in self.categorical}
+            self.numeric = {
+                c: RunningColumn(seed=i) for i, c in enumerate(self.columns) if c not in self.vocab
+            }
+
+        for col, counts in self.vocab.items():
+            for value, c in X[col].astype(str).value_counts().items():
+                counts[value] = counts.get(value, 0) + int(c)
+        for col, running in self.numeric.items():
+            running.update(pd.to_numeric(X[col], errors="coerce").to_numpy(dtype=np.float64))
+
+        self.rows += len(X)
+        self.chunks += 1
+        self.classes.update(np.unique(y).tolist())
+
+    # → same arrays as train_pipeline.preprocess, without X / y
+    def finish(self, imputer):
+        arrays = {}
+        columns = {}
+        for col in self.columns:
+            if col in self.vocab:
+                vocab = sorted(self.vocab[col])
+                arrays[f"encoder.{col}"] = np.asarray(vocab, dtype=str)
+                running = RunningColumn()
+                running.add_counts(np.arange(len(vocab)), [self.vocab[col][v] for v in vocab])
+                columns[col] = running
+            else:
+                columns[col] = self.numeric[col]
+
+        fills = [columns[c].statistic(imputer) if imputer else None for c in self.columns]
+        moments = [columns[c].scaled_moments(f) for c, f in zip(self.columns, fills)]
+        scale = np.sqrt([var for _, var in moments])
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0  # same zero-variance rule as StandardScaler
+
+        if imputer:
+            arrays["imputer_statistics"] = np.asarray(fills, dtype=np.float64)
+        arrays["scaler_mean"] = np.asarray([mean for mean, _ in moments])
+        arrays["scaler_scale"] = scale
+        arrays["feature_order"] = np.asarray(self.columns, dtype=str)
+        return arrays
+
+
+# -----------------------------
+# CHUNK → MODEL INPUT
+# -----------------------------
+def encode_chunk(X, arrays, tables):
+    out = np.empty((len(X), len(tables)), dtype=np.float64)
+    for j, (col, table) in enumerate(tables.items()):
+        if table is None:
+            out[:, j] = pd.to_numeric(X[col], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            out[:, j] = X[col].astype(str).map(table).to_numpy(dtype=np.float64)
+    return preprocess_features(out, arrays)
+
+
+def holdout_mask(n_rows, chunk_index, fraction, seed):
+    if not fraction:
+        return np.zeros(n_rows, dtype=bool)
+    return np.random.default_rng((seed, chunk_index)).random(n_rows) < fraction
+
+
+def trees_per_chunk(n_estimators, n_chunks):
+    # every chunk grows at least one tree, so no data is left unused
+    if n_chunks >= n_estimators:
+        return [1] * n_chunks
+    return [n_estimators // n_chunks + (i < n_estimators % n_chunks) for i in range(n_chunks)]
+
+
+# -----------------------------
+# STREAMING TRAIN
+# -----------------------------
+def train_streaming(path, recipe, chunk_rows, n_jobs, random_state, params=None, log=print):
+    params = dict(recipe["model"], **(params or {}))
+    n_estimators = params.pop("n_estimators")
+
+    stats = StreamStats(recipe["categorical"])
+    for X, y in (recipe["features"](chunk) for chunk in iter_chunks(path, chunk_rows)):
+        stats.update(X, y)
+    if stats.rows == 0:
+        raise ValueError(f"{path}: no rows")
+    arrays = stats.finish(recipe["imputer"])
+    log(f"pass 1:      {stats.rows} rows in {stats.chunks} chunks, classes {sorted(stats.classes)}")
+
+    tables = {
+        col: ({v: i for i, v in enumerate(arrays[f"encoder.{col}"].tolist())}
+              if f"encoder.{col}" in arrays else None)
+        for col in stats.columns
+    }
+
+    model = RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, warm_start=True, **params)
+
+    def training_rows(i, chunk):
+        X, y = recipe["features"](chunk)
+        train = ~holdout_mask(len(X), i, recipe["holdout"], random_state)
+        return encode_chunk(X[train], arrays, tables), np.asarray(y)[train]
+
+    def grow(X_train, y_train, n_trees):
+        model.set_params(n_estimators=(len(model.estimators_) if hasattr(model, "estimators_") else 0) + n_trees)
+        model.fit(X_train, y_train)
+
+    plan = trees_per_chunk(n_estimators, stats.chunks)
+    carry = 0
+    last_usable = None
+    for i, chunk in enumerate(iter_chunks(path, chunk_rows)):
+        X_train, y_train = training_rows(i, chunk)
+
+        carry += plan[i] if i < len(plan) else 0
+        # a chunk with a single class would reset the forest's classes_; its trees move on
+        if len(np.unique(y_train)) < len(stats.classes):
+            continue
+        last_usable = i
+        if carry:
+            grow(X_train, y_train, carry)
+            carry = 0
+
+    if last_usable is None:
+        raise ValueError("no chunk contained every class; cannot grow the forest")
+
+    # trees carried past the last usable chunk are grown on it (read again,
+    # so still only one chunk is in memory)
+    if carry:
+        chunk = next(itertools.islice(iter_chunks(path, chunk_rows), last_usable, None))
+        grow(*training_rows(last_usable, chunk), carry)
+        log(f"pass 2:      {carry} trees left by single-class chunks grown on chunk {last_usable}")
+    log(f"pass 2:      {len(model.estimators_)} trees")
+
+    correct = total = 0
+    for i, chunk in enumerate(iter_chunks(path, chunk_rows)):
+        X, y = recipe["features"](chunk)
+        rows = holdout_mask(len(X), i, recipe["holdout"], random_state) if recipe["holdout"] else slice(None)
+        y_eval = np.asarray(y)[rows]
+        if len(y_eval):
+            correct += int((model.predict(encode_chunk(X[rows], arrays, tables)) == y_eval).sum())
+            total += len(y_eval)
+
+    model.set_params(n_jobs=None, warm_start=False)
+    return arrays, model, correct / total if total else float("nan"), stats.rows
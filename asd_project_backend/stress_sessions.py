@@ -0,0 +1,167 @@
+# stress_sessions.py — concurrent answers against one session and many sessions
+#
+#   python stress_sessions.py [--threads 16] [--sessions 200] [--rounds 3] [--no-lock]
+#   SESSION_BACKEND=sqlite python stress_sessions.py
+#
+# Calls main.answer() from a thread pool (no HTTP) with a tiny GIL switch
+# interval, so threads interleave inside the read-modify-write of a session.
+#
+#   hot    one session: the demographics in order, then every thread posts
+#          "yes" at once. Each post must apply exactly once → every question
+#          answered and the maximum score in every category.
+#   many   --sessions sessions (demographics answered up front) answered at
+#          the same time, several threads per session posting random yes/no.
+#          Every post is applied exactly once
+#          (until the screening finishes), and the stored answers replay
+#          through the transition table to the stored cursor/scores/complete.
+#
+# --no-lock replaces SESSIONS.locked() with a no-op to show what breaks. It
+# also applies each answer to a copy and yields (time.sleep(0)) before
+# writing it back: the memory backend mutates the shared record in a few
+# bytecodes, too short a window for threads to collide reliably, while
+# sqlite's read → deserialize → apply → write is already wide. Both backends
+# then lose answers without the lock.
+# Exits 1 if any invariant is violated.
+import sys
+import time
+import random
+import argparse
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from session_store import SessionRecord
+
+DEMOGRAPHICS = ["alex", "30", "m", "india", "asian", "self", "no", "no"]
+
+
+# read → (other threads run) → write back, like a backend that stores copies
+def racy(apply_answer):
+    def apply(sess, session_id, ans_raw):
+        work = sess.copy()
+        time.sleep(0)
+        result = apply_answer(work, session_id, ans_raw)
+        sess.update_from(work)
+        return result
+    return apply
+
+
+def disable_locking(main):
+    main.SESSIONS.locked = lambda session_id: nullcontext()
+    main.apply_answer = racy(main.apply_answer)
+
+
+# answers replayed on a fresh record must give the same state
+def check_session(main, sess):
+    problems = []
+    fresh = SessionRecord(len(main.CATEGORIES))
+    for state, ans_raw in sess.answers:
+        if state != fresh.cursor:
+            problems.append(f"answer {ans_raw!r} recorded at state {state}, expected {fresh.cursor}")
+            break
+        main.apply_answer(fresh, None, ans_raw)
+    if (fresh.cursor, fresh.scores.tolist(), fresh.complete) != (sess.cursor, sess.scores.tolist(), sess.complete):
+        problems.append(
+            f"replay gives cursor {fresh.cursor} scores {fresh.scores.tolist()}, "
+            f"stored cursor {sess.cursor} scores {sess.scores.tolist()}"
+        )
+    if sess.complete and sess.final is None:
+        problems.append("complete without a final result")
+    return problems
+
+
+# a failed request is a violation too (e.g. reading a half-finalized session)
+def post(main, session_id, answer):
+    try:
+        main.answer({"session_id": session_id, "answer": answer})
+    except HTTPException as e:
+        return f"{session_id[:8]}: answer failed: {e.detail}"
+    return None
+
+
+def new_session(main):
+    session_id = main.start_session()["session_id"]
+    for ans in DEMOGRAPHICS:
+        post(main, session_id, ans)
+    return session_id
+
+
+def hot_session(main, pool):
+    session_id = new_session(main)
+
+    remaining = len(main.QUESTIONNAIRE.texts) - len(DEMOGRAPHICS)
+    errors = pool.map(lambda _: post(main, session_id, "yes"), range(remaining))
+
+    problems = [e for e in errors if e]
+    sess = main.SESSIONS.get(session_id)
+    problems += check_session(main, sess)
+    category = main.QUESTIONNAIRE.category
+    expected = [sum(1 for c in category if c == i) for i in range(len(main.CATEGORIES))]
+    if len(sess.answers) != len(main.QUESTIONNAIRE.texts):
+        problems.append(f"{len(sess.answers)} answers stored, {len(main.QUESTIONNAIRE.texts)} posted")
+    if sess.scores.tolist() != expected:
+        problems.append(f"scores {sess.scores.tolist()}, expected {expected}")
+    if not sess.complete:
+        problems.append("not complete after every question was answered")
+    return problems
+
+
+def many_sessions(main, pool, sessions, posts_per_session, seed):
+    rng = random.Random(seed)
+    ids = [new_session(main) for _ in range(sessions)]
+    jobs = [(sid, rng.choice(("yes", "no"))) for sid in ids for _ in range(posts_per_session)]
+    rng.shuffle(jobs)
+
+    started = time.perf_counter()
+    errors = list(pool.map(lambda job: post(main, *job), jobs))
+    seconds = time.perf_counter() - started
+
+    problems = [e for e in errors if e]
+    for sid in ids:
+        sess = main.SESSIONS.get(sid)
+        found = check_session(main, sess)
+        # finished screenings ignore the extra posts
+        posted = len(DEMOGRAPHICS) + posts_per_session
+        if not sess.complete and len(sess.answers) != posted:
+            found.append(f"{len(sess.answers)} answers stored, {posted} posted")
+        problems += [f"{sid[:8]}: {p}" for p in found]
+    return problems, len(jobs) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=20, help="answers posted per session in the many-session run")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-lock", action="store_true", help="disable per-session locking")
+    args = parser.parse_args()
+
+    import main as app_main
+
+    if args.no_lock:
+        disable_locking(app_main)
+    backend = type(app_main.SESSIONS).__name__
+
+    sys.setswitchinterval(1e-6)
+    failed = 0
+    with ThreadPoolExecutor(args.threads) as pool:
+        for r in range(args.rounds):
+            hot = hot_session(app_main, pool)
+            many, rate = many_sessions(app_main, pool, args.sessions, args.posts, args.seed + r)
+            print(f"round {r + 1} ({backend}, {args.threads} threads): "
+                  f"hot session {'OK' if not hot else f'{len(hot)} violations'}, "
+                  f"{args.sessions} sessions {'OK' if not many else f'{len(many)} violations'} "
+                  f"({rate:.0f} answers/s)")
+            for p in (hot + many)[:5]:
+                print("   ", p)
+            failed += len(hot) + len(many)
+
+    print("PASS" if not failed else f"FAIL ({failed} violations)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# test_session_journal.py — journal round trip and crash-recovery edge cases
+#
+#   python -m pytest -q test_session_journal.py
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+
+import httpx
+import pytest
+
+import main
+from session_journal import (
+    ANSWER, LENGTH, SEGMENT_NAME, START, STATE, JournalLocked, SessionJournal, decode_answers,
+    encode_answers, encode_event, numbered,
+)
+from session_store import MemorySessionBackend, SessionRecord
+
+DEMOGRAPHICS = ["alex", "30", "m", "india", "asian", "self", "no", "no"]
+
+
+def new_record():
+    return SessionRecord(len(main.CATEGORIES))
+
+
+def recover(directory):
+    backend = MemorySessionBackend(max_entries=10**6)
+    info = SessionJournal(directory).recover(backend, new_record, main.replay_answers, 3600)
+    return backend, info
+
+
+def state_of(sess):
+    return sess.cursor, sess.user, sess.scores.tolist(), sess.answers, sess.complete, sess.final
+
+
+# a journal over main.SESSIONS, so record_answers() journals into it
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    if not isinstance(main.SESSIONS, MemorySessionBackend):
+        pytest.skip("the journal is only used with the memory backend")
+    journal = SessionJournal(str(tmp_path))
+    journal.start(main.SESSIONS)
+    monkeypatch.setattr(main, "JOURNAL", journal)
+    yield journal
+    journal.stop(snapshot=False)
+
+
+def start(journal):
+    session_id = str(main.uuid.uuid4())
+    sess = new_record()
+    main.SESSIONS.put(session_id, sess)
+    journal.start_session(session_id, sess)
+    return session_id
+
+
+def last_segment(directory):
+    return numbered(directory, SEGMENT_NAME)[-1][1]
+
+
+# -----------------------------
+# ROUND TRIP
+# -----------------------------
+def test_round_trip_journal_only(journal, tmp_path):
+    finished, partial = start(journal), start(journal)
+    main.record_answers(finished, DEMOGRAPHICS + ["yes"] * 30)
+    for ans in DEMOGRAPHICS[:5]:
+        main.record_answers(partial, [ans])
+    journal.stop(snapshot=False)
+
+    backend, info = recover(str(tmp_path))
+    assert len(backend) == 2
+    for session_id in (finished, partial):
+        assert state_of(backend.get(session_id)) == state_of(main.SESSIONS.get(session_id))
+    assert backend.get(finished).completed_at == main.SESSIONS.get(finished).completed_at
+    assert info["events_undecodable"] == 0
+
+
+def test_round_trip_snapshot_and_tail(journal, tmp_path):
+    session_id = start(journal)
+    main.record_answers(session_id, DEMOGRAPHICS[:4])
+    journal.snapshot()
+    main.record_answers(session_id, DEMOGRAPHICS[4:] + ["no"])
+    journal.stop(snapshot=False)
+
+    backend, info = recover(str(tmp_path))
+    assert state_of(backend.get(session_id)) == state_of(main.SESSIONS.get(session_id))
+    assert info["snapshot"] is not None
+
+
+# -----------------------------
+# TORN TAIL
+# -----------------------------
+def test_truncated_last_frame_is_dropped(journal, tmp_path):
+    session_id = start(journal)
+    main.record_answers(session_id, DEMOGRAPHICS[:3])
+    main.record_answers(session_id, [DEMOGRAPHICS[3]])
+    journal.stop(snapshot=False)
+
+    path = last_segment(str(tmp_path))
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)  # crash in the middle of the last answer
+
+    backend, _ = recover(str(tmp_path))
+    sess = backend.get(session_id)
+    assert [a for _, a in sess.answers] == DEMOGRAPHICS[:3]
+    assert sess.cursor == 3
+
+
+def test_garbage_after_last_frame_is_ignored(journal, tmp_path):
+    session_id = start(journal)
+    main.record_answers(session_id, DEMOGRAPHICS[:2])
+    journal.stop(snapshot=False)
+
+    with open(last_segment(str(tmp_path)), "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    backend, _ = recover(str(tmp_path))
+    assert backend.get(session_id).cursor == 2
+
+
+# -----------------------------
+# MULTIBYTE / OVERSIZE ANSWERS
+# -----------------------------
+def test_oversize_answer_is_cut_on_a_character_boundary():
+    raw = "a" * 65534 + "é"  # "é" would straddle the 0xFFFF byte limit
+    state, answers = decode_answers(encode_answers(3, [raw]))
+    assert state == 3
+    assert answers == ["a" * 65534]
+
+
+def test_frame_with_split_character_does_not_abort_recovery(tmp_path):
+    # what the old encoder wrote: the answer cut in the middle of "é"
+    session_id = str(main.uuid.uuid4())
+    data = ("a" * 65534 + "é").encode("utf-8")[:0xFFFF]
+    body = STATE.pack(0, 1) + LENGTH.pack(len(data)) + data
+    with open(os.path.join(str(tmp_path), "journal.1.log"), "wb") as f:
+        f.write(encode_event(START, 1, time.time(), session_id))
+        f.write(encode_event(ANSWER, 2, time.time(), session_id, body))
+
+    backend, info = recover(str(tmp_path))
+    assert len(backend) == 1
+    assert info["events_skipped"] == 1  # too long for MAX_ANSWER_CHARS: not replayed
+    assert backend.get(session_id).cursor == 0
+
+
+def test_undecodable_event_is_skipped(tmp_path):
+    session_id = str(main.uuid.uuid4())
+    with open(os.path.join(str(tmp_path), "journal.1.log"), "wb") as f:
+        f.write(encode_event(START, 1, time.time(), session_id))
+        f.write(encode_event(ANSWER, 2, time.time(), session_id, b"\x01"))  # body shorter than its header
+
+    backend, info = recover(str(tmp_path))
+    assert len(backend) == 1
+    assert info["events_undecodable"] == 1
+
+
+def test_api_rejects_oversize_answer(journal):
+    session_id = start(journal)
+    with pytest.raises(main.InvalidAnswer):
+        main.record_answers(session_id, ["a" * 65534 + "é"])
+    assert main.SESSIONS.get(session_id).answers == []
+
+
+# -----------------------------
+# FAILED MID-BATCH / REPLAY MISMATCH
+# -----------------------------
+def test_failed_mid_batch_answer_changes_nothing(journal, tmp_path):
+    session_id = start(journal)
+    with pytest.raises(main.InvalidAnswer):
+        main.record_answers(session_id, ["alex", "thirty", "m", "india"])
+    assert state_of(main.SESSIONS.get(session_id)) == state_of(new_record())
+
+    main.record_answers(session_id, DEMOGRAPHICS[:4])
+    journal.stop(snapshot=False)
+
+    backend, info = recover(str(tmp_path))
+    assert state_of(backend.get(session_id)) == state_of(main.SESSIONS.get(session_id))
+    assert backend.get(session_id).cursor == 4
+    assert info["events_skipped"] == 0
+
+
+def test_batch_failing_inside_apply_is_not_half_applied(journal, tmp_path, monkeypatch):
+    session_id = start(journal)
+    apply_answer = main.apply_answer
+
+    def failing(sess, sid, ans_raw):
+        if ans_raw == "india":
+            raise RuntimeError("render failed")
+        return apply_answer(sess, sid, ans_raw)
+
+    monkeypatch.setattr(main, "apply_answer", failing)
+    with pytest.raises(RuntimeError):
+        main.record_answers(session_id, DEMOGRAPHICS[:5])
+    monkeypatch.setattr(main, "apply_answer", apply_answer)
+
+    assert main.SESSIONS.get(session_id).cursor == 0
+    main.record_answers(session_id, DEMOGRAPHICS)
+    journal.stop(snapshot=False)
+
+    backend, _ = recover(str(tmp_path))
+    assert state_of(backend.get(session_id)) == state_of(main.SESSIONS.get(session_id))
+
+
+def test_answer_event_at_an_unreachable_state_is_skipped(tmp_path):
+    session_id = str(main.uuid.uuid4())
+    with open(os.path.join(str(tmp_path), "journal.1.log"), "wb") as f:
+        f.write(encode_event(START, 1, time.time(), session_id))
+        f.write(encode_event(ANSWER, 2, time.time(), session_id, encode_answers(5, ["self"])))  # record is at 0
+
+    backend, info = recover(str(tmp_path))
+    assert backend.get(session_id).cursor == 0
+    assert info["events_skipped"] == 1
+
+
+# -----------------------------
+# ONE WRITER PER DIRECTORY / WORKER RESTART
+# -----------------------------
+def test_second_process_cannot_take_the_directory(journal, tmp_path):
+    with pytest.raises(JournalLocked):
+        SessionJournal(str(tmp_path)).recover(MemorySessionBackend(), new_record, main.replay_answers, 3600)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_workers(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_for_worker(client, master_pid, not_pid=None, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        workers = [pid for pid in serve_workers(master_pid) if pid != not_pid]
+        try:
+            if workers and client.get("/").status_code == 200:
+                return workers[0]
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("serve.py worker did not become ready")
+
+
+# serve.py forks workers from a master that never recovers the journal: a
+# worker started after a crash must replay what the killed one journaled
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_killed_worker_loses_no_sessions(tmp_path):
+    port = free_port()
+    env = dict(
+        os.environ, SESSION_BACKEND="memory", SESSION_JOURNAL_DIR=str(tmp_path), SESSION_JOURNAL_SYNC="1",
+        WORKER_RESTART_BACKOFF_SECONDS="0.1",
+    )
+    env.pop("SESSION_DB_PATH", None)
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", "1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            worker = wait_for_worker(client, server.pid)
+
+            expected = {}
+            for n in (1, 4, 8, 9, len(DEMOGRAPHICS) + 30):
+                session_id = client.post("/start_session").json()["session_id"]
+                r = client.post("/answer_batch", json={"session_id": session_id,
+                                                       "answers": (DEMOGRAPHICS + ["yes"] * 30)[:n]}).json()
+                expected[session_id] = r
+
+            os.kill(worker, signal.SIGKILL)
+            wait_for_worker(client, server.pid, not_pid=worker)
+
+            for session_id, before in expected.items():
+                r = client.post("/answer_batch", json={"session_id": session_id, "answers": []})
+                assert r.status_code == 200, session_id
+                if before.get("final"):
+                    assert client.post("/predict_final", json={"session_id": session_id}).json()["ASD_result"] \
+                        == before["ASD_result"]
+                else:
+                    assert r.json()["next_question"] == before["next_question"]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
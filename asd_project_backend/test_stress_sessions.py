@@ -0,0 +1,34 @@
+# test_stress_sessions.py — the lock is what keeps concurrent answers exact
+#
+#   python -m pytest -q test_stress_sessions.py
+import sys
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from stress_sessions import hot_session, many_sessions, racy
+
+
+@pytest.fixture
+def pool():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    with ThreadPoolExecutor(16) as pool:
+        yield pool
+    sys.setswitchinterval(interval)
+
+
+def test_locked_answers_apply_exactly_once(pool):
+    problems, _ = many_sessions(main, pool, sessions=20, posts_per_session=10, seed=0)
+    assert hot_session(main, pool) == []
+    assert problems == []
+
+
+# the harness must be able to see the race it guards against
+def test_without_the_lock_answers_are_lost(pool, monkeypatch):
+    monkeypatch.setattr(main.SESSIONS, "locked", lambda session_id: nullcontext())
+    monkeypatch.setattr(main, "apply_answer", racy(main.apply_answer))
+    problems, _ = many_sessions(main, pool, sessions=20, posts_per_session=10, seed=0)
+    assert hot_session(main, pool) + problems != []
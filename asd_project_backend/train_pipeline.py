@@ -0,0 +1,305 @@
+# train_pipeline.py — One training CLI for every feature recipe
+#
+#   python train_pipeline.py optionB [--activate] [--n-jobs -1] [--data train.csv]
+#   python train_pipeline.py classical | adaptive
+#   python train_pipeline.py optionB --stream --chunk-rows 100000 --data logs.csv
+#
+# Each recipe's preprocessed matrices (encoded, imputed, scaled) and fitted
+# preprocessing state are cached in TRAIN_CACHE_DIR under a fingerprint of
+# the data file, the recipe code and the library versions, so re-runs on
+# unchanged data skip reading and preprocessing the CSV. Every run writes
+# a new bundle to saved_models/versions/<version>/; --activate also
+# publishes it to the bundle the API serves (MODEL_BUNDLE).
+#
+# --stream trains out of core for data that does not fit in memory (chunked
+# CSV / Parquet, running statistics, forest grown chunk by chunk; see
+# stream_training.py). It bypasses the matrix cache.
+import os
+import sys
+import json
+import time
+import inspect
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.impute import SimpleImputer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from forest_engine import FlatForest
+from model_bundle import save_bundle
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA = os.path.join(HERE, "train.csv")
+DEFAULT_CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join(HERE, ".train_cache"))
+DEFAULT_OUT_DIR = os.path.join(HERE, "saved_models", "versions")
+ACTIVE_BUNDLE = os.getenv("MODEL_BUNDLE", os.path.join(HERE, "saved_models", "bundle"))
+
+CACHE_FORMAT = 1
+RANDOM_STATE = 42
+
+
+# =============================
+# FEATURE RECIPES
+# =============================
+# raw DataFrame → (X DataFrame, y Series), same columns the original
+# train_*_model.py scripts derived
+def features_classical(df):
+    df = df[[
+        "A1_Score", "A2_Score", "A3_Score", "A4_Score", "A5_Score",
+        "A6_Score", "A7_Score", "A8_Score", "A9_Score", "A10_Score",
+        "age", "gender", "ethnicity", "jaundice", "relation",
+        "used_app_before",
+        "Class/ASD",
+    ]]
+    return df.drop("Class/ASD", axis=1), df["Class/ASD"].astype(int)
+
+
+def features_option_b(df):
+    df = df.copy()
+    df.columns = df.columns.str.lower().str.replace("/", "_").str.replace(" ", "_")
+    df = df.rename(columns={"contry_of_res": "country"})
+
+    for category, column in zip(
+        ("social", "communication", "hyperactivity", "repetitive", "sensory", "learning"),
+        ("a1_score", "a2_score", "a3_score", "a4_score", "a5_score", "a6_score"),
+    ):
+        df[category] = df[column]
+
+    features = [
+        "social", "communication", "hyperactivity",
+        "repetitive", "sensory", "learning",
+        "age", "gender", "country", "ethnicity",
+        "jaundice", "relation", "used_app_before",
+    ]
+    return df[features].copy(), df["class_asd"]
+
+
+def features_adaptive(df):
+    df = df.copy()
+    df["social"] = df[["A1_Score", "A2_Score"]].sum(axis=1)
+    df["communication"] = df[["A3_Score", "A4_Score"]].sum(axis=1)
+    df["hyperactivity"] = df[["A5_Score", "A6_Score"]].sum(axis=1)
+    df["repetitive"] = df[["A7_Score"]].sum(axis=1)
+    df["sensory"] = df[["A8_Score"]].sum(axis=1)
+    df["learning"] = df[["A9_Score", "A10_Score"]].sum(axis=1)
+    df = df.rename(columns={"contry_of_res": "country"})
+
+    df = df[[
+        "social", "communication", "hyperactivity", "repetitive", "sensory", "learning",
+        "age", "gender", "country", "ethnicity", "jaundice", "relation",
+        "Class/ASD",
+    ]].dropna()
+    return df.drop("Class/ASD", axis=1), df["Class/ASD"]
+
+
+# categorical=None → every object column; imputer=None → no imputation;
+# holdout → fraction kept out of training for the reported accuracy
+RECIPES = {
+    "classical": {
+        "features": features_classical,
+        "categorical": None,
+        "imputer": "median",
+        "model": {"n_estimators": 300, "max_depth": 12},
+        "holdout": None,
+    },
+    "optionB": {
+        "features": features_option_b,
+        "categorical": ["gender", "country", "ethnicity", "relation", "jaundice", "used_app_before"],
+        "imputer": "most_frequent",
+        "model": {"n_estimators": 250},
+        "holdout": None,
+    },
+    "adaptive": {
+        "features": features_adaptive,
+        "categorical": ["gender", "country", "ethnicity", "jaundice", "relation"],
+        "imputer": None,
+        "model": {"n_estimators": 200},
+        "holdout": 0.2,
+    },
+}
+
+
+# =============================
+# PREPROCESSING + CACHE
+# =============================
+def fingerprint(data_path, name):
+    recipe = RECIPES[name]
+    h = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(json.dumps({
+        "format": CACHE_FORMAT,
+        "recipe": name,
+        "categorical": recipe["categorical"],
+        "imputer": recipe["imputer"],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }, sort_keys=True).encode())
+    h.update(inspect.getsource(recipe["features"]).encode())
+    h.update(inspect.getsource(preprocess).encode())
+    return h.hexdigest()
+
+
+# → dict of arrays: X (model input), y, feature_order, preprocessing state, encoder.<col>
+def preprocess(data_path, name):
+    recipe = RECIPES[name]
+    X, y = recipe["features"](pd.read_csv(data_path))
+    X = X.copy()
+
+    cat_cols = recipe["categorical"]
+    if cat_cols is None:
+        cat_cols = list(X.select_dtypes(include=["object", "string"]).columns)
+
+    arrays = {}
+    for col in cat_cols:
+        le = LabelEncoder()
+        X[col] = le.fit_transform(X[col].astype(str))
+        arrays[f"encoder.{col}"] = np.asarray(le.classes_, dtype=str)
+
+    values = X.to_numpy(dtype=np.float64)
+    if recipe["imputer"] is not None:
+        imputer = SimpleImputer(strategy=recipe["imputer"])
+        values = imputer.fit_transform(values)
+        arrays["imputer_statistics"] = imputer.statistics_
+
+    scaler = StandardScaler()
+    values = scaler.fit_transform(values)
+    arrays["scaler_mean"] = scaler.mean_
+    arrays["scaler_scale"] = scaler.scale_
+
+    arrays["X"] = np.ascontiguousarray(values)
+    arrays["y"] = np.asarray(y)
+    arrays["feature_order"] = np.asarray(list(X.columns), dtype=str)
+    return arrays
+
+
+def load_or_preprocess(data_path, name, cache_dir, use_cache=True):
+    key = fingerprint(data_path, name)
+    path = os.path.join(cache_dir, f"{name}-{key[:16]}.npz")
+
+    if use_cache and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as data:
+            return {k: data[k] for k in data.files}, key, True
+
+    arrays = preprocess(data_path, name)
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+    return arrays, key, False
+
+
+# =============================
+# TRAIN + WRITE BUNDLE
+# =============================
+def fit_model(arrays, name, n_jobs, params=None):
+    recipe = RECIPES[name]
+    X, y = arrays["X"], arrays["y"]
+
+    if recipe["holdout"]:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=recipe["holdout"], random_state=RANDOM_STATE
+        )
+    else:
+        X_train, X_test, y_train, y_test = X, X, y, y
+
+    # trees are seeded from random_state, so n_jobs does not change the model
+    model = RandomForestClassifier(
+        random_state=RANDOM_STATE, n_jobs=n_jobs, **dict(recipe["model"], **(params or {}))
+    )
+    model.fit(X_train, y_train)
+    accuracy = float(model.score(X_test, y_test))
+    model.set_params(n_jobs=None)
+    return model, accuracy
+
+
+def bundle_args(arrays, forest):
+    return {
+        "feature_order": [str(c) for c in arrays["feature_order"]],
+        "encoders": {k[len("encoder."):]: v for k, v in arrays.items() if k.startswith("encoder.")},
+        "forest": forest,
+        "imputer_statistics": arrays.get("imputer_statistics"),
+        "scaler_mean": arrays.get("scaler_mean"),
+        "scaler_scale": arrays.get("scaler_scale"),
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Train a NeuroMate risk model and write a bundle")
+    parser.add_argument("recipe", choices=sorted(RECIPES))
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="fit workers (-1 = all cores)")
+    parser.add_argument("--n-estimators", type=int, help="override the recipe's forest size")
+    parser.add_argument("--stream", action="store_true", help="out-of-core chunked training")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="rows per chunk with --stream")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="parent of the versioned output directory")
+    parser.add_argument("--activate", action="store_true", help=f"also publish to {ACTIVE_BUNDLE}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    name = args.recipe
+
+    params = {"n_estimators": args.n_estimators} if args.n_estimators else {}
+
+    t0 = time.perf_counter()
+    if args.stream:
+        from stream_training import train_streaming
+
+        key = fingerprint(args.data, name)
+        arrays, model, accuracy, rows = train_streaming(
+            args.data, RECIPES[name], args.chunk_rows, args.n_jobs, RANDOM_STATE, params
+        )
+        t1 = t2 = time.perf_counter()
+    else:
+        arrays, key, cached = load_or_preprocess(args.data, name, args.cache_dir, not args.no_cache)
+        rows = len(arrays["y"])
+        t1 = time.perf_counter()
+        model, accuracy = fit_model(arrays, name, args.n_jobs, params)
+        t2 = time.perf_counter()
+
+    version = f"{name}-{time.strftime('%Y%m%dT%H%M%S')}-{key[:8]}"
+    metadata = {
+        "recipe": name,
+        "data": os.path.basename(args.data),
+        "data_fingerprint": key,
+        "rows": int(rows),
+        "accuracy": accuracy,
+        "accuracy_on": "holdout" if RECIPES[name]["holdout"] else "training set",
+        "params": dict(RECIPES[name]["model"], **params),
+        "streamed": {"chunk_rows": args.chunk_rows} if args.stream else None,
+        "sklearn": sklearn.__version__,
+    }
+    bundle = bundle_args(arrays, FlatForest.from_sklearn(model))
+
+    out = os.path.join(args.out, version)
+    save_bundle(out, version=version, metadata=metadata, **bundle)
+    if args.activate:
+        save_bundle(ACTIVE_BUNDLE, version=version, metadata=metadata, **bundle)
+
+    print(f"recipe:      {name} ({metadata['rows']} rows, {len(bundle['feature_order'])} features)")
+    if args.stream:
+        print(f"streamed:    {t2 - t0:.2f} s ({args.chunk_rows} rows per chunk, n_jobs={args.n_jobs})")
+    else:
+        print(f"preprocess:  {(t1 - t0) * 1000:.1f} ms ({'cache hit' if cached else 'computed'})")
+        print(f"fit:         {t2 - t1:.2f} s (n_jobs={args.n_jobs})")
+    print(f"accuracy:    {accuracy:.4f} ({metadata['accuracy_on']})")
+    print(f"bundle:      {out}")
+    if args.activate:
+        print(f"activated:   {ACTIVE_BUNDLE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
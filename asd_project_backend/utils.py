@@ -1,52 +1,21 @@
 import os
-import pickle
 import numpy as np
 import pandas as pd
 
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "saved_models")
+from model_bundle import BundleError, load_bundle
 
-
-# -----------------------------
-# SAFE PICKLE LOADER
-# -----------------------------
-def load_pickle(filename):
-    path = os.path.join(MODEL_DIR, filename)
-    with open(path, "rb") as f:
-        return pickle.load(f)
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(__file__), "saved_models"))
+MODEL_BUNDLE = os.getenv("MODEL_BUNDLE", os.path.join(MODEL_DIR, "bundle"))
 
 
 # -----------------------------
-# LOAD ARTIFACTS (scaler, imputer, classical model)
+# LOAD ARTIFACTS (one versioned model bundle)
 # -----------------------------
-def load_artifacts():
-    artifacts = {}
-
-    try:
-        artifacts["scaler"] = load_pickle("scaler.pkl")
-    except:
-        artifacts["scaler"] = None
-
-    try:
-        artifacts["imputer"] = load_pickle("imputer.pkl")
-    except:
-        artifacts["imputer"] = None
-
-    # encoders are optional → but we DO NOT depend on them
-    try:
-        artifacts["encoders"] = load_pickle("encoders.pkl")
-    except:
-        artifacts["encoders"] = {}
-
-    try:
-        artifacts["feature_order"] = load_pickle("feature_order.pkl")
-    except:
-        artifacts["feature_order"] = []
-
-    try:
-        artifacts["classical"] = load_pickle("best_model.pkl")
-    except:
-        artifacts["classical"] = None
-
+# Raises BundleError when the bundle is missing or inconsistent — the API
+# refuses to start rather than serve predictions without a model.
+def load_artifacts(path=None, mmap=True):
+    artifacts = load_bundle(path or MODEL_BUNDLE, mmap=mmap)
+    artifacts["encoder_tables"] = encoder_lookup_tables(artifacts["encoder_classes"])
     return artifacts
 
 
@@ -74,34 +43,133 @@ def normalize_value(val):
 
 
 # -----------------------------
-# SUPER SAFE FEATURE BUILDER
+# ENCODER LOOKUP TABLES
 # -----------------------------
-def build_feature_dataframe(req_dict, artifacts):
+# LabelEncoder code = position in the vocabulary. Keys are normalized the
+# same way as incoming values, so "Asian" in training matches "asian" from
+# the API. On a collision ("Others"/"others") the first class wins.
+def encoder_lookup_tables(vocabularies):
+    tables = {}
+    for col, classes in vocabularies.items():
+        table = {}
+        for code, cls in enumerate(classes):
+            table.setdefault(normalize_value(cls), code)
+        tables[col] = table
+    return tables
+
+
+def _encode_column(values, table):
+    # small batches: a plain dict lookup beats np.unique's setup cost
+    if len(values) <= 64:
+        return np.array(
+            [table.get(normalize_value("" if v is None else v), -1) for v in values],
+            dtype=np.float32,
+        )
+
+    # large batches: normalize each distinct raw value once, map rows by index
+    raw = np.array(["" if v is None else str(v) for v in values], dtype=str)
+    uniques, inverse = np.unique(raw, return_inverse=True)
+    lut = np.array([table.get(normalize_value(u), -1) for u in uniques], dtype=np.float32)
+    return lut[inverse.reshape(-1)]
+
+
+def _numeric_column(values):
+    try:
+        return np.asarray(values, dtype=np.float64).astype(np.float32)
+    except (TypeError, ValueError):
+        out = np.empty(len(values), dtype=np.float32)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+# -----------------------------
+# BATCH FEATURE BUILDER
+# -----------------------------
+# rows: list of request dicts → float32 C-contiguous (N, len(feature_order))
+# Encoder columns use the lookup tables (unknown → -1), every other column
+# is parsed as a number (missing / unparseable → NaN, left to the imputer).
+def build_feature_matrix(rows, artifacts):
     feature_order = artifacts.get("feature_order", [])
-    encoders = artifacts.get("encoders", {})
+    tables = artifacts.get("encoder_tables")
+    if tables is None:
+        tables = encoder_lookup_tables(artifacts.get("encoder_classes", {}))
 
-    row = {}
+    X = np.empty((len(rows), len(feature_order)), dtype=np.float32)
+    if not rows:
+        return X
 
-    # 1️⃣ Normalize all incoming values
-    for col in feature_order:
-        raw_val = req_dict.get(col, None)
-        row[col] = normalize_value(raw_val)
+    for j, col in enumerate(feature_order):
+        values = [r.get(col) for r in rows]
+        if col in tables:
+            X[:, j] = _encode_column(values, tables[col])
+        else:
+            X[:, j] = _numeric_column(values)
 
-    df = pd.DataFrame([row])
+    return X
 
-    # 2️⃣ Apply encoders only if valid
-    for col, encoder in encoders.items():
-        if col in df.columns:
-            try:
-                df[col] = df[col].apply(
-                    lambda x: encoder.transform([x])[0] if x in encoder.classes_ else -1
-                )
-            except:
-                df[col] = -1
-
-    # 3️⃣ Convert remaining strings into numeric category codes
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype("category").cat.codes
-
-    return df
+
+# -----------------------------
+# SINGLE-ROW DATAFRAME (kept for callers that want column names)
+# -----------------------------
+def build_feature_dataframe(req_dict, artifacts):
+    return pd.DataFrame(
+        build_feature_matrix([req_dict], artifacts),
+        columns=artifacts.get("feature_order", []),
+    )
+
+
+# -----------------------------
+# PREPROCESSING (imputer + scaler, applied with their fitted arrays)
+# -----------------------------
+# Same arithmetic as SimpleImputer.transform / StandardScaler.transform in
+# float64, using the statistics stored in the bundle.
+def preprocess_features(X, artifacts):
+    X = np.array(X, dtype=np.float64)
+
+    statistics = artifacts.get("imputer_statistics")
+    if statistics is not None:
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(statistics, X.shape)[missing]
+
+    mean = artifacts.get("scaler_mean")
+    if mean is not None:
+        X -= mean
+    scale = artifacts.get("scaler_scale")
+    if scale is not None:
+        X /= scale
+
+    return X
+
+
+# -----------------------------
+# RISK PROBABILITY (flat random forest from the bundle)
+# -----------------------------
+def model_available(artifacts):
+    return artifacts.get("forest") is not None and bool(artifacts.get("feature_order"))
+
+
+# rows: list of feature dicts → array of P(ASD) per row, or None without a usable model
+def predict_risk(rows, artifacts):
+    if not model_available(artifacts):
+        return None
+
+    forest = artifacts["forest"]
+    X = preprocess_features(build_feature_matrix(rows, artifacts), artifacts)
+
+    positive = list(forest.classes).index(1)
+    return forest.predict_proba(X)[:, positive]
+
+
+# -----------------------------
+# SMOKE TEST (a freshly loaded bundle must pass before it serves traffic)
+# -----------------------------
+def smoke_test(artifacts, rows):
+    proba = predict_risk(rows, artifacts)
+    if proba is None or proba.shape != (len(rows),) or not np.all((proba >= 0) & (proba <= 1)):
+        raise BundleError(f"{artifacts.get('path')}: smoke batch returned {proba!r}")
+    return proba
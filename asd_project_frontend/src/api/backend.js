@@ -38,6 +38,113 @@ export async function sendAnswer(session_id, answer) {
   }
 }
 
+// ----------------------------
+// SCREENING OVER ONE WEBSOCKET
+// ----------------------------
+// answer(text) resolves with the same data as sendAnswer ({next_question}
+// or {final: true, ...}) and rejects when the server refuses the answer.
+// A dropped connection reconnects and resumes the session; an answer that
+// was not acknowledged is resent and the server applies it only once.
+// Answers go over HTTP until the socket is open, and for good once the
+// session is unknown (close 4404) or reconnecting failed SOCKET_RETRIES times.
+const SOCKET_RETRIES = 5;
+
+export function openScreeningSocket(session_id) {
+  const url = `${BASE_URL.replace(/^http/, "ws")}/ws/screening?session_id=${encodeURIComponent(session_id)}`;
+  let socket = null;
+  let opened = false;
+  let failed = false;
+  let closed = false;
+  let retries = 0;
+  let answered = null;
+  let pending = null; // { message, resolve, reject }
+
+  const settle = (error, msg) => {
+    if (!pending) return;
+    const { resolve, reject } = pending;
+    pending = null; // never resent after it was answered or refused
+    if (error) reject(error);
+    else resolve(msg);
+  };
+
+  const giveUp = (reason) => {
+    failed = true;
+    settle(new Error(reason));
+  };
+
+  const connect = () => {
+    socket = new WebSocket(url);
+
+    socket.onmessage = (event) => {
+      const msg = JSON.parse(event.data);
+
+      if (msg.type === "ping") {
+        socket.send(JSON.stringify({ type: "pong" }));
+      } else if (msg.type === "session") {
+        opened = true;
+        retries = 0;
+        answered = msg.answered;
+        if (pending) socket.send(JSON.stringify(pending.message));
+      } else if (msg.type === "question" || msg.type === "final") {
+        answered = msg.answered;
+        settle(null, msg);
+      } else if (msg.type === "error") {
+        console.error("Screening socket error:", msg.detail);
+        settle(new Error(msg.detail));
+      }
+    };
+
+    socket.onclose = (event) => {
+      if (closed) return;
+      if (event.code === 4404) {
+        giveUp("Invalid session id");
+      } else if (retries >= SOCKET_RETRIES) {
+        giveUp("Screening connection lost");
+      } else {
+        setTimeout(connect, Math.min(500 * 2 ** retries++, 10000));
+      }
+    };
+  };
+
+  connect();
+
+  return {
+    answer(text) {
+      if (!opened || failed) {
+        answered = null; // unknown after an HTTP answer: the next one is applied unconditionally
+        return sendAnswer(session_id, text);
+      }
+      return new Promise((resolve, reject) => {
+        pending = { message: { type: "answer", answer: text, answered }, resolve, reject };
+        if (socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(pending.message));
+      });
+    },
+    close() {
+      closed = true;
+      socket.close();
+    },
+  };
+}
+
+// ----------------------------
+// SEND SEVERAL ANSWERS AT ONCE
+// ----------------------------
+export async function sendAnswers(session_id, answers) {
+  try {
+    const res = await fetch(`${BASE_URL}/answer_batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ session_id, answers }),
+    });
+
+    const data = await res.json();
+    return data;
+  } catch (error) {
+    console.error("Send answers error:", error);
+    return null;
+  }
+}
+
 // ----------------------------
 // GET FINAL RESULT
 // ----------------------------
@@ -62,11 +169,10 @@ export async function getFinal(session_id) {
 // ----------------------------
 export async function downloadPDF(session_id) {
   try {
-    const res = await fetch(`${BASE_URL}/generate-report-session`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ session_id }),
-    });
+    // a plain GET: the browser cache revalidates with the ETag, so a
+    // repeated download is a 304 served from the cached copy
+    const res = await fetch(`${BASE_URL}/reports/${encodeURIComponent(session_id)}`);
+    if (!res.ok) throw new Error(`report request failed: ${res.status}`);
 
     // backend returns a binary PDF stream
     const blob = await res.blob();
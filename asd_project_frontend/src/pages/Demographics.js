@@ -88,6 +88,20 @@ export default function Demographics() {
         return;
       }
 
+      // rejected answer (e.g. an age that is not a number): ask again
+      if (res?.detail && !res?.next_question) {
+        setMessages((m) => [
+          ...m,
+          {
+            id: `bot-${Date.now()}`,
+            from: "bot",
+            text: `${res.detail}. Please try again.`,
+            time: new Date().toISOString(),
+          },
+        ]);
+        return;
+      }
+
       if (res?.next_question) {
         localStorage.setItem("next_question", res.next_question);
         setMessages((m) => [
@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from "react";
-import { sendAnswer } from "../api/backend";
+import React, { useState, useEffect, useRef } from "react";
+import { openScreeningSocket, sendAnswer } from "../api/backend";
 import { useNavigate } from "react-router-dom";
 import { FaRobot } from "react-icons/fa";
 
@@ -10,11 +10,19 @@ export default function Screening() {
   const [questionIndex, setQuestionIndex] = useState(0);
   const [displayedQuestion, setDisplayedQuestion] = useState("");
   const [mounted, setMounted] = useState(false);
+  const socketRef = useRef(null);
 
   useEffect(() => {
     setMounted(true);
   }, []);
 
+  // one connection for the whole screening
+  useEffect(() => {
+    const socket = openScreeningSocket(localStorage.getItem("session_id"));
+    socketRef.current = socket;
+    return () => socket.close();
+  }, []);
+
   // typing animation
   useEffect(() => {
     if (!question) return;
@@ -39,7 +47,9 @@ export default function Screening() {
 
     try {
       const session_id = localStorage.getItem("session_id");
-      const data = await sendAnswer(session_id, ans);
+      const data = socketRef.current
+        ? await socketRef.current.answer(ans)
+        : await sendAnswer(session_id, ans);
 
       await new Promise((r) => setTimeout(r, 450));
 